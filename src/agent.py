@@ -1,13 +1,14 @@
 import copy
 import logging
+import threading
 from typing import Optional
 
 import numpy as np
 
-from mcts import MCTS
+from mcts import MCTS, create_mcts
 from tictactoe import TicTacToe
-from treenode import Node
 from saver import load_mcts, save_mcts
+from timecontrol import TimeManager
 
 
 class Agent:
@@ -28,14 +29,18 @@ class Agent:
         game = copy.deepcopy(game) if game is not None else TicTacToe()
         players = [agent1, agent2]
         current_player = 0
-        while not game.is_over:
-            move = players[current_player].get_move(game)
-            game.make_move(move)
-            current_player = 1 - current_player
-            if print_game:
-                game.print_board()
-                if (game.is_over):
-                    print("Winner:", game.return_winner())
+        try:
+            while not game.is_over:
+                move = players[current_player].get_move(game)
+                game.make_move(move)
+                current_player = 1 - current_player
+                if print_game:
+                    game.print_board()
+                    if (game.is_over):
+                        print("Winner:", game.return_winner())
+        finally:
+            for player in players:
+                player.stop_pondering()
         winner = game.return_winner()
         del game
         return winner
@@ -105,6 +110,10 @@ class Agent:
     def get_move(self):
         pass
 
+    def stop_pondering(self):
+        """Stops the search an agent may run during the turn of its opponent, nothing to stop by default"""
+        pass
+
 
 class RandomAgent(Agent):
     def get_move(self, game: Optional[TicTacToe] = None):
@@ -117,26 +126,113 @@ class RandomAgent(Agent):
 
 
 class MCTSAgent(Agent):
-    def __init__(self, game: Optional[TicTacToe] = None, mcts: Optional[MCTS] = None, num_simulations=1000):
+    def __init__(self,
+                 game: Optional[TicTacToe] = None,
+                 mcts: Optional[MCTS] = None,
+                 num_simulations=1000,
+                 tree_backend: str = "nodes",
+                 time_per_move: Optional[float] = None,
+                 time_per_game: Optional[float] = None,
+                 ponder: bool = False,
+                 ponder_simulations: Optional[int] = None):
         """
         Initializes the MCTS agent
         :param game: the game to play
         :param mcts: the mcts object to use for the agent
         :param num_simulations: the number of simulations to run for each move
+        :param tree_backend: the tree storage used when no mcts object is given, "nodes" or "arrays"
+        :param time_per_move: if given, each move is searched for at most this many seconds instead of
+        a fixed number of simulations
+        :param time_per_game: if given, the seconds for the whole game are spread across the moves
+        :param ponder: if True, the position after the move of the agent is searched in a background thread
+        until its next get_move, so that the subtree of the reply of the opponent already has visits.
+        The mcts object must not be used by anything else in the meantime
+        :param ponder_simulations: the maximum number of simulations of a background search. If None, the
+        search stops once it has run num_simulations simulations per reply of the opponent. A node budget of the
+        mcts object also bounds the memory taken by the background search
         """
         super().__init__(game if game is not None else TicTacToe())
-        self.mcts = mcts if (not mcts is None) else MCTS(game, num_simulations)
+        self.mcts = mcts if (not mcts is None) else create_mcts(self.game, num_simulations, tree_backend)
+        self.time_per_move = time_per_move
+        self.time_manager = TimeManager(time_per_game) if time_per_game is not None else None
+        self.last_search_result = None
+        self.moves_seen = 0
+        self.ponder = ponder
+        self.ponder_simulations = ponder_simulations
+        self.ponder_thread = None
+        self.ponder_stop = threading.Event()
+        self.last_ponder_result = None
 
     def get_move(self, game: Optional[TicTacToe] = None):
         """
-        Chooses the best move according to the MCTS algorithm
+        Chooses the best move according to the MCTS algorithm.
+        The subtree of the current position is reused from the previous searches, so only the
+        simulations still needed to reach num_simulations visits are run
         :param game: the game to play
         :return: the best move
         """
         game = game if game is not None else self.game
-        self.mcts.root = Node(game_state=game)
-        best_move = self.mcts.find_best_move_with_mcts(node=self.mcts.root)
-        return best_move
+        self.stop_pondering()
+        self.mcts.reroot(game)
+        if self.time_per_move is None and self.time_manager is None:
+            move = self.mcts.root_move_to_game_move(self.mcts.find_best_move_with_mcts(node=self.mcts.root))
+        else:
+            move = self.mcts.root_move_to_game_move(self.search_with_time_control(game).move)
+            if move is None:
+                # the time ran out before the root got any children
+                move = int(np.random.choice(game.get_possible_moves()))
+        if self.ponder:
+            self.start_pondering(game, move)
+        return move
+
+    def start_pondering(self, game: TicTacToe, move):
+        """
+        Starts searching the position after the move in a background thread, the turn of the opponent
+        :param game: the current game state
+        :param move: the move the agent is about to play
+        """
+        position = game.copy()
+        position.make_move(move)
+        node = self.mcts.find_node(position)
+        if node is None or position.is_over:
+            return
+        self.ponder_stop.clear()
+        max_simulations = self.ponder_simulations
+        if max_simulations is None:
+            max_simulations = self.mcts.num_simulations * len(position.get_possible_moves())
+
+        def ponder():
+            self.last_ponder_result = self.mcts.search(node, max_simulations=max_simulations, early_stop=False,
+                                                       stop=self.ponder_stop)
+
+        self.ponder_thread = threading.Thread(target=ponder, daemon=True)
+        self.ponder_thread.start()
+
+    def stop_pondering(self):
+        """Stops the background search and waits for its current simulation to end"""
+        if self.ponder_thread is None:
+            return
+        self.ponder_stop.set()
+        self.ponder_thread.join()
+        self.ponder_thread = None
+
+    def search_with_time_control(self, game: TicTacToe):
+        """
+        Searches the root with the time budget of the move, from time_per_move and/or time_per_game
+        :param game: the current game state
+        :return: the SearchResult of the search, also kept in last_search_result
+        """
+        budgets = [] if self.time_per_move is None else [self.time_per_move]
+        if self.time_manager is not None:
+            if len(game.game_history) < self.moves_seen:
+                self.time_manager.start_game()
+            budgets.append(self.time_manager.budget_for_move(game))
+        self.moves_seen = len(game.game_history)
+        result = self.mcts.search(self.mcts.root, time_budget=min(budgets))
+        if self.time_manager is not None:
+            self.time_manager.record(result.elapsed)
+        self.last_search_result = result
+        return result
 
 
 class HumanAgent(Agent):
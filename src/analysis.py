@@ -0,0 +1,160 @@
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from mcts import MCTS
+from tictactoe import TicTacToe
+from treenode import Node
+
+"""
+This module contains the batch position analysis used to annotate positions offline: every position gets
+its best move, its value and the visit distribution of its moves. All the positions are searched in a single
+tree with transpositions, so a position reached by the search of another one, or by several move orders,
+starts from the visits it already has instead of being searched from scratch
+"""
+
+
+@dataclass
+class PositionAnalysis:
+    """The analysis of a position, the value and the visits being seen from the player to move"""
+    index: int
+    move: Optional[int]
+    value: float
+    visits: dict
+    simulations: int
+    stop_reason: str
+    elapsed: float
+
+    @property
+    def policy(self):
+        """The visit distribution of the moves, normalized"""
+        total = sum(self.visits.values())
+        return {move: visits / total for move, visits in self.visits.items()} if total > 0 else {}
+
+
+def position_to_game(position, game: TicTacToe):
+    """
+    Converts a position given to analyze_positions into a game state
+    :param position: a game state, a list of moves played from game, or a dictionary with the "board" and the
+    "current_player" of the position
+    :param game: the starting position of the move lists, also giving the game class of the boards
+    :return: the game state
+    """
+    if isinstance(position, TicTacToe):
+        return position.copy()
+    if isinstance(position, dict):
+        return game.__class__(board=np.array(position["board"], dtype=int),
+                              current_player=position.get("current_player", 1), **game.parameters)
+    state = game.copy()
+    for move in position:
+        if move not in state.get_possible_moves():
+            raise ValueError(f"Illegal move {move} in the position {list(position)}")
+        state.make_move(int(move))
+    return state
+
+
+class PositionAnalyzer:
+    def __init__(self, game: Optional[TicTacToe] = None, num_simulations: int = 1000, mcts: Optional[MCTS] = None,
+                 **kwargs):
+        """
+        Analyzes batches of positions in one shared tree, kept between batches
+        :param game: the starting position of the move lists and the root of the tree, an empty board if None
+        :param num_simulations: the visits every analyzed position must have
+        :param mcts: the MCTS object holding the shared tree, a new one with transpositions if None. Without
+        transpositions, only positions reached by their moves from the root can be found in the tree
+        :param kwargs: the other arguments of MCTS, for example a node budget
+        """
+        self.game = game if game is not None else TicTacToe()
+        self.num_simulations = num_simulations
+        if mcts is None:
+            kwargs.setdefault("use_transpositions", True)
+            mcts = MCTS(self.game, num_simulations, **kwargs)
+        self.mcts = mcts
+
+    def node_of(self, game: TicTacToe):
+        """
+        Finds the node of a position in the shared tree, adding it when it is missing
+        :param game: the position
+        :return: the node
+        """
+        node = self.mcts.find_or_add_node(game)
+        # a board that is neither in the table nor reached by moves from the root is searched on its own
+        return node if node is not None else Node(game_state=game.copy())
+
+    def analyze(self, game: TicTacToe, index: int = 0):
+        """
+        Searches a position until its node has num_simulations visits
+        :param game: the position
+        :param index: the index of the position in its batch
+        :return: a PositionAnalysis
+        """
+        mcts = self.mcts
+        node = self.node_of(game)
+        to_game_move = mcts.game_move_mapping(node, game)
+        result = mcts.search(node, max_simulations=max(self.num_simulations - node.visits, 0), early_stop=False)
+
+        if mcts.is_proven(node):
+            value = -float(node.proven)
+        elif game.is_over:
+            value = float(game.return_winner() * game.current_player)
+        else:
+            # the wins of a node are counted for the player that moved into it
+            value = -node.wins / node.visits if node.visits > 0 else 0.0
+        visits = {to_game_move(move): child_visits
+                  for move, (child_visits, _) in mcts.root_child_statistics(node).items()}
+        return PositionAnalysis(index, to_game_move(result.move), value, visits, node.visits,
+                                result.stop_reason, result.elapsed)
+
+    def iter_analyses(self, positions):
+        """
+        Analyzes positions and yields every analysis as soon as it is done. The positions are searched from the
+        shortest to the longest game, so that the search of a position also covers the positions that follow it,
+        and a position given several times is searched once
+        :param positions: the positions, in any format accepted by position_to_game
+        :return: a generator of PositionAnalysis, in the order they are done, the index giving the position
+        """
+        games = [position_to_game(position, self.game) for position in positions]
+        groups = {}
+        for index, game in enumerate(games):
+            key = (tuple(np.asarray(game.board).tolist()), game.current_player)
+            groups.setdefault(key, []).append(index)
+        order = sorted(groups.values(), key=lambda indices: np.count_nonzero(games[indices[0]].board))
+        for indices in order:
+            start = time.perf_counter()
+            analysis = self.analyze(games[indices[0]], indices[0])
+            analysis.elapsed = time.perf_counter() - start
+            for index in indices:
+                yield PositionAnalysis(index, analysis.move, analysis.value, dict(analysis.visits),
+                                       analysis.simulations, analysis.stop_reason, analysis.elapsed)
+
+    def analyze_positions(self, positions):
+        """
+        Analyzes positions, see iter_analyses
+        :return: the list of PositionAnalysis, in the order of the positions
+        """
+        analyses = [None] * len(positions)
+        for analysis in self.iter_analyses(positions):
+            analyses[analysis.index] = analysis
+        return analyses
+
+
+def analyze_positions(positions, num_simulations: int = 1000, game: Optional[TicTacToe] = None, **kwargs):
+    """
+    Analyzes positions in a single shared tree
+    :param positions: the positions, in any format accepted by position_to_game
+    :param num_simulations: the visits every analyzed position must have
+    :param game: the starting position of the move lists, an empty board if None
+    :param kwargs: the other arguments of PositionAnalyzer
+    :return: the list of PositionAnalysis, in the order of the positions
+    """
+    return PositionAnalyzer(game, num_simulations, **kwargs).analyze_positions(positions)
+
+
+if __name__ == "__main__":
+    positions = [[], [4], [4, 0], [0, 4], {"board": [1, 1, 0, 0, -1, 0, 0, 0, 0], "current_player": -1}]
+    analyzer = PositionAnalyzer(num_simulations=2000)
+    for analysis in analyzer.iter_analyses(positions):
+        print(analysis.index, analysis.move, round(analysis.value, 3), analysis.visits)
+    print(f"{analyzer.mcts.tree_size()} nodes in the shared tree")
@@ -0,0 +1,245 @@
+import itertools
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+from agent import MCTSAgent, RandomAgent
+from tictactoe import TicTacToe
+
+"""
+This module contains the tournament runner used to compare agent configurations: the games are spread
+across a process pool, each with its own seed, the agents alternate colors, and the results are reported
+as win/draw/loss rates with confidence intervals, Elo ratings, move latencies and throughput
+"""
+
+
+@dataclass
+class AgentSpec:
+    """A picklable description of an agent, built anew in the worker process for every game"""
+    name: str
+    agent_class: type = MCTSAgent
+    kwargs: dict = field(default_factory=dict)
+
+    def build(self, game: TicTacToe):
+        return self.agent_class(game=game.copy(), **self.kwargs)
+
+
+@dataclass
+class MatchResult:
+    """The results of an agent against an opponent, counted from the point of view of the agent"""
+    agent: str
+    opponent: str
+    wins: int = 0
+    draws: int = 0
+    losses: int = 0
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    @property
+    def score(self):
+        return (self.wins + self.draws / 2) / self.games if self.games > 0 else 0.5
+
+    def interval(self, outcome: str, z: float = 1.96):
+        """
+        Returns the Wilson confidence interval of the rate of an outcome
+        :param outcome: "wins", "draws", "losses" or "score"
+        :param z: the z-score of the confidence level, 1.96 for 95%
+        :return: the lower and upper bounds of the rate
+        """
+        successes = self.score * self.games if outcome == "score" else getattr(self, outcome)
+        return wilson_interval(successes, self.games, z)
+
+    def elo_difference(self, z: float = 1.96):
+        """
+        Returns the Elo difference implied by the score, with the interval implied by its confidence interval
+        :return: the Elo difference and its lower and upper bounds
+        """
+        low, high = self.interval("score", z)
+        return score_to_elo(self.score), score_to_elo(low), score_to_elo(high)
+
+
+@dataclass
+class TournamentReport:
+    """The results of a tournament"""
+    matches: list
+    ratings: dict
+    latencies: dict
+    games: int
+    elapsed: float
+
+    @property
+    def games_per_second(self):
+        return self.games / self.elapsed if self.elapsed > 0 else 0
+
+    def latency_percentiles(self, name: str, percentiles=(50, 90, 99)):
+        """
+        Returns the percentiles of the move latencies of an agent
+        :param name: the name of the agent
+        :return: a dictionary mapping each percentile to the latency in seconds
+        """
+        latencies = self.latencies[name]
+        if len(latencies) == 0:
+            return {percentile: 0.0 for percentile in percentiles}
+        return dict(zip(percentiles, np.percentile(latencies, percentiles).tolist()))
+
+    def summary(self):
+        """Formats the report as a table"""
+        lines = []
+        for match in self.matches:
+            low, high = match.interval("score")
+            elo, elo_low, elo_high = match.elo_difference()
+            lines.append(f"{match.agent} vs {match.opponent}: +{match.wins} ={match.draws} -{match.losses} "
+                         f"score {match.score:.3f} [{low:.3f}, {high:.3f}] "
+                         f"Elo {elo:+.0f} [{elo_low:+.0f}, {elo_high:+.0f}]")
+        for name, rating in sorted(self.ratings.items(), key=lambda item: -item[1]):
+            percentiles = self.latency_percentiles(name)
+            lines.append(f"{name}: Elo {rating:+.0f}, move latency p50 {percentiles[50] * 1000:.2f} ms "
+                         f"p90 {percentiles[90] * 1000:.2f} ms p99 {percentiles[99] * 1000:.2f} ms")
+        lines.append(f"{self.games} games in {self.elapsed:.2f} s, {self.games_per_second:.2f} games/s")
+        return "\n".join(lines)
+
+
+def wilson_interval(successes: float, trials: int, z: float = 1.96):
+    """
+    Computes the Wilson score interval of a proportion
+    :param successes: the number of successes, draws may count as half
+    :param trials: the number of trials
+    :param z: the z-score of the confidence level
+    :return: the lower and upper bounds of the proportion
+    """
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z ** 2 / trials
+    center = (p + z ** 2 / (2 * trials)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / trials + z ** 2 / (4 * trials ** 2)) / denominator
+    return max(center - half_width, 0.0), min(center + half_width, 1.0)
+
+
+def score_to_elo(score: float):
+    """Converts an expected score into an Elo difference, clipped to +-1000 for certain results"""
+    score = min(max(score, 1e-3 / 2), 1 - 1e-3 / 2)
+    return max(min(-400 * math.log10(1 / score - 1), 1000.0), -1000.0)
+
+
+def fit_elo(names, matches, prior_draws: float = 1.0, iterations: int = 1000):
+    """
+    Fits Elo ratings to the results of a tournament with the Bradley-Terry model, draws counting as half a win.
+    A few virtual draws between every pair of agents keep the ratings finite when a match is won every time
+    :param names: the names of the agents
+    :param matches: the MatchResult of every pair of agents
+    :param prior_draws: the virtual draws added to every match
+    :param iterations: the maximum number of iterations of the fit
+    :return: a dictionary mapping each name to its rating, the ratings have mean 0
+    """
+    index = {name: i for i, name in enumerate(names)}
+    scores = np.zeros(len(names))
+    games = np.zeros((len(names), len(names)))
+    for match in matches:
+        i, j = index[match.agent], index[match.opponent]
+        scores[i] += match.wins + (match.draws + prior_draws) / 2
+        scores[j] += match.losses + (match.draws + prior_draws) / 2
+        games[i, j] += match.games + prior_draws
+        games[j, i] += match.games + prior_draws
+    strengths = np.ones(len(names))
+    for _ in range(iterations):
+        # minorization-maximization update of the Bradley-Terry strengths
+        denominators = (games / (strengths[:, None] + strengths[None, :])).sum(axis=1)
+        updated = np.where(denominators > 0, scores / np.where(denominators > 0, denominators, 1), strengths)
+        updated /= np.exp(np.mean(np.log(updated)))
+        converged = np.allclose(updated, strengths, rtol=1e-9)
+        strengths = updated
+        if converged:
+            break
+    return {name: float(400 * np.log10(strengths[index[name]])) for name in names}
+
+
+def play_arena_game(first: AgentSpec, second: AgentSpec, seed: int, game: Optional[TicTacToe] = None):
+    """
+    Plays one game between two fresh agents
+    :param first: the agent that moves first
+    :param second: the agent that moves second
+    :param seed: the seed of the random streams of the game
+    :param game: the starting position, an empty tic-tac-toe board if None
+    :return: the winner (1 for the first agent, -1 for the second, 0 for a draw) and the move latencies
+    of the two agents, in seconds
+    """
+    np.random.seed(seed)
+    game = game.copy() if game is not None else TicTacToe()
+    agents = {game.current_player: first.build(game), -game.current_player: second.build(game)}
+    latencies = {game.current_player: [], -game.current_player: []}
+    first_player = game.current_player
+    try:
+        while not game.is_over:
+            start = time.perf_counter()
+            move = agents[game.current_player].get_move(game)
+            latencies[game.current_player].append(time.perf_counter() - start)
+            game.make_move(move)
+    finally:
+        # a pondering agent that did not make the last move is still searching
+        for agent in agents.values():
+            agent.stop_pondering()
+    return game.return_winner() * first_player, latencies[first_player], latencies[-first_player]
+
+
+def run_tournament(specs,
+                   games_per_pair: int,
+                   num_workers: int = 1,
+                   seed: Optional[int] = None,
+                   game: Optional[TicTacToe] = None):
+    """
+    Plays a round robin between the agents: every pair plays games_per_pair games, alternating who moves first
+    :param specs: the AgentSpec of every agent, with distinct names
+    :param games_per_pair: the number of games of each pair of agents
+    :param num_workers: the number of worker processes, the games are played in this process if 1
+    :param seed: the seed the seeds of the games are derived from
+    :param game: the starting position of the games, an empty tic-tac-toe board if None
+    :return: a TournamentReport
+    """
+    if len(set(spec.name for spec in specs)) != len(specs):
+        raise ValueError("The agents of a tournament must have distinct names")
+    pairs = list(itertools.combinations(range(len(specs)), 2))
+    schedule = [(i, j, k) for i, j in pairs for k in range(games_per_pair)]
+    seeds = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(len(schedule))]
+    games = [(specs[i], specs[j]) if k % 2 == 0 else (specs[j], specs[i]) for i, j, k in schedule]
+    start = time.monotonic()
+    if num_workers > 1:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(play_arena_game, first, second, game_seed, game)
+                       for (first, second), game_seed in zip(games, seeds)]
+            outcomes = [future.result() for future in futures]
+    else:
+        outcomes = [play_arena_game(first, second, game_seed, game)
+                    for (first, second), game_seed in zip(games, seeds)]
+    elapsed = time.monotonic() - start
+
+    matches = {(i, j): MatchResult(specs[i].name, specs[j].name) for i, j in pairs}
+    latencies = {spec.name: [] for spec in specs}
+    for (i, j, k), (first, second), (winner, first_latencies, second_latencies) in zip(schedule, games, outcomes):
+        result = winner if first is specs[i] else -winner
+        match = matches[(i, j)]
+        if result == 1:
+            match.wins += 1
+        elif result == -1:
+            match.losses += 1
+        else:
+            match.draws += 1
+        latencies[first.name].extend(first_latencies)
+        latencies[second.name].extend(second_latencies)
+    matches = list(matches.values())
+    ratings = fit_elo([spec.name for spec in specs], matches)
+    return TournamentReport(matches, ratings, latencies, len(schedule), elapsed)
+
+
+if __name__ == "__main__":
+    specs = [AgentSpec("random", RandomAgent),
+             AgentSpec("mcts-100", MCTSAgent, {"num_simulations": 100}),
+             AgentSpec("mcts-1000", MCTSAgent, {"num_simulations": 1000})]
+    report = run_tournament(specs, games_per_pair=20, num_workers=4, seed=0)
+    print(report.summary())
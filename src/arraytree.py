@@ -0,0 +1,492 @@
+import logging
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+import numpy as np
+
+from mcts import MCTS
+from tictactoe import TicTacToe
+
+
+TREE_FIELDS = (("visits", np.int64, 0), ("wins", np.float64, 0), ("parent", np.int32, -1),
+               ("first_child", np.int32, -1), ("num_children", np.int16, 0), ("move", np.int16, -1))
+
+
+class ArrayTree:
+    """
+    Search tree stored as a structure of arrays: every node is an index into preallocated NumPy arrays.
+    The children of a node are stored contiguously, starting at first_child[node]
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Initializes the tree with only the root node (index 0)
+        :param capacity: the number of nodes allocated up front, the arrays grow when it is exceeded
+        """
+        for name, dtype, fill in TREE_FIELDS:
+            setattr(self, name, np.full(capacity, fill, dtype=dtype))
+        self.size = 1
+
+    @property
+    def capacity(self):
+        return len(self.visits)
+
+    def grow(self, min_capacity: int):
+        """
+        Reallocates the arrays so that they can hold at least min_capacity nodes
+        :param min_capacity: the number of nodes the tree must be able to hold
+        """
+        capacity = max(min_capacity, 2 * self.capacity)
+        for name, dtype, fill in TREE_FIELDS:
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add_children(self, node: int, moves):
+        """
+        Adds one child per move to the node, in contiguous slots
+        :param node: the index of the node to expand
+        :param moves: the moves leading to the children
+        :return: the index of the first child
+        """
+        start = self.size
+        end = start + len(moves)
+        if end > self.capacity:
+            self.grow(end)
+        self.parent[start:end] = node
+        self.move[start:end] = moves
+        self.first_child[node] = start
+        self.num_children[node] = len(moves)
+        self.size = end
+        return start
+
+    def children(self, node: int):
+        """Returns the range of indices of the children of the node"""
+        start = self.first_child[node]
+        return range(start, start + self.num_children[node])
+
+    def best_child_by_ucb(self, node: int):
+        """
+        Computes the UCB value of all the children of the node in one vectorized operation
+        :param node: the index of the node
+        :return: the index of the child with the highest UCB value, unvisited children first
+        """
+        start = self.first_child[node]
+        end = start + self.num_children[node]
+        visits = self.visits[start:end]
+        unvisited = np.flatnonzero(visits == 0)
+        if len(unvisited) > 0:
+            return start + int(unvisited[0])
+        ucb = self.wins[start:end] / visits + 2 * np.sqrt(np.log(self.visits[node]) / visits)
+        return start + int(np.argmax(ucb))
+
+    def extract_subtree(self, node: int, collapse_visits: Optional[int] = None):
+        """
+        Copies the subtree of a node into a new tree where the node is the root.
+        The copy is done one level at a time, keeping the children of every node contiguous
+        :param node: the index of the new root
+        :param collapse_visits: if given, the children of the nodes with at most this many visits are left out,
+        except for the children of the new root
+        :return: the new tree
+        """
+        subtree = ArrayTree(capacity=max(1, self.size - node))
+        subtree.visits[0] = self.visits[node]
+        subtree.wins[0] = self.wins[node]
+        subtree.move[0] = self.move[node]
+        old_level = np.array([node], dtype=np.int64)
+        new_level = np.array([0], dtype=np.int64)
+        while len(old_level) > 0:
+            counts = self.num_children[old_level].astype(np.int64)
+            expanded = counts > 0
+            if collapse_visits is not None and old_level[0] != node:
+                expanded &= self.visits[old_level] > collapse_visits
+            old_parents, new_parents, counts = old_level[expanded], new_level[expanded], counts[expanded]
+            offsets = np.cumsum(counts) - counts
+            total = int(counts.sum())
+            old_children = (np.repeat(self.first_child[old_parents] - offsets, counts) + np.arange(total))
+            new_children = subtree.size + np.arange(total)
+            subtree.first_child[new_parents] = subtree.size + offsets
+            subtree.num_children[new_parents] = counts
+            subtree.parent[new_children] = np.repeat(new_parents, counts)
+            for name in ("visits", "wins", "move"):
+                getattr(subtree, name)[new_children] = getattr(self, name)[old_children]
+            subtree.size += total
+            old_level, new_level = old_children, new_children
+        return subtree
+
+    def trimmed(self):
+        """Returns the arrays cut to the number of nodes actually used"""
+        return {name: getattr(self, name)[:self.size].copy() for name, _, _ in TREE_FIELDS}
+
+    def __getstate__(self):
+        state = self.trimmed()
+        state["size"] = self.size
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+
+class SharedArrayTree(ArrayTree):
+    """
+    ArrayTree with a fixed capacity whose arrays live in a shared memory block,
+    so that several processes can search the same tree
+    """
+
+    def __init__(self, capacity: int, name: Optional[str] = None):
+        """
+        Creates the shared tree, or attaches to an existing one
+        :param capacity: the number of nodes the tree can hold
+        :param name: the name of the shared memory block to attach to, a new block is created if None
+        """
+        num_bytes = 8 + capacity * sum(np.dtype(dtype).itemsize for _, dtype, _ in TREE_FIELDS)
+        self.shared_memory = SharedMemory(name=name, create=name is None, size=num_bytes)
+        self.header = np.ndarray(1, dtype=np.int64, buffer=self.shared_memory.buf)
+        offset = 8
+        # the fields are sorted by decreasing item size, so every array is aligned
+        for field_name, dtype, fill in TREE_FIELDS:
+            array = np.ndarray(capacity, dtype=dtype, buffer=self.shared_memory.buf, offset=offset)
+            if name is None:
+                array.fill(fill)
+            setattr(self, field_name, array)
+            offset += array.nbytes
+        if name is None:
+            self.size = 1
+
+    @classmethod
+    def from_tree(cls, tree: ArrayTree, capacity: int):
+        """
+        Copies a tree into a new shared tree
+        :param tree: the tree to copy
+        :param capacity: the capacity of the shared tree
+        :return: the shared tree
+        """
+        shared = cls(max(capacity, tree.size))
+        for name, _, _ in TREE_FIELDS:
+            getattr(shared, name)[:tree.size] = getattr(tree, name)[:tree.size]
+        shared.size = tree.size
+        return shared
+
+    @property
+    def name(self):
+        return self.shared_memory.name
+
+    @property
+    def size(self):
+        return int(self.header[0])
+
+    @size.setter
+    def size(self, value: int):
+        self.header[0] = value
+
+    def grow(self, min_capacity: int):
+        raise MemoryError(f"The shared tree is full: {min_capacity} nodes needed, capacity is {self.capacity}")
+
+    def to_tree(self):
+        """Copies the shared tree into a regular ArrayTree"""
+        tree = ArrayTree(capacity=self.size)
+        tree.__setstate__(dict(self.trimmed(), size=self.size))
+        return tree
+
+    def close(self, unlink: bool = False):
+        """
+        Detaches from the shared memory block
+        :param unlink: if True, the block is also destroyed
+        """
+        for name, _, _ in TREE_FIELDS:
+            setattr(self, name, None)
+        self.header = None
+        self.shared_memory.close()
+        if unlink:
+            self.shared_memory.unlink()
+
+    def __getstate__(self):
+        raise TypeError("Shared trees cannot be pickled, copy them with to_tree first")
+
+
+class ArrayMCTS(MCTS):
+    """
+    MCTS over an ArrayTree. Nodes are integer indices and game states are not stored:
+    they are rebuilt by replaying the moves from the root state while descending the tree
+    """
+    tree_backend = "arrays"
+
+    def __init__(self, game: TicTacToe, num_simulations=1000, capacity: int = 1024, **kwargs):
+        """
+        Initializes the MCTS algorithm
+        :param game: the game to play
+        :param num_simulations: the number of simulations an agent will do before considering a move
+        :param capacity: the number of nodes allocated up front
+        :param kwargs: the other search options of MCTS, except for transpositions and the solver which need Node trees
+        """
+        if kwargs.get("use_transpositions"):
+            raise ValueError("Transpositions are not supported by the arrays tree backend")
+        if kwargs.get("use_solver"):
+            raise ValueError("The solver is not supported by the arrays tree backend")
+        if kwargs.get("expansion", "eager") != "eager":
+            raise ValueError("The arrays tree backend stores the children of a node together, so it expands eagerly")
+        self.capacity = capacity
+        super().__init__(game, num_simulations, **kwargs)
+
+    def reset_root(self, game: TicTacToe):
+        """
+        Discards the tree and starts a new one from the given game state
+        :param game: the game state of the new root
+        """
+        self.root_state = game.copy()
+        self.root_symmetry = None
+        self.tree = ArrayTree(self.capacity)
+        self.root = 0
+        return self.root
+
+    def find_node(self, game: TicTacToe):
+        """
+        Finds the node of the tree corresponding to the given game state
+        :param game: the game state to look for
+        :return: the index of the node, None if the position is not in the tree
+        """
+        history = self.root_state.game_history
+        if game.game_history[:len(history)] != history:
+            return None
+        node = self.root
+        for move in game.game_history[len(history):]:
+            children = self.tree.children(node)
+            matches = np.flatnonzero(self.tree.move[children.start:children.stop] == move)
+            if len(matches) == 0:
+                return None
+            node = children.start + int(matches[0])
+        if not np.array_equal(self.get_game_state(node).board, game.board):
+            return None
+        return node
+
+    def reroot(self, game: TicTacToe):
+        """
+        Moves the root to the node of the tree matching the given game state, so that the search done
+        on the previous moves is reused. The subtree is copied into a new compact tree and the rest is released
+        :param game: the current game state
+        :return: the index of the new root
+        """
+        node = self.find_node(game)
+        if node is None:
+            return self.reset_root(game)
+        if node != self.root:
+            self.tree = self.tree.extract_subtree(node)
+            self.root_state = game.copy()
+        return self.root
+
+    def get_visits(self, node: int):
+        """Returns the number of visits of a node"""
+        return int(self.tree.visits[node])
+
+    def root_child_statistics(self, node: Optional[int] = None):
+        """
+        Returns the statistics of the children of a node
+        :param node: the index of the node, the root if None
+        :return: a dictionary mapping each move to the visits and wins of the child
+        """
+        node = self.root if node is None else node
+        return {int(self.tree.move[child]): (int(self.tree.visits[child]), float(self.tree.wins[child]))
+                for child in self.tree.children(node)}
+
+    def merge_root_child_statistics(self, node: int, statistics: dict):
+        """
+        Adds the statistics of the children of a node computed by another tree
+        :param node: the index of the node to update
+        :param statistics: a dictionary mapping each move to the visits and wins to add. The children of a node
+        are stored together, so all of them are added, and the statistics are dropped if they do not fit in the
+        node budget
+        """
+        if self.tree.num_children[node] == 0:
+            if not self.has_room_for(len(self.get_game_state(node).get_possible_moves())):
+                return
+            self.expand_node(node)
+        children = self.tree.children(node)
+        child_of_move = {int(self.tree.move[child]): child for child in children}
+        for move, (visits, wins) in statistics.items():
+            self.tree.visits[child_of_move[move]] += visits
+            self.tree.wins[child_of_move[move]] += wins
+            self.tree.visits[node] += visits
+
+    def expand_node(self, node: int):
+        """Adds the children of a node that has none"""
+        if self.tree.num_children[node] == 0:
+            self.tree.add_children(node, self.get_game_state(node).get_possible_moves())
+
+    def get_game_state(self, node: int):
+        """
+        Rebuilds the game state of a node by replaying the moves from the root
+        :param node: the index of the node
+        :return: the game state of the node
+        """
+        moves = []
+        while node != self.root:
+            moves.append(int(self.tree.move[node]))
+            node = self.tree.parent[node]
+        game = self.root_state.copy()
+        for move in reversed(moves):
+            game.make_move(move)
+        return game
+
+    def search_leaf(self, node, path: Optional[list] = None):
+        """Searches the tree for the best leaf node to expand
+        :param node: the index of the node to start the search from
+        :param path: if given, the indices of the nodes visited during the search are appended to it
+        :return: the index of the best leaf node
+        """
+        tree = self.tree
+        if path is not None:
+            path.append(node)
+        while tree.num_children[node] > 0:
+            node = tree.best_child_by_ucb(node)
+            if path is not None:
+                path.append(node)
+        return node
+
+    def select(self, node: int):
+        """
+        Searches the best leaf like search_leaf, replaying the moves on a game state on the way down
+        :param node: the index of the node to start the search from
+        :return: the index of the leaf and its game state
+        """
+        tree = self.tree
+        game = self.get_game_state(node)
+        while tree.num_children[node] > 0:
+            node = tree.best_child_by_ucb(node)
+            game.make_move(int(tree.move[node]))
+        return node, game
+
+    def rollout(self, node, game: Optional[TicTacToe] = None):
+        """Simulates a random game from the current node to the end and returns the winner
+        :param node: the index of the node to simulate from
+        :param game: the game state of the node, rebuilt from the root if not given
+        """
+        game = self.get_game_state(node) if game is None else game
+        if self.rollout_policy is not None:
+            return self.rollout_policy.play(game)
+        while not game.is_over:
+            moves = game.get_possible_moves()
+            move = np.random.choice(moves)
+            game.make_move(move)
+        return game.return_winner()
+
+    def backpropagate(self, node, result, path: Optional[list] = None, weight: int = 1):
+        """Backpropagates the result of a simulation to the root node.
+        The wins of a node are counted from the point of view of the player that moved into it
+        :param node: the index of the node to start the backpropagation from
+        :param result: the winner of the simulation, or the sum of the winners of weight simulations
+        :param path: unused, the parent indices are always followed
+        :param weight: the number of simulations the result is made of
+        """
+        tree = self.tree
+        nodes = []
+        while node != -1:
+            nodes.append(node)
+            node = tree.parent[node]
+        # the player that moved into a node alternates with the depth, starting from the root player's opponent
+        signs = np.where(np.arange(len(nodes) - 1, -1, -1) % 2 == 1, 1, -1) * self.root_state.current_player
+        tree.visits[nodes] += weight
+        tree.wins[nodes] += result * signs
+
+    def select_leaf(self, node: int):
+        """
+        Selects the best leaf below the node, without expanding it
+        :param node: the index of the node to start the search from
+        :return: the index of the leaf, None as path and the game state of the leaf
+        """
+        leaf, game = self.select(node)
+        return leaf, None, game
+
+    def expand_leaf(self, leaf: int, path: Optional[list], game: TicTacToe):
+        """
+        Expands a leaf that has already been visited and moves to its first child
+        :param leaf: the index of the leaf returned by select_leaf
+        :param path: unused, the parent indices are always followed
+        :param game: the game state of the leaf, the move to the child is made on it
+        :return: the index of the node to simulate from, None as path and its game state
+        """
+        if self.tree.visits[leaf] > 0 and not game.is_over and self.has_room_for(len(game.get_possible_moves())):
+            leaf = self.tree.add_children(leaf, game.get_possible_moves())
+            game.make_move(int(self.tree.move[leaf]))
+        return leaf, None, game
+
+    def count_children(self, node: int):
+        """Returns the number of children of a node"""
+        return int(self.tree.num_children[node])
+
+    def tree_size(self):
+        """Returns the number of nodes of the tree"""
+        return int(self.tree.size)
+
+    def node_count(self):
+        """Returns the number of nodes of the tree"""
+        return int(self.tree.size)
+
+    def estimate_node_bytes(self):
+        """Returns the bytes taken by a node in the arrays of the tree"""
+        return sum(np.dtype(dtype).itemsize for _, dtype, _ in TREE_FIELDS)
+
+    def prune_tree(self, target: int, keep: Optional[int] = None):
+        """
+        Collapses the subtrees of the least visited nodes until the tree has at most target nodes, copying
+        the rest of the tree into a new compact tree. The collapsed nodes keep their visits and wins
+        :param target: the number of nodes to shrink the tree to
+        :param keep: the index of a node that is being searched. The copy renumbers the nodes, which the search
+        of a node other than the root cannot follow, so the tree is then left as it is and the expansions that
+        do not fit in the budget are skipped
+        :return: the number of nodes released
+        """
+        tree = self.tree
+        before = tree.size
+        if before <= target or (keep is not None and keep != self.root):
+            return 0
+        expanded = np.flatnonzero(tree.num_children[1:tree.size] > 0) + 1
+        if len(expanded) == 0:
+            return 0
+        threshold = self.collapse_threshold(tree.visits[expanded], tree.num_children[expanded], before - target)
+        self.tree = tree.extract_subtree(self.root, collapse_visits=int(threshold))
+        return self.record_pruning(before)
+
+    def apply_virtual_loss(self, node: int, path: Optional[list], amount: int):
+        """
+        Counts a pending simulation through the node as a loss for every node on its path
+        :param node: the index of the leaf of the pending simulation
+        :param path: unused, the parent indices are always followed
+        :param amount: the virtual loss to add, negative to remove it
+        """
+        tree = self.tree
+        while node != -1:
+            tree.visits[node] += amount
+            tree.wins[node] -= amount
+            node = tree.parent[node]
+
+    def child_items(self, node: int):
+        """Returns the pairs of move and child index of a node"""
+        return [(int(self.tree.move[child]), child) for child in self.tree.children(node)]
+
+    def node_statistics(self, node: int):
+        """Returns the visits and the wins of a node"""
+        return int(self.tree.visits[node]), float(self.tree.wins[node])
+
+    def find_best_move_with_mcts(self, node: Optional[int] = None, print_tree: bool = False):
+        """
+        Finds the move with highest win rate using the MCTS algorithm
+        :param node: the index of the node to start the search from
+        :return: the best move
+        """
+        node = self.root if node is None else node
+        solved_move = self.solved_move(node)
+        if solved_move is not None:
+            return solved_move
+        if self.num_workers > 1:
+            self.run_parallel_search(node)
+        self.build_mcts_tree(node)
+        if print_tree:
+            self.print_tree(node)
+        children = self.tree.children(node)
+        if len(children) == 0:
+            logging.info("No possible moves were found")
+            return None
+        average_wins = self.tree.wins[children.start:children.stop] / np.maximum(
+            self.tree.visits[children.start:children.stop], 1)
+        return int(self.tree.move[children.start + int(np.argmax(average_wins))])
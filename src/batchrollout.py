@@ -0,0 +1,63 @@
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+from bitboard import build_win_lines
+
+"""
+This module contains the vectorized rollouts: many random games are played at once
+as NumPy operations over a (num_games, num_cells) board tensor
+"""
+
+
+@lru_cache(maxsize=None)
+def win_lines_array(horizontal_size: int, vertical_size: int, win_length: Optional[int] = None):
+    """Returns the cells of the winning lines of the board as an array of shape (num_lines, line_length)"""
+    lines = np.array(build_win_lines(horizontal_size, vertical_size, win_length))
+    lines.setflags(write=False)
+    return lines
+
+
+def batch_rollout(boards,
+                  current_players,
+                  num_rollouts: int,
+                  horizontal_size: int = 3,
+                  vertical_size: int = 3,
+                  rng: Optional[np.random.Generator] = None,
+                  win_length: Optional[int] = None):
+    """
+    Plays num_rollouts random games from each of the given positions at once
+    :param boards: the positions, an array of shape (num_positions, num_cells) of 1, -1 and 0
+    :param current_players: the player to move in each position
+    :param num_rollouts: the number of random games played from each position
+    :param rng: the random generator, the global NumPy one if None
+    :param win_length: the number of aligned cells that wins, the full rows, columns and diagonals if None
+    :return: an array with, for each position, the sum of the winners (1, -1 or 0) of its games
+    """
+    boards = np.asarray(boards)
+    lines = win_lines_array(horizontal_size, vertical_size, win_length)
+    line_length = lines.shape[1]
+    num_positions, num_cells = boards.shape
+    board = np.repeat(boards.astype(np.int8), num_rollouts, axis=0)
+    player = np.repeat(np.asarray(current_players, dtype=np.int8), num_rollouts)
+    random = np.random.random if rng is None else rng.random
+
+    line_sums = board[:, lines].sum(axis=2, dtype=np.int16)
+    winner = np.where((line_sums == line_length).any(axis=1), 1,
+                      np.where((line_sums == -line_length).any(axis=1), -1, 0)).astype(np.int8)
+    active = (winner == 0) & (board == 0).any(axis=1)
+    rows = np.flatnonzero(active)
+    while len(rows) > 0:
+        # choose a uniformly random empty cell per game by taking the largest random key among empty cells
+        keys = random((len(rows), num_cells))
+        keys[board[rows] != 0] = -1
+        moves = keys.argmax(axis=1)
+        movers = player[rows]
+        board[rows, moves] = movers
+        won = (board[rows][:, lines].sum(axis=2) == line_length * movers[:, None]).any(axis=1)
+        winner[rows[won]] = movers[won]
+        player[rows] = -movers
+        still_active = ~won & (board[rows] == 0).any(axis=1)
+        rows = rows[still_active]
+    return winner.reshape(num_positions, num_rollouts).sum(axis=1, dtype=np.int64)
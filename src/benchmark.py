@@ -0,0 +1,200 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from bitboard import BitboardTicTacToe
+from mcts import MCTS, create_mcts
+from mnk import MNKGame
+from saver import load_mcts, load_mcts_binary, save_mcts, save_mcts_binary
+from tictactoe import TicTacToe
+
+"""
+This module contains the benchmark suite: game operations, rollouts, tree building, memory per node and
+persistence are measured and written as JSON, and a run can be compared against a stored baseline to flag
+regressions. Run it with
+    python benchmark.py --output results.json [--baseline baseline.json] [--quick]
+"""
+
+DEFAULT_TOLERANCE = 0.10
+
+
+def result(value: float, unit: str, higher_is_better: bool = True):
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def benchmark_game_operations(game_class, duration: float, seed: int = 0):
+    """
+    Plays random games and measures the make_move and return_winner calls per second
+    :param game_class: a function returning a new game
+    :param duration: the seconds the measurement lasts
+    :return: the operations per second, a make_move and a return_winner call counting as one operation each
+    """
+    rng = np.random.default_rng(seed)
+    # draw the moves in advance so that only the game operations are timed
+    orders = [rng.permutation(game_class().get_possible_moves()) for _ in range(64)]
+    operations, elapsed, i = 0, 0.0, 0
+    while elapsed < duration:
+        game = game_class()
+        order = orders[i % len(orders)]
+        start = time.perf_counter()
+        for move in order:
+            game.make_move(move)
+            operations += 2
+            if game.return_winner() is not None:
+                break
+        elapsed += time.perf_counter() - start
+        i += 1
+    return operations / elapsed
+
+
+def benchmark_rollouts(game: TicTacToe, duration: float):
+    """Measures the MCTS.rollout calls per second from the root"""
+    mcts = MCTS(game, num_simulations=1)
+    rollouts, start = 0, time.perf_counter()
+    while time.perf_counter() - start < duration:
+        mcts.rollout(mcts.root)
+        rollouts += 1
+    return rollouts / (time.perf_counter() - start)
+
+
+def benchmark_build(game: TicTacToe, num_simulations: int, tree_backend: str = "nodes"):
+    """Measures the simulations per second of build_mcts_tree from an empty tree"""
+    mcts = create_mcts(game, num_simulations, tree_backend)
+    start = time.perf_counter()
+    mcts.build_mcts_tree()
+    return num_simulations / (time.perf_counter() - start)
+
+
+def benchmark_node_memory(num_simulations: int):
+    """Measures the bytes allocated per Node, including its game state, while building a tree"""
+    np.random.seed(0)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    mcts = MCTS(TicTacToe(), num_simulations)
+    mcts.build_mcts_tree()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return allocated / mcts.tree_size()
+
+
+def benchmark_persistence(num_simulations: int, repeats: int = 3):
+    """
+    Measures the save and load time and the file size of a tree, with the pickle and the binary formats
+    :param repeats: the times are the best of this many runs
+    :return: a dictionary of results
+    """
+    np.random.seed(0)
+    mcts = MCTS(TicTacToe(), num_simulations)
+    mcts.build_mcts_tree()
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                for name, save, load in (("pickle", save_mcts, lambda: load_mcts(mcts)),
+                                         ("binary", save_mcts_binary, lambda: load_mcts_binary(num_simulations))):
+                    before = set(os.listdir(directory))
+                    save_times, load_times = [], []
+                    for _ in range(repeats):
+                        start = time.perf_counter()
+                        save(mcts)
+                        save_times.append(time.perf_counter() - start)
+                        start = time.perf_counter()
+                        loaded = load()
+                        load_times.append(time.perf_counter() - start)
+                        del loaded
+                    filename = (set(os.listdir(directory)) - before).pop()
+                    results[f"save_{name}_seconds"] = result(min(save_times), "s", False)
+                    results[f"load_{name}_seconds"] = result(min(load_times), "s", False)
+                    results[f"{name}_file_bytes"] = result(os.path.getsize(filename), "bytes", False)
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def run_benchmarks(quick: bool = False):
+    """
+    Runs the benchmark suite
+    :param quick: if True, shorter measurements and smaller trees are used
+    :return: a dictionary with the metadata of the run and the results, see result
+    """
+    duration = 0.2 if quick else 1.0
+    sizes = (200, 1000) if quick else (1000, 10000, 50000)
+    np.random.seed(0)
+    results = {}
+    for name, game_class in (("tictactoe", TicTacToe), ("bitboard", BitboardTicTacToe),
+                             ("mnk_15x15x5", lambda: MNKGame(15, 15, 5))):
+        results[f"{name}_ops_per_second"] = result(benchmark_game_operations(game_class, duration), "ops/s")
+    for name, game in (("tictactoe", TicTacToe()), ("bitboard", BitboardTicTacToe())):
+        results[f"{name}_rollouts_per_second"] = result(benchmark_rollouts(game, duration), "rollouts/s")
+    for tree_backend in ("nodes", "arrays", "moves"):
+        for size in sizes:
+            results[f"build_{tree_backend}_{size}_simulations_per_second"] = \
+                result(benchmark_build(TicTacToe(), size, tree_backend), "simulations/s")
+    results["bytes_per_node"] = result(benchmark_node_memory(sizes[-1]), "bytes", False)
+    results.update(benchmark_persistence(sizes[-1]))
+    metadata = {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "quick": quick}
+    return {"metadata": metadata, "results": results}
+
+
+def compare(current: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE):
+    """
+    Compares the results of a run with a baseline run
+    :param current: the run to check
+    :param baseline: the reference run
+    :param tolerance: the relative change beyond which a worse result is a regression
+    :return: a list of (name, baseline value, current value, relative change, is regression) for the results
+    present in both runs, the relative change being positive when the result improved
+    """
+    rows = []
+    for name, measure in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        reference = baseline["results"][name]["value"]
+        value = measure["value"]
+        change = (value - reference) / reference if reference != 0 else 0.0
+        if not measure["higher_is_better"]:
+            change = -change
+        rows.append((name, reference, value, change, change < -tolerance))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the benchmark suite")
+    parser.add_argument("--output", help="the JSON file the results are written to")
+    parser.add_argument("--baseline", help="a JSON file of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="the relative slowdown flagged as a regression")
+    parser.add_argument("--quick", action="store_true", help="shorter measurements and smaller trees")
+    args = parser.parse_args(argv)
+
+    run = run_benchmarks(args.quick)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(run, f, indent=2)
+    else:
+        json.dump(run, sys.stdout, indent=2)
+        print()
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows = compare(run, baseline, args.tolerance)
+    for name, reference, value, change, regression in rows:
+        print(f"{name}: {reference:.4g} -> {value:.4g} ({change:+.1%}){'  REGRESSION' if regression else ''}")
+    return 1 if any(row[4] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+from typing import Optional
+
+import numpy as np
+
+from symmetry import board_symmetries
+from tictactoe import TicTacToe
+
+
+def build_win_lines(horizontal_size: int, vertical_size: int, win_length: Optional[int] = None):
+    """
+    Builds the cells of all the winning lines of a board: rows, columns and, for square boards, diagonals
+    :param horizontal_size: the number of columns of the board
+    :param vertical_size: the number of rows of the board
+    :param win_length: if given, every horizontal, vertical or diagonal segment of this many cells is a line
+    :return: a list with the list of cells of each winning line
+    """
+    if win_length is not None:
+        return build_segment_lines(horizontal_size, vertical_size, win_length)
+    lines = []
+    for i in range(vertical_size):
+        lines.append([i * horizontal_size + j for j in range(horizontal_size)])
+    for j in range(horizontal_size):
+        lines.append([i * horizontal_size + j for i in range(vertical_size)])
+    if horizontal_size == vertical_size:
+        lines.append([i * (horizontal_size + 1) for i in range(vertical_size)])
+        lines.append([(i + 1) * (horizontal_size - 1) for i in range(vertical_size)])
+    return lines
+
+
+def build_segment_lines(horizontal_size: int, vertical_size: int, win_length: int):
+    """
+    Builds the cells of all the segments of win_length cells in the four directions of the board
+    :param horizontal_size: the number of columns of the board
+    :param vertical_size: the number of rows of the board
+    :param win_length: the number of cells of a segment
+    :return: a list with the list of cells of each segment
+    """
+    lines = []
+    for row in range(vertical_size):
+        for column in range(horizontal_size):
+            for row_step, column_step in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                last_row = row + row_step * (win_length - 1)
+                last_column = column + column_step * (win_length - 1)
+                if last_row < vertical_size and 0 <= last_column < horizontal_size:
+                    lines.append([(row + i * row_step) * horizontal_size + column + i * column_step
+                                  for i in range(win_length)])
+    return lines
+
+
+def build_win_masks(horizontal_size: int, vertical_size: int):
+    """
+    Builds the bitmasks of all the winning lines of a board
+    :param horizontal_size: the number of columns of the board
+    :param vertical_size: the number of rows of the board
+    :return: a list with one integer mask per winning line
+    """
+    return [sum(1 << cell for cell in line) for line in build_win_lines(horizontal_size, vertical_size)]
+
+
+def build_cell_win_masks(win_masks, num_cells: int):
+    """
+    Groups the winning lines by the cells they pass through
+    :param win_masks: the masks of all the winning lines
+    :param num_cells: the number of cells of the board
+    :return: a tuple with, for each cell, the masks of the winning lines through that cell
+    """
+    return tuple(tuple(mask for mask in win_masks if mask >> cell & 1) for cell in range(num_cells))
+
+
+def build_moves_table(num_cells: int):
+    """
+    Builds the table of the moves available for every mask of empty cells
+    :param num_cells: the number of cells of the board
+    :return: a tuple indexed by empty-cell mask with the tuple of empty cells
+    """
+    return tuple(tuple(cell for cell in range(num_cells) if mask >> cell & 1) for mask in range(1 << num_cells))
+
+
+def build_symmetry_tables(horizontal_size: int, vertical_size: int):
+    """
+    Builds, for every symmetry of the board, the table that maps a player mask to its transformed mask
+    :param horizontal_size: the number of columns of the board
+    :param vertical_size: the number of rows of the board
+    :return: a tuple with one table per symmetry, each indexed by mask
+    """
+    num_cells = horizontal_size * vertical_size
+    tables = []
+    for permutation in board_symmetries(horizontal_size, vertical_size):
+        tables.append(tuple(sum(1 << i for i, cell in enumerate(permutation) if mask >> int(cell) & 1)
+                            for mask in range(1 << num_cells)))
+    return tuple(tables)
+
+
+class BitboardTicTacToe(TicTacToe):
+    """
+    Tic-tac-toe game state stored as two integer bitmasks, one per player.
+    The winner is cached and updated on every move by checking only the
+    winning lines that pass through the last move.
+    """
+    num_cells = TicTacToe.horizontal_size * TicTacToe.vertical_size
+    full_mask = (1 << num_cells) - 1
+    win_masks = build_win_masks(TicTacToe.horizontal_size, TicTacToe.vertical_size)
+    cell_win_masks = build_cell_win_masks(win_masks, num_cells)
+    moves_table = build_moves_table(num_cells)
+    symmetry_tables = build_symmetry_tables(TicTacToe.horizontal_size, TicTacToe.vertical_size)
+
+    def __init__(self, board=None, current_player: int = 1):
+        self.masks = {1: 0, -1: 0}
+        self.current_player = current_player
+        self.game_history = []
+        self.winner = None
+        if board is not None:
+            for cell, value in enumerate(board):
+                if value != 0:
+                    self.masks[int(value)] |= 1 << cell
+            self.winner = self.compute_winner()
+
+    @property
+    def board(self):
+        """
+        Builds the NumPy representation of the board from the bitmasks
+        :return: an array with 1 and -1 for the cells of the players and 0 for empty cells
+        """
+        board = np.zeros(self.num_cells, dtype=int)
+        for player, mask in self.masks.items():
+            for cell in self.moves_table[mask]:
+                board[cell] = player
+        return board
+
+    @property
+    def occupied_mask(self):
+        return self.masks[1] | self.masks[-1]
+
+    def compute_winner(self):
+        """
+        Checks the whole board against the win masks, used when the masks are set without make_move
+        :return: the player that has won the game, None if no player has won, 0 for a draw.
+        """
+        for player in (1, -1):
+            mask = self.masks[player]
+            for win_mask in self.win_masks:
+                if mask & win_mask == win_mask:
+                    return player
+        if self.occupied_mask == self.full_mask:
+            return 0
+        return None
+
+    def return_winner(self):
+        """
+        Returns the cached winner of the game
+        :return: the player that has won the game, None if no player has won, 0 for a draw.
+        """
+        return self.winner
+
+    @property
+    def is_over(self):
+        return self.winner is not None
+
+    def make_move(self, move: int):
+        """
+        Makes a move on the board for the current player and starts the turn of the other player
+        :param move: the position to make the move at
+        """
+        move = int(move)
+        if 0 <= move < self.num_cells and not self.occupied_mask >> move & 1:
+            player = self.current_player
+            mask = self.masks[player] | 1 << move
+            self.masks[player] = mask
+            self.game_history.append(move)
+            self.current_player = -player
+            if self.winner is None:
+                for win_mask in self.cell_win_masks[move]:
+                    if mask & win_mask == win_mask:
+                        self.winner = player
+                        return
+                if self.occupied_mask == self.full_mask:
+                    self.winner = 0
+        else:
+            raise ValueError(
+                "Invalid move: a player has already made a move at this position or the move is out of bounds")
+
+    def undo_move(self):
+        """
+        Takes back the last move in place, the inverse of make_move
+        :return: the move taken back
+        """
+        if len(self.game_history) == 0:
+            raise ValueError("There is no move to undo")
+        move = self.game_history.pop()
+        self.current_player = -self.current_player
+        self.masks[self.current_player] &= ~(1 << move)
+        if self.winner is not None:
+            # the game was over after the move, and could only have been over before it if moves were made after
+            self.winner = self.compute_winner()
+        return move
+
+    def copy(self):
+        """
+        Returns a copy of the game state without going through __init__
+        :return: a new game state equal to the current one
+        """
+        game = BitboardTicTacToe.__new__(BitboardTicTacToe)
+        game.masks = self.masks.copy()
+        game.current_player = self.current_player
+        game.game_history = self.game_history.copy()
+        game.winner = self.winner
+        return game
+
+    def get_updated_game_state(self, move: int):
+        """
+        Returns a new game state with the given move made
+        :param move: the move to make
+        :return: a new game state with the given move made
+        """
+        game = self.copy()
+        game.make_move(move)
+        return game
+
+    def get_possible_moves(self):
+        """
+        Finds all possible moves on the board from the mask of the empty cells
+        :return: a list of possible moves
+        """
+        return list(self.moves_table[self.full_mask & ~self.occupied_mask])
+
+    def canonical_key(self):
+        """
+        Returns a key shared by all the game states that are equal up to a rotation or reflection of the board
+        :return: a tuple with the canonical pair of masks and the current player
+        """
+        first, second = self.masks[1], self.masks[-1]
+        code = min(table[first] | table[second] << self.num_cells for table in self.symmetry_tables)
+        return code, self.current_player
+
+    def reset(self):
+        """
+        Resets the game
+        """
+        self.masks = {1: 0, -1: 0}
+        self.current_player = 1
+        self.game_history = []
+        self.winner = None
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __getstate__(self):
+        return self.__dict__.copy()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+
+if __name__ == "__main__":
+    game = BitboardTicTacToe()
+    game.make_move(1)
+    game.make_move(0)
+    game.make_move(3)
+    game.make_move(2)
+    game.make_move(5)
+    game.make_move(6)
+    game.make_move(4)
+    print(game.game_history)
+    print(game.return_winner())
+    print(game.is_over)
+    game.print_board()
@@ -0,0 +1,89 @@
+import os
+import pickle
+import re
+import time
+from typing import Optional
+
+"""
+This module contains the checkpoints written while building a tree, so that a long
+build can be resumed after a crash instead of starting over
+"""
+
+CHECKPOINT_PATTERN = re.compile(r"checkpoint_(\d+)\.pkl$")
+
+
+class Checkpointer:
+    def __init__(self,
+                 directory: str,
+                 interval: Optional[int] = None,
+                 period: Optional[float] = None,
+                 keep: int = 2):
+        """
+        Saves checkpoints of an MCTS object every interval simulations and/or every period seconds
+        :param directory: the directory the checkpoints are written to
+        :param interval: the number of simulations between two checkpoints
+        :param period: the number of seconds between two checkpoints
+        :param keep: the number of most recent checkpoints kept on disk
+        """
+        self.directory = directory
+        self.interval = interval
+        self.period = period
+        self.keep = keep
+        self.last_visits = None
+        self.last_time = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+
+    def maybe_save(self, mcts, visits: int):
+        """
+        Saves a checkpoint when the visits cross a multiple of the interval or when the period has
+        elapsed since the last checkpoint
+        :param mcts: the MCTS object to save
+        :param visits: the current number of visits of the node being built
+        """
+        if self.last_visits is None:
+            self.last_visits = visits
+        if (self.interval is not None and visits // self.interval > self.last_visits // self.interval) or \
+                (self.period is not None and time.monotonic() - self.last_time >= self.period):
+            self.save(mcts, visits)
+
+    def save(self, mcts, visits: int):
+        """
+        Writes a checkpoint atomically: the file is written under a temporary name and then renamed,
+        so a crash while saving never leaves a truncated newest checkpoint
+        :param mcts: the MCTS object to save
+        :param visits: the current number of visits of the node being built
+        """
+        filename = os.path.join(self.directory, f"checkpoint_{visits:012d}.pkl")
+        with open(filename + ".tmp", "wb") as f:
+            pickle.dump(mcts, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(filename + ".tmp", filename)
+        self.last_visits = visits
+        self.last_time = time.monotonic()
+        for old in list_checkpoints(self.directory)[:-self.keep]:
+            os.remove(old)
+
+
+def list_checkpoints(directory: str):
+    """
+    Lists the checkpoints of a directory
+    :param directory: the checkpoint directory
+    :return: the paths of the checkpoints, from the oldest to the newest
+    """
+    if not os.path.isdir(directory):
+        return []
+    checkpoints = [(int(match.group(1)), name) for name in os.listdir(directory)
+                   if (match := CHECKPOINT_PATTERN.match(name))]
+    return [os.path.join(directory, name) for _, name in sorted(checkpoints)]
+
+
+def load_latest_checkpoint(directory: str):
+    """
+    Loads the newest checkpoint of a directory
+    :param directory: the checkpoint directory
+    :return: the MCTS object, None if there are no checkpoints
+    """
+    checkpoints = list_checkpoints(directory)
+    if len(checkpoints) == 0:
+        return None
+    with open(checkpoints[-1], "rb") as f:
+        return pickle.load(f)
@@ -0,0 +1,250 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+import numpy as np
+
+from batchrollout import batch_rollout
+from tictactoe import TicTacToe
+
+"""
+This module contains the evaluators used by the AlphaZero-style search: an evaluator gives, for a batch of
+positions, the prior probability of every move and the value of the position for the player to move
+"""
+
+
+def legal_moves_mask(games):
+    """
+    Builds the mask of the legal moves of a batch of positions
+    :param games: the game states
+    :return: a boolean array of shape (num_games, num_cells)
+    """
+    return np.array([game.board == 0 for game in games]) & ~np.array([[game.is_over] for game in games])
+
+
+def normalize_priors(weights, legal):
+    """
+    Restricts non-negative move weights to the legal moves and normalizes them, uniform if they are all zero
+    :param weights: an array of shape (num_games, num_cells)
+    :param legal: the mask of the legal moves
+    :return: the priors, an array of shape (num_games, num_cells)
+    """
+    weights = np.where(legal, weights, 0.0)
+    totals = weights.sum(axis=1, keepdims=True)
+    uniform = legal / np.maximum(legal.sum(axis=1, keepdims=True), 1)
+    return np.where(totals > 0, weights / np.where(totals > 0, totals, 1), uniform)
+
+
+class Evaluator:
+    def evaluate_batch(self, games):
+        """
+        Evaluates a batch of positions of the same game
+        :param games: the game states
+        :return: the priors, an array of shape (num_games, num_cells) that is zero for illegal moves,
+        and the values for the players to move, an array of shape (num_games,) in [-1, 1]
+        """
+        raise NotImplementedError
+
+    def evaluate(self, game: TicTacToe):
+        """
+        Evaluates a single position
+        :param game: the game state
+        :return: the priors of the moves and the value for the player to move
+        """
+        priors, values = self.evaluate_batch([game])
+        return priors[0], float(values[0])
+
+
+class RolloutEvaluator(Evaluator):
+    def __init__(self, num_rollouts: int = 1, rng: Optional[np.random.Generator] = None):
+        """
+        Evaluator giving uniform priors and the average result of random games, the same information
+        the rollouts of MCTS use
+        :param num_rollouts: the number of random games played from each position
+        :param rng: the random generator, the global NumPy one if None
+        """
+        self.num_rollouts = num_rollouts
+        self.rng = rng
+
+    def evaluate_batch(self, games):
+        game = games[0]
+        players = np.array([game.current_player for game in games])
+        sums = batch_rollout([game.board for game in games], players, self.num_rollouts, game.horizontal_size,
+                             game.vertical_size, rng=self.rng, win_length=game.win_length)
+        legal = legal_moves_mask(games)
+        return normalize_priors(legal.astype(float), legal), sums * players / self.num_rollouts
+
+
+class MLPEvaluator(Evaluator):
+    def __init__(self, num_cells: int = 9, hidden_sizes=(64, 64), seed: Optional[int] = None, weights=None):
+        """
+        Reference NumPy multilayer perceptron with a policy head and a value head. The input has one plane for
+        the stones of the player to move and one for the stones of the opponent
+        :param num_cells: the number of cells of the board
+        :param hidden_sizes: the sizes of the hidden layers
+        :param seed: the seed of the random initialization of the weights
+        :param weights: the weights to use instead of a random initialization, as returned by get_weights
+        """
+        if weights is not None:
+            self.set_weights(weights)
+            return
+        rng = np.random.default_rng(seed)
+        sizes = [2 * num_cells, *hidden_sizes]
+        self.layers = [(rng.normal(0, np.sqrt(2 / n_in), (n_in, n_out)), np.zeros(n_out))
+                       for n_in, n_out in zip(sizes[:-1], sizes[1:])]
+        self.policy_head = (rng.normal(0, np.sqrt(1 / sizes[-1]), (sizes[-1], num_cells)), np.zeros(num_cells))
+        self.value_head = (rng.normal(0, np.sqrt(1 / sizes[-1]), (sizes[-1], 1)), np.zeros(1))
+
+    @staticmethod
+    def features(games):
+        """
+        Encodes a batch of positions from the point of view of the players to move
+        :param games: the game states
+        :return: an array of shape (num_games, 2 * num_cells)
+        """
+        boards = np.array([game.board * game.current_player for game in games])
+        return np.concatenate([boards == 1, boards == -1], axis=1).astype(np.float32)
+
+    def forward(self, features):
+        """
+        Runs the network on a batch of features
+        :param features: the input, as returned by features
+        :return: the policy logits and the values of the positions
+        """
+        x = features
+        for weights, bias in self.layers:
+            x = np.maximum(x @ weights + bias, 0)
+        logits = x @ self.policy_head[0] + self.policy_head[1]
+        values = np.tanh(x @ self.value_head[0] + self.value_head[1])[:, 0]
+        return logits, values
+
+    def evaluate_batch(self, games):
+        logits, values = self.forward(self.features(games))
+        weights = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return normalize_priors(weights, legal_moves_mask(games)), values
+
+    def get_weights(self):
+        """Returns the weights of the network as a dictionary of arrays"""
+        weights = {"policy_weights": self.policy_head[0], "policy_bias": self.policy_head[1],
+                   "value_weights": self.value_head[0], "value_bias": self.value_head[1]}
+        for i, (layer_weights, bias) in enumerate(self.layers):
+            weights[f"layer{i}_weights"], weights[f"layer{i}_bias"] = layer_weights, bias
+        return weights
+
+    def set_weights(self, weights: dict):
+        """Sets the weights of the network from a dictionary of arrays, see get_weights"""
+        num_layers = sum(1 for name in weights if name.endswith("_weights") and name.startswith("layer"))
+        self.layers = [(np.asarray(weights[f"layer{i}_weights"]), np.asarray(weights[f"layer{i}_bias"]))
+                       for i in range(num_layers)]
+        self.policy_head = (np.asarray(weights["policy_weights"]), np.asarray(weights["policy_bias"]))
+        self.value_head = (np.asarray(weights["value_weights"]), np.asarray(weights["value_bias"]))
+
+    def save(self, filename: str):
+        np.savez(filename, **self.get_weights())
+
+    @classmethod
+    def load(cls, filename: str):
+        with np.load(filename) as data:
+            return cls(weights={name: data[name] for name in data.files})
+
+
+class BatchedEvaluator:
+    def __init__(self, evaluator: Evaluator, batch_size: int = 16, timeout: float = 0.001):
+        """
+        Queues the positions submitted by several search threads and evaluates them together. A batch is
+        evaluated as soon as it has batch_size positions, or when its oldest position has waited timeout seconds
+        :param evaluator: the evaluator of the batches
+        :param batch_size: the number of positions that triggers an evaluation
+        :param timeout: the seconds after which an incomplete batch is evaluated
+        """
+        self.evaluator = evaluator
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.condition = threading.Condition()
+        self.pending = []
+        self.pending_since = None
+        self.closed = False
+        self.flusher = None
+        self.num_batches = 0
+        self.num_positions = 0
+
+    def evaluate(self, game: TicTacToe):
+        """
+        Evaluates a position as part of the next batch, blocking until the batch is evaluated
+        :param game: the game state
+        :return: the priors of the moves and the value for the player to move
+        """
+        future = Future()
+        batch = None
+        with self.condition:
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self.flush_expired_batches, daemon=True)
+                self.flusher.start()
+            if len(self.pending) == 0:
+                self.pending_since = time.monotonic()
+            self.pending.append((game, future))
+            if len(self.pending) >= self.batch_size:
+                batch = self.take_batch()
+            else:
+                self.condition.notify()
+        if batch is not None:
+            self.run_batch(batch)
+        return future.result()
+
+    def take_batch(self):
+        """Removes the pending positions from the queue, must be called holding the condition"""
+        batch, self.pending = self.pending, []
+        self.num_batches += 1
+        self.num_positions += len(batch)
+        return batch
+
+    def run_batch(self, batch):
+        try:
+            priors, values = self.evaluator.evaluate_batch([game for game, _ in batch])
+        except Exception as exception:
+            for _, future in batch:
+                future.set_exception(exception)
+            return
+        for i, (_, future) in enumerate(batch):
+            future.set_result((priors[i], float(values[i])))
+
+    def flush_expired_batches(self):
+        """Evaluates the batches whose oldest position has waited longer than the timeout"""
+        while True:
+            with self.condition:
+                while len(self.pending) == 0 and not self.closed:
+                    self.condition.wait()
+                while len(self.pending) > 0 and not self.closed:
+                    remaining = self.pending_since + self.timeout - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                if len(self.pending) == 0 and self.closed:
+                    return
+                batch = self.take_batch() if len(self.pending) > 0 else None
+            if batch is not None:
+                self.run_batch(batch)
+
+    @property
+    def average_batch_size(self):
+        return self.num_positions / self.num_batches if self.num_batches > 0 else 0
+
+    def close(self):
+        """Evaluates the pending positions and stops the flushing thread"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.flusher is not None:
+            self.flusher.join()
+            self.flusher = None
+        self.closed = False
+
+
+if __name__ == "__main__":
+    games = [TicTacToe() for _ in range(4)]
+    for i, game in enumerate(games):
+        game.make_move(i)
+    for evaluator in (RolloutEvaluator(num_rollouts=100), MLPEvaluator(seed=0)):
+        priors, values = evaluator.evaluate_batch(games)
+        print(evaluator.__class__.__name__, np.round(priors[0], 3), np.round(values, 3))
@@ -1,105 +1,759 @@
 import copy
 import logging
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
 
 import numpy as np
 
+from batchrollout import batch_rollout
+from checkpoint import Checkpointer
+from metrics import SearchMetrics
+from solver import SolvedTable
+from symmetry import find_symmetry
+from timecontrol import SearchResult
 from tictactoe import TicTacToe
 from treenode import Node
-from utils import timer
+from utils import deep_sizeof, timer
+
+# the version of the pickled trees. Version 1 trees, saved before the version was recorded, count the wins of a
+# node with a sign depending on the depth of the simulated leaf, they cannot be converted and are rejected
+TREE_FORMAT_VERSION = 2
 
 
 class MCTS:
-    def __init__(self, game: TicTacToe, num_simulations=1000, root: Optional[Node] = None):
+    tree_backend = "nodes"
+
+    def __init__(self,
+                 game: TicTacToe,
+                 num_simulations=1000,
+                 root: Optional[Node] = None,
+                 use_transpositions: bool = False,
+                 num_workers: int = 1,
+                 parallel_mode: str = "root",
+                 simulation_split: Optional[list] = None,
+                 virtual_loss: int = 1,
+                 rollout_batch_size: Optional[int] = None,
+                 seed: Optional[int] = None,
+                 use_solver: bool = False,
+                 solved_table: Optional[SolvedTable] = None,
+                 metrics: Optional[SearchMetrics] = None,
+                 max_nodes: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 prune_fraction: float = 0.25,
+                 expansion: str = "eager",
+                 widening_constant: Optional[float] = None,
+                 widening_exponent: float = 0.5,
+                 rollout_policy=None):
         """
         Initializes the MCTS algorithm
         :param game: the game to play
         :param num_simulations: the number of simulations an agent will do before considering a move
+        :param use_transpositions: if True, positions equal up to move order, rotations and reflections
+        share a single node and its statistics
+        :param num_workers: if larger than 1, the simulations are run by that many workers
+        :param parallel_mode: "root" for independent trees in worker processes whose root statistics are
+        merged, "threads" or "processes" for workers searching the same tree with virtual loss.
+        "processes" needs the arrays tree backend, since the tree is placed in shared memory
+        :param simulation_split: the relative share of the simulations given to each worker in "root" mode
+        :param virtual_loss: the virtual loss added along the path of a pending simulation
+        :param rollout_batch_size: if given, every simulation plays this many random games at once from the
+        leaf with vectorized NumPy operations, and backpropagates them as one weighted update
+        :param seed: the seed the random streams of the workers are derived from
+        :param use_solver: if True, the search proves the values of finished and fully solved subtrees
+        (MCTS-Solver), stops selecting them and backpropagates their exact values
+        :param solved_table: if given, positions found in the table are answered without searching
+        :param metrics: if given, the phases of every step are timed and the tree growth is tracked in it
+        :param max_nodes: if given, the tree never holds more than this many nodes: when a step could exceed
+        it, the subtrees of the least visited nodes are collapsed into the statistics of those nodes, and a leaf
+        that still does not fit is simulated without being expanded
+        :param max_bytes: if given, a budget in bytes converted to a node budget with estimate_node_bytes
+        :param prune_fraction: the share of the node budget freed by each pruning
+        :param expansion: "eager" to add all the children of a leaf at once, "lazy" to add one child per visit
+        from a list of untried moves built once per node, only the children already added being scored
+        :param widening_constant: with lazy expansion, if given, progressive widening: a node with n visits
+        has at most max(1, widening_constant * n ** widening_exponent) children
+        :param widening_exponent: the exponent of the progressive widening
+        :param rollout_policy: if given, the RolloutPolicy choosing the moves of the rollouts, see rollout_policy.
+        The rollouts are uniformly random if None
         """
+        if expansion not in ("eager", "lazy"):
+            raise ValueError(f"Unknown expansion: {expansion}")
+        if rollout_policy is not None and rollout_batch_size is not None:
+            raise ValueError("The vectorized rollouts of rollout_batch_size are always uniformly random")
         self.game = game
         self.num_simulations = num_simulations
-        self.root = Node(game) if root is None else root
+        self.transposition_table = {} if use_transpositions else None
+        self.num_workers = num_workers
+        self.parallel_mode = parallel_mode
+        self.simulation_split = simulation_split
+        self.virtual_loss = virtual_loss
+        self.rollout_batch_size = rollout_batch_size
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.executor = None
+        self.use_solver = use_solver
+        self.solved_table = solved_table
+        self.metrics = metrics
+        self.prune_fraction = prune_fraction
+        self.expansion = expansion
+        self.widening_constant = widening_constant
+        self.widening_exponent = widening_exponent
+        self.rollout_policy = rollout_policy
+        self.num_nodes = 1
+        self.num_prunes = 0
+        self.num_pruned_nodes = 0
+        self.num_skipped_expansions = 0
+        if root is None:
+            self.reset_root(game)
+        else:
+            self.root = root
+            self.root_symmetry = None
+            if self.transposition_table is not None:
+                self.root.transposition_table = self.transposition_table
+                self.transposition_table[self.root.game_state.canonical_key()] = self.root
+            self.num_nodes = self.tree_size()
+        self.node_budget = self.compute_node_budget(max_nodes, max_bytes)
+
+    def reset_root(self, game: TicTacToe):
+        """
+        Discards the tree and starts a new one from the given game state
+        :param game: the game state of the new root
+        :return: the new root node
+        """
+        self.root = Node(game_state=game.copy(), transposition_table=self.transposition_table)
+        self.root_symmetry = None
+        self.num_nodes = 1
+        if self.transposition_table is not None:
+            self.transposition_table.clear()
+            self.transposition_table[game.canonical_key()] = self.root
+        return self.root
+
+    def reroot(self, game: TicTacToe):
+        """
+        Moves the root to the node of the tree matching the given game state, so that the search done
+        on the previous moves is reused, and releases the rest of the tree.
+        If the position is not in the tree, a new tree is started from it
+        :param game: the current game state
+        :return: the new root node
+        """
+        node = self.find_node(game)
+        if node is None:
+            return self.reset_root(game)
+        self.root = node
+        self.root_symmetry = None
+        if not np.array_equal(node.game_state.board, game.board):
+            # the node was reached through a rotated or reflected transposition of the position
+            self.root_symmetry = find_symmetry(game.board, node.game_state.board,
+                                               game.horizontal_size, game.vertical_size)
+        self.release_unreachable_nodes()
+        return node
+
+    def find_node(self, game: TicTacToe):
+        """
+        Finds the node of the tree corresponding to the given game state
+        :param game: the game state to look for
+        :return: the node, None if the position is not in the tree
+        """
+        if self.transposition_table is not None:
+            return self.transposition_table.get(game.canonical_key())
+        node = self.root
+        history = node.game_state.game_history
+        if game.game_history[:len(history)] != history:
+            return None
+        for move in game.game_history[len(history):]:
+            node = node.children.get(move)
+            if node is None:
+                return None
+        if node.game_state.current_player != game.current_player or \
+                not np.array_equal(node.game_state.board, game.board):
+            return None
+        return node
+
+    def find_or_add_node(self, game: TicTacToe):
+        """
+        Finds the node of a position, adding it to the tree when it is missing. With transpositions the node is
+        added to the table, otherwise the nodes on the moves from the root to the position are expanded
+        :param game: the position
+        :return: the node, None if the position cannot be reached by its moves from the root
+        """
+        node = self.find_node(game)
+        if node is not None:
+            return node
+        if self.transposition_table is not None:
+            node = Node(game_state=game.copy(), transposition_table=self.transposition_table)
+            # the node is not linked to the root, the table shares its subtree with the rest of the tree
+            self.transposition_table[game.canonical_key()] = node
+            return node
+        history = self.get_game_state(self.root).game_history
+        if game.game_history[:len(history)] != history:
+            return None
+        node = self.root
+        for move in game.game_history[len(history):]:
+            children = dict(self.child_items(node))
+            if move not in children:
+                self.expand_node(node)
+                children = dict(self.child_items(node))
+            node = children.get(move)
+            if node is None:
+                return None
+        return node if np.array_equal(self.get_game_state(node).board, game.board) else None
 
-    def search_leaf(self, node):
+    def expand_node(self, node):
+        """Adds to a node all the children it does not have yet"""
+        before = len(node.children)
+        node.add_all_children()
+        node.untried_moves = []
+        self.num_nodes += len(node.children) - before
+
+    def add_child(self, node, move: int):
+        """Adds to a node the child of a move, which is no longer an untried move of the node"""
+        node.add_child_given_move(move)
+        if node.untried_moves is not None and move in node.untried_moves:
+            node.untried_moves.remove(move)
+        self.num_nodes += 1
+
+    def game_move_mapping(self, node, game: TicTacToe):
+        """
+        Returns the function converting the moves of a node to the moves of a position it stands for, which
+        differs from the node when it was reached through a rotated or reflected transposition
+        :param node: the node
+        :param game: the position
+        :return: a function of a move, None being mapped to None
+        """
+        board = self.get_game_state(node).board
+        if np.array_equal(board, game.board):
+            return lambda move: move
+        symmetry = find_symmetry(game.board, board, game.horizontal_size, game.vertical_size)
+        return lambda move: int(symmetry[move]) if move is not None else None
+
+    def release_unreachable_nodes(self, keep=None):
+        """
+        Detaches the root from its parents so that the nodes that can no longer be reached are freed.
+        With transpositions, the table is rebuilt with the nodes reachable from the root and every node
+        is given a parent inside the new tree
+        :param keep: a node whose subtree stays in the table even if the root does not reach it, like a
+        position added to the table on its own
+        """
+        self.root.parent = None
+        if self.transposition_table is None:
+            self.num_nodes = self.tree_size()
+            return
+        self.transposition_table.clear()
+        stack = [self.root] if keep is None else [keep, self.root]
+        for node in stack:
+            self.transposition_table.setdefault(node.game_state.canonical_key(), node)
+        while stack:
+            node = stack.pop()
+            for child in node.children.values():
+                key = child.game_state.canonical_key()
+                if key not in self.transposition_table:
+                    self.transposition_table[key] = child
+                    child.parent = node
+                    stack.append(child)
+        self.num_nodes = len(self.transposition_table)
+
+    def root_move_to_game_move(self, move):
+        """
+        Converts a move of the root node to the orientation of the game the root was found for
+        :param move: a move of the root node
+        :return: the same move on the board of the game
+        """
+        if move is None or self.root_symmetry is None:
+            return move
+        return int(self.root_symmetry[move])
+
+    def search_leaf(self, node, path: Optional[list] = None):
         """Searches the tree for the best leaf node to expand
         :param node: the node to start the search from
+        :param path: if given, the nodes visited during the search are appended to it
         :return: the best leaf node
         """
-        if len(node.children) == 0:
+        if self.expansion == "lazy":
+            return self.search_leaf_lazily(node, path)
+        if path is not None:
+            path.append(node)
+        if len(node.children) == 0 or (self.use_solver and node.proven is not None):
             return node
         else:
-            best_move = node.get_best_move_from_possible_children()  # function already checks if the move is possible
+            # function already checks if the move is possible
+            best_move = node.get_best_move_from_possible_children(skip_proven=self.use_solver)
 
             if best_move is not None:
-                return self.search_leaf(node.children[best_move])
+                return self.search_leaf(node.children[best_move], path)
             return node
 
-    def rollout(self, node):
+    def search_leaf_lazily(self, node, path: Optional[list] = None):
+        """Searches the tree for the best leaf node with lazy expansion: the search stops at the first node
+        that can get a new child, and otherwise only the children already added are scored
+        :param node: the node to start the search from
+        :param path: if given, the nodes visited during the search are appended to it
+        :return: the best leaf node
+        """
+        while True:
+            if path is not None:
+                path.append(node)
+            if len(node.children) == 0 or self.is_proven(node) or self.can_expand(node):
+                return node
+            children = [child for child in node.children.values() if not self.is_proven(child)]
+            if len(children) == 0:
+                return node
+            parent_visits = node.visits
+            node = max(children, key=lambda child: child.compute_ucb(parent_visits))
+
+    def can_expand(self, node):
+        """
+        Checks whether lazy expansion can add a child to the node: it has untried moves, or has never been
+        expanded, and progressive widening allows one more child
+        :param node: the node
+        :return: True if a child can be added
+        """
+        if node.untried_moves is None:
+            return True
+        if len(node.untried_moves) == 0:
+            return False
+        if self.widening_constant is None:
+            return True
+        return len(node.children) < max(1.0, self.widening_constant * node.visits ** self.widening_exponent)
+
+    def rollout(self, node, game: Optional[TicTacToe] = None):
         """Simulates a random game from the current node to the end and returns the winner
         :param node: the node to simulate from
+        :param game: the game state of the node, the node's own if None. The simulation is made on a copy
         """
         if node is None:
             logging.warning("Node is None in rollout")
             return 0
-        game = copy.deepcopy(node.game_state)
+        game = copy.deepcopy(node.game_state if game is None else game)
+        if self.rollout_policy is not None:
+            return self.rollout_policy.play(game)
         while not game.is_over:
             moves = game.get_possible_moves()
             move = np.random.choice(moves)
             game.make_move(move)
         return game.return_winner()
 
-    def backpropagate(self, node, result):
-        """Backpropagates the result of a simulation to the root nodes
+    def batch_rollout(self, node, game: Optional[TicTacToe] = None):
+        """Simulates rollout_batch_size random games at once from the node
+        :param node: the node to simulate from
+        :param game: the game state of the node, the node's own if None
+        :return: the sum of the winners of the games
+        """
+        game = self.get_game_state(node) if game is None else game
+        return int(batch_rollout([game.board], [game.current_player], self.rollout_batch_size,
+                                 game.horizontal_size, game.vertical_size, win_length=game.win_length)[0])
+
+    def simulate(self, node, game: Optional[TicTacToe] = None):
+        """
+        Runs the rollouts of one simulation step from the node
+        :param node: the node to simulate from
+        :param game: the game state of the node
+        :return: the sum of the winners of the rollouts and the number of rollouts
+        """
+        if self.is_proven(node):
+            # the exact value replaces the rollouts, as the winner it corresponds to
+            return -node.proven * self.get_game_state(node).current_player, 1
+        if self.rollout_batch_size is None:
+            return self.rollout(node, game), 1
+        return self.batch_rollout(node, game), self.rollout_batch_size
+
+    def backpropagate(self, node, result, path: Optional[list] = None, weight: int = 1):
+        """Backpropagates the result of a simulation to the root nodes.
+        The wins of a node are counted from the point of view of the player that moved into it
         :param node: the node to start the backpropagation from
-        :param result: the result of the simulation
+        :param result: the winner of the simulation, or the sum of the winners of weight simulations
+        :param path: the nodes visited from the root to the node. Nodes shared by transpositions have
+        several parents, so in that case the result is propagated along the path instead of the parent links
+        :param weight: the number of simulations the result is made of
         """
-        while node != None:
-            node.visits += 1
+        leaf = node
+        result = -result * node.game_state.current_player
+        nodes = reversed(path) if path is not None else self.ancestors(node)
+        for node in nodes:
+            node.visits += weight
             node.wins += result
-            node = node.parent
             result *= -1  # a win for a player in a given node is a loss for the player in the parent node
+        if self.use_solver:
+            self.propagate_proven(leaf, path)
+
+    def propagate_proven(self, node, path: Optional[list] = None):
+        """
+        Proves the values of the node and of its ancestors, going up while new values are proven
+        :param node: the node the backpropagation started from
+        :param path: the nodes visited from the root to the node, as in backpropagate
+        """
+        for node in (reversed(path) if path is not None else self.ancestors(node)):
+            if node.proven is None and not self.prove(node):
+                break
+
+    def prove(self, node):
+        """
+        Tries to prove the value of a node for the player that moved into it: a finished game has the value
+        of its result, a position with a winning move is lost for the player that moved into it, and a
+        position whose moves are all proven has the value of the best of them
+        :param node: the node to prove
+        :return: True if the value of the node is proven
+        """
+        game = node.game_state
+        if game.is_over:
+            node.proven = -game.return_winner() * game.current_player
+        elif len(node.children) == 0:
+            solved = self.solved_table.lookup(game) if self.solved_table is not None else None
+            if solved is None:
+                return False
+            node.proven = -solved[0]
+        elif any(child.proven == 1 for child in node.children.values()):
+            node.proven = -1
+        elif not node.untried_moves and all(child.proven is not None for child in node.children.values()):
+            node.proven = -max(child.proven for child in node.children.values())
+        else:
+            return False
+        return True
 
-    def do_one_step(self, node: Optional[Node] = None):
+    def is_proven(self, node):
+        """Returns True if the solver has proven the value of the node"""
+        return self.use_solver and node.proven is not None
+
+    def solved_move(self, node):
+        """
+        Looks the position of a node up in the solved table
+        :param node: the node
+        :return: the best move of the position, None if there is no table or the position is not in it
+        """
+        if self.solved_table is None:
+            return None
+        solved = self.solved_table.lookup(self.get_game_state(node))
+        return solved[1] if solved is not None else None
+
+    @staticmethod
+    def ancestors(node):
+        """Yields the node and all its ancestors up to the root of the tree"""
+        while node is not None:
+            yield node
+            node = node.parent
+
+    def do_one_step(self, node: Optional[Node] = None, max_simulations: Optional[int] = None):
         """
         Does one step of the MCTS algorithm
+        :param node: the node to start the step from, the root if None
+        :param max_simulations: the simulations left in the budget of the search, a step runs a single one
         """
         node = self.root if node is None else node
-        leaf = self.search_leaf(node)
-        if leaf.visits > 0:
-            leaf.add_all_children()
-            if leaf.best_child:
-                result = self.rollout(leaf.best_child)
-                self.backpropagate(leaf.best_child, result)
-        if leaf.visits == 0:
-            result = self.rollout(leaf)
-            self.backpropagate(leaf, result)
+        self.enforce_node_budget(node)
+        if self.metrics is not None:
+            self.do_one_step_with_metrics(node)
+            return
+        leaf, path, game = self.select_leaf_to_simulate(node)
+        result, weight = self.simulate(leaf, game)
+        self.backpropagate(leaf, result, path, weight)
+
+    def do_one_step_with_metrics(self, node):
+        """
+        Does one step of the MCTS algorithm like do_one_step, timing each phase in self.metrics
+        :param node: the node to start the search from
+        """
+        metrics = self.metrics
+        nodes = self.node_count()
+        start = time.perf_counter_ns()
+        leaf, path, game = self.select_leaf(node)
+        selected = time.perf_counter_ns()
+        expanded_leaf, path, game = self.expand_leaf(leaf, path, game)
+        expanded = time.perf_counter_ns()
+        result, weight = self.simulate(expanded_leaf, game)
+        simulated = time.perf_counter_ns()
+        self.backpropagate(expanded_leaf, result, path, weight)
+        end = time.perf_counter_ns()
+        metrics.record_phase("select", selected - start)
+        metrics.record_phase("expand", expanded - selected)
+        metrics.record_phase("rollout", simulated - expanded)
+        metrics.record_phase("backprop", end - simulated)
+        depth = len(game.game_history) - len(self.get_game_state(node).game_history)
+        metrics.record_step(weight, depth, self.node_count() - nodes)
+        metrics.maybe_log(self)
+
+    def select_leaf_to_simulate(self, node):
+        """
+        Selects the leaf to simulate from, expanding it first if it has already been visited
+        :param node: the node to start the search from
+        :return: the leaf, the path to pass to backpropagate and the game state of the leaf
+        """
+        return self.expand_leaf(*self.select_leaf(node))
+
+    def select_leaf(self, node):
+        """
+        Selects the best leaf below the node, without expanding it
+        :param node: the node to start the search from
+        :return: the leaf, the path to pass to backpropagate and the game state of the leaf
+        """
+        path = [] if self.transposition_table is not None else None
+        leaf = self.search_leaf(node, path)
+        return leaf, path, leaf.game_state
+
+    def expand_leaf(self, leaf, path: Optional[list], game: TicTacToe):
+        """
+        Expands a leaf that has already been visited and moves to its most promising child
+        :param leaf: the leaf returned by select_leaf
+        :param path: the path returned by select_leaf, extended with the child
+        :param game: the game state of the leaf
+        :return: the node to simulate from, the path and its game state
+        """
+        if self.expansion == "lazy":
+            return self.expand_leaf_lazily(leaf, path, game)
+        if leaf.visits > 0 and not game.is_over and not self.is_proven(leaf):
+            if len(leaf.children) == 0:
+                if not self.has_room_for(len(game.get_possible_moves())):
+                    return leaf, path, leaf.game_state
+                leaf.add_all_children()
+                self.num_nodes += len(leaf.children)
+            leaf = leaf.best_child
+            if path is not None:
+                path.append(leaf)
+        return leaf, path, leaf.game_state
+
+    def expand_leaf_lazily(self, leaf, path: Optional[list], game: TicTacToe):
+        """
+        Adds one child to a leaf that has already been visited, for the next of its untried moves.
+        The untried moves are listed in a random order on the first expansion of the leaf
+        :param leaf: the leaf returned by select_leaf
+        :param path: the path returned by select_leaf, extended with the child
+        :param game: the game state of the leaf
+        :return: the node to simulate from, the path and its game state
+        """
+        if leaf.visits == 0 or game.is_over or self.is_proven(leaf) or not self.can_expand(leaf):
+            return leaf, path, leaf.game_state
+        if leaf.untried_moves is None:
+            leaf.untried_moves = [int(move) for move in np.random.permutation(game.get_possible_moves())
+                                  if move not in leaf.children]
+            if len(leaf.untried_moves) == 0:
+                return leaf, path, leaf.game_state
+        if not self.has_room_for(1):
+            return leaf, path, leaf.game_state
+        move = leaf.untried_moves.pop()
+        leaf.add_child_given_move(move)
+        self.num_nodes += 1
+        leaf = leaf.children[move]
+        if path is not None:
+            path.append(leaf)
+        return leaf, path, leaf.game_state
+
+    def count_children(self, node):
+        """Returns the number of children of a node"""
+        return len(node.children)
+
+    def tree_size(self):
+        """Counts the nodes of the tree, each node shared by transpositions once"""
+        seen, stack = {id(self.root)}, [self.root]
+        while stack:
+            for child in stack.pop().children.values():
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    stack.append(child)
+        return len(seen)
+
+    def node_count(self):
+        """Returns the number of nodes of the tree, kept up to date during the search unlike tree_size"""
+        if self.transposition_table is not None:
+            return len(self.transposition_table)
+        return self.num_nodes
+
+    def estimate_node_bytes(self):
+        """
+        Estimates the memory taken by a node of the tree: the node, its game state and its entry in the
+        children of its parent. The estimate is made on a child of the root, deeper nodes having longer histories
+        :return: the estimated bytes per node
+        """
+        game = self.get_game_state(self.root)
+        child = Node(game_state=game.get_updated_game_state(game.get_possible_moves()[0]) if not game.is_over
+                     else game.copy())
+        # the parent, the transposition table and the shared class attributes are not part of the node. The size
+        # of an instance dictionary depends on the nodes created before it, a copy is sized instead
+        return (sys.getsizeof(child) + sys.getsizeof(dict(child.__dict__)) + sys.getsizeof(child.children)
+                + deep_sizeof(child.game_state) + sys.getsizeof({0: child}) - sys.getsizeof({}))
+
+    def compute_node_budget(self, max_nodes: Optional[int], max_bytes: Optional[int]):
+        """
+        Converts the budgets given to __init__ into a number of nodes
+        :return: the smaller of the two budgets in nodes, None if there is no budget
+        """
+        budgets = [] if max_nodes is None else [max_nodes]
+        if max_bytes is not None:
+            budgets.append(max_bytes // self.estimate_node_bytes())
+        if len(budgets) == 0:
+            return None
+        budget = min(budgets)
+        if budget < 2:
+            raise ValueError(f"The memory budget of the tree is too small: {budget} nodes")
+        return budget
+
+    def has_room_for(self, num_nodes: int):
+        """
+        Checks whether num_nodes new nodes fit in the node budget. A leaf that does not fit is simulated
+        without being expanded, so the search goes on with a frozen tree instead of running out of memory
+        :param num_nodes: the number of nodes to add
+        :return: True if there is no budget or the nodes fit in it
+        """
+        if self.node_budget is None or self.node_count() + num_nodes <= self.node_budget:
+            return True
+        self.num_skipped_expansions += 1
+        return False
+
+    def enforce_node_budget(self, node):
+        """
+        Prunes the tree before a step that could exceed the node budget, so that every expansion of the step
+        fits. The node the step starts from and its ancestors are never collapsed
+        :param node: the node the step starts from
+        """
+        if self.node_budget is None:
+            return
+        game = self.get_game_state(self.root)
+        if self.node_count() + game.horizontal_size * game.vertical_size > self.node_budget:
+            self.prune_tree(int(self.node_budget * (1 - self.prune_fraction)), keep=node)
+
+    @staticmethod
+    def collapse_threshold(visits, counts, excess: int):
+        """
+        Finds the visits below which the nodes are collapsed. Visits only decrease going down the tree, so
+        collapsing every node with at most t visits releases exactly the children of those nodes
+        :param visits: the visits of the expanded nodes that can be collapsed
+        :param counts: the number of children of the same nodes
+        :param excess: the number of nodes to release
+        :return: the smallest threshold releasing at least excess nodes, or all that can be released
+        """
+        visits = np.asarray(visits)
+        order = np.argsort(visits, kind="stable")
+        released = np.cumsum(np.asarray(counts)[order])
+        return visits[order[min(int(np.searchsorted(released, excess)), len(order) - 1)]]
+
+    def prune_tree(self, target: int, keep=None):
+        """
+        Collapses the subtrees of the least visited nodes until the tree has at most target nodes. A collapsed
+        node loses its children but keeps its visits and wins, which already sum up the simulations made below
+        it, so it is still selected like any other node and expanded again if the search comes back to it.
+        The root is never collapsed
+        :param target: the number of nodes to shrink the tree to
+        :param keep: a node that is being searched, neither it nor its ancestors are collapsed so that it stays
+        in the tree. Its subtree is pruned like the rest of the tree, even if the root does not reach it
+        :return: the number of nodes released
+        """
+        before = self.node_count()
+        if before <= target:
+            return 0
+        protected = {id(node) for node in self.ancestors(keep)} if keep is not None else set()
+        protected.add(id(self.root))
+        starts = [self.root] if keep is None else [self.root, keep]
+        seen, stack, expanded = set(protected), list(starts), []
+        while stack:
+            for child in stack.pop().children.values():
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    stack.append(child)
+                    if len(child.children) > 0:
+                        expanded.append(child)
+        if len(expanded) == 0:
+            return 0
+        threshold = self.collapse_threshold([node.visits for node in expanded],
+                                            [len(node.children) for node in expanded], before - target)
+        for node in expanded:
+            if node.visits <= threshold:
+                node.children = {}
+                if self.expansion == "lazy":
+                    node.untried_moves = None
+        self.num_nodes = self.tree_size()
+        self.release_unreachable_nodes(keep)
+        return self.record_pruning(before)
+
+    def record_pruning(self, before: int):
+        """Counts a pruning that shrank the tree from before nodes to its current size"""
+        released = before - self.node_count()
+        self.num_prunes += 1
+        self.num_pruned_nodes += released
+        logging.debug("Pruned %s nodes of the search tree, %s left", released, self.node_count())
+        return released
+
+    def memory_usage(self):
+        """
+        Reports the size of the tree and the activity of the node budget
+        :return: a dictionary that can be serialized as JSON
+        """
+        nodes = self.node_count()
+        bytes_per_node = self.estimate_node_bytes()
+        return {"nodes": nodes,
+                "bytes_per_node": bytes_per_node,
+                "estimated_bytes": nodes * bytes_per_node,
+                "node_budget": self.node_budget,
+                "prunes": self.num_prunes,
+                "pruned_nodes": self.num_pruned_nodes,
+                "skipped_expansions": self.num_skipped_expansions}
+
+    def metrics_snapshot(self):
+        """
+        Returns the metrics collected by self.metrics, with the current size and memory use of the tree
+        :return: a dictionary that can be serialized as JSON, None if the metrics are disabled
+        """
+        if self.metrics is None:
+            return None
+        # node_count is kept up to date by the search, tree_size would walk the whole tree at every snapshot
+        snapshot = self.metrics.snapshot(self.node_count())
+        snapshot["memory"] = self.memory_usage()
+        return snapshot
+
+    def apply_virtual_loss(self, node, path: Optional[list], amount: int):
+        """
+        Counts a pending simulation through the node as a loss for every node on its path, so that
+        concurrent searches are steered away from it until its real result is backpropagated
+        :param node: the leaf of the pending simulation
+        :param path: the path returned by select_leaf_to_simulate
+        :param amount: the virtual loss to add, negative to remove it
+        """
+        for node in (path if path is not None else self.ancestors(node)):
+            node.visits += amount
+            node.wins -= amount
 
     @timer
-    def build_mcts_tree(self, node: Optional[Node] = None, print_progress: bool = False):
+    def build_mcts_tree(self,
+                        node: Optional[Node] = None,
+                        print_progress: bool = False,
+                        checkpoint_dir: Optional[str] = None,
+                        checkpoint_interval: Optional[int] = None,
+                        checkpoint_period: Optional[float] = None):
         """
-        Builds the MCTS tree until the number of simulations is reached
+        Builds the MCTS tree until the number of simulations is reached.
+        The building continues from the visits the node already has, so a loaded tree or a
+        checkpoint can be extended by raising num_simulations
         :param node: the node to start the tree building from
+        :param checkpoint_dir: if given, checkpoints of the MCTS object are saved in this directory,
+        see checkpoint.load_latest_checkpoint to resume from them
+        :param checkpoint_interval: the number of simulations between two checkpoints
+        :param checkpoint_period: the number of seconds between two checkpoints
         """
         node = self.root if node is None else node
-        while node.visits < self.num_simulations:
+        checkpointer = None
+        if checkpoint_dir is not None:
+            checkpointer = Checkpointer(checkpoint_dir, checkpoint_interval, checkpoint_period)
+            checkpointer.last_visits = self.get_visits(node)
+        while self.get_visits(node) < self.num_simulations and not self.is_proven(node):
             self.do_one_step(node)
             if print_progress:
                 # print a progress bar of the tree building
-                print(f"\r{node.visits}/{self.num_simulations}", end="")
+                print(f"\r{self.get_visits(node)}/{self.num_simulations}", end="")
+            if checkpointer is not None:
+                checkpointer.maybe_save(self, self.get_visits(node))
+        if checkpointer is not None and checkpointer.last_visits != self.get_visits(node):
+            checkpointer.save(self, self.get_visits(node))
 
-    def print_tree(self, node: Optional[Node] = None):
-        """Prints the tree of moves played by the MCTS algorithm"""
-
-        def print_node(node, indent):
-            if node is None:
-                return
-            if node.visits != 0:
-                print(f"{' ' * indent} State: {node.game_state.game_history} Visits: {node.visits}, Wins: {node.wins}")
-            for child in node.children.values():
-                print_node(child, indent + 4)
+    def print_tree(self, node: Optional[Node] = None, max_depth: Optional[int] = None, min_visits: int = 1,
+                   top_k: Optional[int] = None):
+        """Prints the tree of moves played by the MCTS algorithm
+        :param node: the node to start from, the root if None
+        :param max_depth: if given, the nodes deeper than this are not printed
+        :param min_visits: the nodes with fewer visits are not printed, nor their subtree
+        :param top_k: if given, only the top_k most visited children of every node are printed
+        """
+        from treewalk import walk_tree
 
-        node = self.root if node is None else node
-        print_node(node, 0)
+        for record in walk_tree(self, node, max_depth=max_depth, min_visits=min_visits, top_k=top_k):
+            if record.visits != 0:
+                print(f"{' ' * 4 * record.depth} State: {record.position} Visits: {record.visits}, Wins: {record.wins}")
 
     def find_best_move_with_mcts(self, node: Node, print_tree: bool = False):
         """
@@ -107,20 +761,272 @@ class MCTS:
         :param node: the node to start the search from
         :return: the best move
         """
+        solved_move = self.solved_move(node)
+        if solved_move is not None:
+            return solved_move
+        if self.num_workers > 1:
+            self.run_parallel_search(node)
         self.build_mcts_tree(node)
         if print_tree:
             self.print_tree(node)
-        best_move = max(node.children, key=lambda x: node.children[x].average_wins)
-        return best_move
+        return self.best_move_with_proofs(node)
+
+    def best_move_with_proofs(self, node):
+        """
+        Picks the child with the highest average wins. In solver mode proven values replace the averages,
+        so a proven win is always picked and a proven loss only when every move loses
+        :param node: the node to pick the move from
+        :return: the best move
+        """
+        def score(child):
+            if self.use_solver and child.proven is not None:
+                # on a tie with an average, a proven win is preferred and a proven loss avoided
+                return child.proven, child.proven
+            return child.average_wins, 0
+
+        return max(node.children, key=lambda x: score(node.children[x]))
+
+    def search(self,
+               node: Optional[Node] = None,
+               time_budget: Optional[float] = None,
+               deadline: Optional[float] = None,
+               max_simulations: Optional[int] = None,
+               early_stop: bool = True,
+               stop=None):
+        """
+        Anytime search: runs simulations until the deadline or the simulation cap is reached, or until
+        the move find_best_move_with_mcts would pick can no longer change in the remaining budget.
+        Without a deadline and a cap, the simulations needed to reach num_simulations visits are run
+        :param node: the node to search from, the root if None
+        :param time_budget: the seconds the search may take
+        :param deadline: the time.monotonic() value the search must end by
+        :param max_simulations: the maximum number of simulations to run
+        :param early_stop: if False, the whole budget is always used
+        :param stop: if given, a threading.Event that ends the search when it is set, from another thread
+        :return: a SearchResult with the best move found, None if the node got no children, the simulations run and
+        the reason for stopping
+        """
+        node = self.root if node is None else node
+        start = time.monotonic()
+        if time_budget is not None:
+            deadline = start + time_budget if deadline is None else min(deadline, start + time_budget)
+        if deadline is None and max_simulations is None:
+            max_simulations = max(self.num_simulations - self.get_visits(node), 0)
+        start_visits = self.get_visits(node)
+        solved_move = self.solved_move(node)
+        if solved_move is not None:
+            return SearchResult(solved_move, 0, "solved", time.monotonic() - start)
+        stop_reason = "terminal" if self.get_game_state(node).is_over else None
+        while stop_reason is None:
+            now = time.monotonic()
+            simulations = self.get_visits(node) - start_visits
+            remaining = []
+            if max_simulations is not None:
+                remaining.append(max_simulations - simulations)
+            if deadline is not None:
+                rate = simulations / (now - start) if now > start else 0
+                remaining.append(rate * (deadline - now) if now < deadline else 0)
+            has_children = len(self.root_child_statistics(node)) > 0
+            if max_simulations is not None and simulations >= max_simulations:
+                stop_reason = "simulations"
+            elif deadline is not None and now >= deadline:
+                stop_reason = "deadline"
+            elif self.is_proven(node):
+                stop_reason = "proven"
+            elif stop is not None and stop.is_set():
+                stop_reason = "stopped"
+            elif early_stop and has_children and simulations > 0 and \
+                    self.best_move_is_decided(self.root_child_statistics(node), min(remaining)):
+                stop_reason = "decided"
+            else:
+                self.do_one_step(node, max_simulations - simulations if max_simulations is not None else None)
+        statistics = self.root_child_statistics(node)
+        if self.use_solver and len(statistics) > 0:
+            best_move = self.best_move_with_proofs(node)
+        else:
+            best_move = self.best_move_from_statistics(statistics) if len(statistics) > 0 else None
+        return SearchResult(best_move, self.get_visits(node) - start_visits, stop_reason, time.monotonic() - start)
+
+    @staticmethod
+    def best_move_from_statistics(statistics: dict):
+        """
+        Picks the move with the highest average wins, as find_best_move_with_mcts does
+        :param statistics: a dictionary mapping each move to the visits and wins of the child
+        :return: the best move
+        """
+        return max(statistics, key=lambda move: statistics[move][1] / statistics[move][0]
+                   if statistics[move][0] > 0 else 0)
+
+    def best_move_is_decided(self, statistics: dict, remaining: float):
+        """
+        Checks whether the move best_move_from_statistics picks can still be overtaken. In the worst case every
+        remaining simulation is either a loss for the leader or a win for one of the other moves
+        :param statistics: a dictionary mapping each move to the visits and wins of the child
+        :param remaining: the number of simulations left in the budget
+        :return: True if no other move can reach the average wins of the leader
+        """
+        if len(statistics) == 1:
+            return True
+        leader = self.best_move_from_statistics(statistics)
+        leader_visits, leader_wins = statistics[leader]
+        worst_leader = (leader_wins - remaining) / (leader_visits + remaining) if leader_visits + remaining > 0 else 0
+        for move, (visits, wins) in statistics.items():
+            if move != leader:
+                best_other = (wins + remaining) / (visits + remaining) if visits + remaining > 0 else 0
+                if best_other >= worst_leader:
+                    return False
+        return True
+
+    def root_child_statistics(self, node: Optional[Node] = None):
+        """
+        Returns the statistics of the children of a node
+        :param node: the node, the root if None
+        :return: a dictionary mapping each move to the visits and wins of the child
+        """
+        node = self.root if node is None else node
+        return {move: (child.visits, child.wins) for move, child in node.children.items()}
+
+    def merge_root_child_statistics(self, node, statistics: dict):
+        """
+        Adds the statistics of the children of a node computed by another tree. Only the children of the moves
+        of the statistics are added, within the node budget: the statistics of a move whose child does not fit
+        are dropped
+        :param node: the node to update
+        :param statistics: a dictionary mapping each move to the visits and wins to add
+        """
+        self.enforce_node_budget(node)
+        for move, (visits, wins) in statistics.items():
+            if move not in node.children:
+                if not self.has_room_for(1):
+                    continue
+                self.add_child(node, move)
+            node.children[move].visits += visits
+            node.children[move].wins += wins
+            node.visits += visits
+
+    def get_game_state(self, node):
+        """Returns the game state of a node"""
+        return node.game_state
+
+    def child_items(self, node):
+        """Returns the pairs of move and child of a node"""
+        return list(node.children.items())
+
+    def node_statistics(self, node):
+        """Returns the visits and the wins of a node"""
+        return node.visits, node.wins
+
+    def get_visits(self, node):
+        """Returns the number of visits of a node"""
+        return node.visits
+
+    def run_parallel_search(self, node):
+        """
+        Runs the simulations still needed by the node with num_workers workers.
+        In "root" mode each worker process builds an independent tree from the node with its own random
+        stream and the root statistics are merged. In "threads" and "processes" mode the workers search
+        this tree together, using virtual loss to spread over different paths
+        :param node: the node to search from
+        """
+        from parallel import root_parallel_search, tree_parallel_search
+
+        remaining = self.num_simulations - self.get_visits(node)
+        if remaining <= 0:
+            return
+        if self.parallel_mode in ("threads", "processes"):
+            tree_parallel_search(self, node, self.num_workers, virtual_loss=self.virtual_loss,
+                                 use_processes=self.parallel_mode == "processes")
+            return
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.num_workers)
+        statistics = root_parallel_search(self.get_game_state(node), remaining, self.num_workers,
+                                          simulation_split=self.simulation_split,
+                                          seed_sequence=self.seed_sequence,
+                                          tree_backend=self.tree_backend,
+                                          executor=self.executor,
+                                          mcts_kwargs=self.search_options())
+        self.merge_root_child_statistics(node, statistics)
+
+    def search_options(self):
+        """
+        Returns the arguments of __init__ that make another tree search like this one, for the workers of a
+        root-parallel search. The parallel options stay with this tree, the metrics too, and the solved table,
+        which would be copied to every worker, is only looked up by this tree
+        :return: a dictionary of keyword arguments of create_mcts
+        """
+        return {"use_transpositions": self.transposition_table is not None,
+                "rollout_batch_size": self.rollout_batch_size,
+                "use_solver": self.use_solver,
+                "max_nodes": self.node_budget,
+                "prune_fraction": self.prune_fraction,
+                "expansion": self.expansion,
+                "widening_constant": self.widening_constant,
+                "widening_exponent": self.widening_exponent,
+                "rollout_policy": self.rollout_policy}
 
     def __getstate__(self):
         # Return a dictionary representing the object's state
         state = self.__dict__.copy()
+        state["executor"] = None  # process pools cannot be pickled
+        state["format_version"] = TREE_FORMAT_VERSION
         return state
 
     def __setstate__(self, state):
-        # Restore the object's state from the dictionary
+        # Restore the object's state from the dictionary, filling the attributes missing from older files
+        # the trees without a version and without a transposition table were saved by the first version
+        format_version = state.pop("format_version", 1 if "transposition_table" not in state else TREE_FORMAT_VERSION)
+        if format_version != TREE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported tree format version {format_version}, expected {TREE_FORMAT_VERSION}: "
+                             f"the trees saved before version 2 count their wins with another sign, build them again")
+        state.setdefault("transposition_table", None)
+        state.setdefault("root_symmetry", None)
+        state.setdefault("num_workers", 1)
+        state.setdefault("parallel_mode", "root")
+        state.setdefault("simulation_split", None)
+        state.setdefault("virtual_loss", 1)
+        state.setdefault("seed_sequence", np.random.SeedSequence())
+        state.setdefault("executor", None)
+        state.setdefault("use_solver", False)
+        state.setdefault("solved_table", None)
+        state.setdefault("metrics", None)
+        state.setdefault("node_budget", None)
+        state.setdefault("prune_fraction", 0.25)
+        state.setdefault("num_prunes", 0)
+        state.setdefault("num_pruned_nodes", 0)
+        state.setdefault("num_skipped_expansions", 0)
+        state.setdefault("expansion", "eager")
+        state.setdefault("widening_constant", None)
+        state.setdefault("widening_exponent", 0.5)
+        state.setdefault("rollout_policy", None)
         self.__dict__.update(state)
+        if "num_nodes" not in state:
+            self.num_nodes = self.tree_size()
+
+
+def create_mcts(game: TicTacToe, num_simulations=1000, tree_backend: str = "nodes", **kwargs):
+    """
+    Creates the MCTS algorithm with the chosen tree storage
+    :param game: the game to play
+    :param num_simulations: the number of simulations an agent will do before considering a move
+    :param tree_backend: "nodes" for a tree of Node objects, "arrays" for a tree stored in NumPy arrays,
+    "moves" for a tree of nodes storing only their move, searched with a single game state
+    :param kwargs: the other arguments of the chosen MCTS class. Giving an evaluator selects the PUCT search
+    on a tree of Node objects
+    :return: the MCTS object
+    """
+    if tree_backend == "nodes" and kwargs.get("evaluator") is not None:
+        from puct import PUCTMCTS
+        return PUCTMCTS(game, num_simulations, **kwargs)
+    if tree_backend == "nodes":
+        kwargs.pop("evaluator", None)
+        return MCTS(game, num_simulations, **kwargs)
+    if tree_backend == "arrays":
+        from arraytree import ArrayMCTS
+        return ArrayMCTS(game, num_simulations, **kwargs)
+    if tree_backend == "moves":
+        from movetree import MoveMCTS
+        return MoveMCTS(game, num_simulations, **kwargs)
+    raise ValueError(f"Unknown tree backend: {tree_backend}")
 
 
 if __name__ == "__main__":
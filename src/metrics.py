@@ -0,0 +1,91 @@
+import json
+import logging
+import time
+from typing import Optional
+
+"""
+This module contains the instrumentation of the search: when an MCTS object is given a SearchMetrics,
+every step of do_one_step is timed phase by phase (select, expand, rollout, backprop) and the tree growth
+is tracked. Without it do_one_step runs uninstrumented, so disabled metrics cost a single attribute check
+"""
+
+PHASES = ("select", "expand", "rollout", "backprop")
+
+logger = logging.getLogger(__name__)
+
+
+class SearchMetrics:
+    def __init__(self, log_interval: Optional[float] = None, log: Optional[logging.Logger] = None):
+        """
+        Collects the per-phase timings and the tree statistics of a search
+        :param log_interval: if given, a snapshot is logged as JSON every log_interval seconds during the search
+        :param log: the logger of the snapshots, the logger of this module if None
+        """
+        self.log_interval = log_interval
+        self.log = log if log is not None else logger
+        self.reset()
+
+    def reset(self):
+        """Clears the collected metrics"""
+        self.phase_counts = dict.fromkeys(PHASES, 0)
+        self.phase_nanoseconds = dict.fromkeys(PHASES, 0)
+        self.steps = 0
+        self.simulations = 0
+        self.nodes_created = 0
+        self.max_depth = 0
+        self.start_time = time.monotonic()
+        self.last_log_time = self.start_time
+
+    def record_phase(self, phase: str, nanoseconds: int):
+        self.phase_counts[phase] += 1
+        self.phase_nanoseconds[phase] += nanoseconds
+
+    def record_step(self, simulations: int, depth: int, nodes_created: int):
+        """
+        Records the outcome of a step of the search
+        :param simulations: the number of simulations of the step
+        :param depth: the depth of the simulated leaf below the node the search started from
+        :param nodes_created: the number of nodes added to the tree by the step
+        """
+        self.steps += 1
+        self.simulations += simulations
+        self.nodes_created += nodes_created
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def snapshot(self, tree_size: Optional[int] = None):
+        """
+        Returns the metrics collected since the last reset
+        :param tree_size: the number of nodes of the tree, included if given
+        :return: a dictionary that can be serialized as JSON
+        """
+        elapsed = time.monotonic() - self.start_time
+        total = sum(self.phase_nanoseconds.values())
+        phases = {phase: {"count": self.phase_counts[phase],
+                          "seconds": self.phase_nanoseconds[phase] / 1e9,
+                          "mean_microseconds": self.phase_nanoseconds[phase] / 1e3 / self.phase_counts[phase]
+                          if self.phase_counts[phase] > 0 else 0.0,
+                          "share": self.phase_nanoseconds[phase] / total if total > 0 else 0.0}
+                  for phase in PHASES}
+        snapshot = {"elapsed": elapsed,
+                    "steps": self.steps,
+                    "simulations": self.simulations,
+                    "simulations_per_second": self.simulations / elapsed if elapsed > 0 else 0.0,
+                    "nodes_created": self.nodes_created,
+                    "max_depth": self.max_depth,
+                    "phases": phases}
+        if tree_size is not None:
+            snapshot["tree_size"] = tree_size
+        return snapshot
+
+    def maybe_log(self, mcts):
+        """
+        Logs a snapshot if log_interval seconds have elapsed since the last one
+        :param mcts: the MCTS object the metrics belong to, used for the node count it keeps up to date
+        """
+        if self.log_interval is None:
+            return
+        now = time.monotonic()
+        if now - self.last_log_time >= self.log_interval:
+            self.last_log_time = now
+            self.log.info("mcts metrics %s", json.dumps(self.snapshot(mcts.node_count())))
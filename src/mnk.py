@@ -0,0 +1,166 @@
+import numpy as np
+
+from tictactoe import TicTacToe
+
+
+class MNKGame(TicTacToe):
+    """
+    m,n,k game: two players alternate on a board of horizontal_size x vertical_size cells and the first
+    to align win_length stones horizontally, vertically or diagonally wins (e.g. 15x15 five-in-a-row).
+    Only the lines through the last move are checked, and the empty cells are kept in a set
+    that is updated on every move.
+    """
+    directions = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+    def __init__(self,
+                 horizontal_size: int = 15,
+                 vertical_size: int = 15,
+                 win_length: int = 5,
+                 board=None,
+                 current_player: int = 1):
+        """
+        Initializes the game
+        :param horizontal_size: the number of columns of the board
+        :param vertical_size: the number of rows of the board
+        :param win_length: the number of aligned stones that wins the game
+        :param board: the starting position, an empty board if None
+        :param current_player: the player to move
+        """
+        if win_length > max(horizontal_size, vertical_size):
+            raise ValueError("The winning line does not fit on the board")
+        self.horizontal_size = horizontal_size
+        self.vertical_size = vertical_size
+        self.win_length = win_length
+        num_cells = horizontal_size * vertical_size
+        self.board = np.asarray(board, dtype=int).copy() if board is not None else np.zeros(num_cells, dtype=int)
+        self.current_player = current_player
+        self.game_history = []
+        self.empty_cells = set(np.flatnonzero(self.board == 0).tolist())
+        self.winner = self.compute_winner()
+
+    def aligned_through(self, move: int):
+        """
+        Checks whether the stone at move is part of a line of win_length stones of the same player
+        :param move: the cell to check the lines through
+        :return: True if the stone completes a winning line
+        """
+        board, width, height = self.board, self.horizontal_size, self.vertical_size
+        player = board[move]
+        row, column = divmod(move, width)
+        for row_step, column_step in self.directions:
+            count = 1
+            for sign in (1, -1):
+                r, c = row + sign * row_step, column + sign * column_step
+                while 0 <= r < height and 0 <= c < width and board[r * width + c] == player:
+                    count += 1
+                    r, c = r + sign * row_step, c + sign * column_step
+            if count >= self.win_length:
+                return True
+        return False
+
+    def compute_winner(self):
+        """
+        Checks the lines through every stone of the board, used when the board is set without make_move
+        :return: the player that has won the game, None if no player has won, 0 for a draw.
+        """
+        for move in np.flatnonzero(self.board != 0).tolist():
+            if self.aligned_through(move):
+                return int(self.board[move])
+        return 0 if len(self.empty_cells) == 0 else None
+
+    def return_winner(self):
+        """
+        Returns the cached winner of the game
+        :return: the player that has won the game, None if no player has won, 0 for a draw.
+        """
+        return self.winner
+
+    @property
+    def is_over(self):
+        return self.winner is not None
+
+    def make_move(self, move: int):
+        """
+        Makes a move on the board for the current player and starts the turn of the other player
+        :param move: the position to make the move at
+        """
+        move = int(move)
+        if move in self.empty_cells:
+            self.board[move] = self.current_player
+            self.empty_cells.discard(move)
+            self.game_history.append(move)
+            if self.winner is None:
+                if self.aligned_through(move):
+                    self.winner = self.current_player
+                elif len(self.empty_cells) == 0:
+                    self.winner = 0
+            self.current_player = -self.current_player
+        else:
+            raise ValueError(
+                "Invalid move: a player has already made a move at this position or the move is out of bounds")
+
+    def undo_move(self):
+        """
+        Takes back the last move in place, the inverse of make_move
+        :return: the move taken back
+        """
+        if len(self.game_history) == 0:
+            raise ValueError("There is no move to undo")
+        move = self.game_history.pop()
+        self.board[move] = 0
+        self.empty_cells.add(move)
+        self.current_player = -self.current_player
+        if self.winner is not None:
+            # the game was over after the move, and could only have been over before it if moves were made after
+            self.winner = self.compute_winner()
+        return move
+
+    def copy(self):
+        """
+        Returns a copy of the game state without going through __init__
+        :return: a new game state equal to the current one
+        """
+        game = MNKGame.__new__(MNKGame)
+        game.horizontal_size = self.horizontal_size
+        game.vertical_size = self.vertical_size
+        game.win_length = self.win_length
+        game.board = self.board.copy()
+        game.current_player = self.current_player
+        game.game_history = self.game_history.copy()
+        game.empty_cells = self.empty_cells.copy()
+        game.winner = self.winner
+        return game
+
+    def get_possible_moves(self):
+        """
+        Returns the empty cells of the board
+        :return: a list of possible moves
+        """
+        return list(self.empty_cells)
+
+    @property
+    def parameters(self):
+        """Returns the arguments, besides the position, needed to construct an equal game"""
+        return {"horizontal_size": self.horizontal_size, "vertical_size": self.vertical_size,
+                "win_length": self.win_length}
+
+    def reset(self):
+        """
+        Resets the game
+        """
+        super().reset()
+        self.empty_cells = set(range(self.horizontal_size * self.vertical_size))
+        self.winner = None
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+
+if __name__ == "__main__":
+    game = MNKGame(15, 15, 5)
+    for move in (112, 0, 113, 1, 114, 2, 115, 3, 116):
+        game.make_move(move)
+    print(game.game_history)
+    print(game.return_winner())
+    print(game.is_over)
+    print(len(game.get_possible_moves()))
@@ -0,0 +1,252 @@
+import sys
+from typing import Optional
+
+import numpy as np
+
+from mcts import MCTS
+from tictactoe import TicTacToe
+
+
+class MoveNode:
+    """
+    Node of a tree that stores only the move leading to it, without a game state.
+    The slots keep the node small, since it has no attribute dictionary
+    """
+    __slots__ = ("move", "parent", "children", "visits", "wins")
+    transposition_table = None
+
+    def __init__(self, move: Optional[int] = None, parent: Optional['MoveNode'] = None):
+        """
+        Initializes a node of the search tree
+        :param move: the move leading to the node, None for the root
+        :param parent: the parent of the node
+        """
+        self.move = move
+        self.parent = parent
+        self.children = {}
+        self.visits = 0
+        self.wins = 0
+
+    def compute_ucb(self, parent_visits: int):
+        """Computes the UCB value of the node as seen from a parent with the given number of visits"""
+        if self.visits == 0:
+            return float('inf')
+        return self.wins / self.visits + 2 * np.sqrt(np.log(parent_visits) / self.visits)
+
+    @property
+    def average_wins(self):
+        return self.wins / self.visits if self.visits > 0 else 0
+
+    def __repr__(self):
+        return f"Move: {self.move}, Visits: {self.visits}, Wins: {self.wins}"
+
+
+class MoveMCTS(MCTS):
+    """
+    MCTS over a tree of MoveNode objects. A single scratch game state is walked down the tree during the
+    selection with make_move, used in place for the rollout and unwound with undo_move, so a simulation
+    allocates no game state and a node costs only its move, its statistics and its children
+    """
+    tree_backend = "moves"
+
+    def __init__(self, game: TicTacToe, num_simulations=1000, **kwargs):
+        """
+        Initializes the MCTS algorithm
+        :param game: the game to play, it must support undo_move
+        :param num_simulations: the number of simulations an agent will do before considering a move
+        :param kwargs: the other search options of MCTS, except for transpositions and the solver which need
+        game states in the nodes. Several workers are only supported in "root" mode, since the workers of the
+        other modes would share the scratch state
+        """
+        if kwargs.get("use_transpositions"):
+            raise ValueError("Transpositions are not supported by the moves tree backend")
+        if kwargs.get("use_solver"):
+            raise ValueError("The solver is not supported by the moves tree backend")
+        if kwargs.get("expansion", "eager") != "eager":
+            raise ValueError("Lazy expansion is only supported by the nodes tree backend")
+        if kwargs.get("num_workers", 1) > 1 and kwargs.get("parallel_mode", "root") != "root":
+            raise ValueError("The moves tree backend only supports the \"root\" parallel mode")
+        super().__init__(game, num_simulations, **kwargs)
+
+    def reset_root(self, game: TicTacToe):
+        """
+        Discards the tree and starts a new one from the given game state
+        :param game: the game state of the new root
+        :return: the new root node
+        """
+        self.root_state = game.copy()
+        self.scratch = game.copy()
+        self.root_symmetry = None
+        self.root = MoveNode()
+        self.num_nodes = 1
+        return self.root
+
+    def reroot(self, game: TicTacToe):
+        """
+        Moves the root to the node of the tree matching the given game state, so that the search done
+        on the previous moves is reused, and releases the rest of the tree
+        :param game: the current game state
+        :return: the new root node
+        """
+        node = self.find_node(game)
+        if node is None:
+            return self.reset_root(game)
+        self.root = node
+        self.root_state = game.copy()
+        self.scratch = game.copy()
+        self.release_unreachable_nodes()
+        return node
+
+    def find_node(self, game: TicTacToe):
+        """
+        Finds the node of the tree corresponding to the given game state
+        :param game: the game state to look for
+        :return: the node, None if the position is not in the tree
+        """
+        history = self.root_state.game_history
+        if game.game_history[:len(history)] != history:
+            return None
+        node = self.root
+        for move in game.game_history[len(history):]:
+            node = node.children.get(move)
+            if node is None:
+                return None
+        if not np.array_equal(self.get_game_state(node).board, game.board):
+            return None
+        return node
+
+    @staticmethod
+    def moves_to(node):
+        """Returns the moves leading from the root to the node"""
+        moves = []
+        while node.parent is not None:
+            moves.append(node.move)
+            node = node.parent
+        return moves[::-1]
+
+    def get_game_state(self, node):
+        """
+        Rebuilds the game state of a node by replaying the moves from the root
+        :param node: the node
+        :return: a new game state
+        """
+        game = self.root_state.copy()
+        for move in self.moves_to(node):
+            game.make_move(move)
+        return game
+
+    def move_scratch_to(self, node):
+        """
+        Unwinds the scratch state to the root and replays the moves down to the node
+        :param node: the node
+        :return: the scratch state, in the position of the node
+        """
+        game = self.scratch
+        for _ in range(len(game.game_history) - len(self.root_state.game_history)):
+            game.undo_move()
+        if node is not self.root:
+            for move in self.moves_to(node):
+                game.make_move(move)
+        return game
+
+    def select_leaf(self, node):
+        """
+        Selects the best leaf below the node, making the moves of the path on the scratch state
+        :param node: the node to start the search from
+        :return: the leaf, None as path and the scratch state in the position of the leaf
+        """
+        game = self.move_scratch_to(node)
+        while len(node.children) > 0:
+            parent_visits = node.visits
+            node = max(node.children.values(), key=lambda child: child.compute_ucb(parent_visits))
+            game.make_move(node.move)
+        return node, None, game
+
+    def expand_leaf(self, leaf, path: Optional[list], game: TicTacToe):
+        """
+        Expands a leaf that has already been visited and moves to its first child
+        :param leaf: the leaf returned by select_leaf
+        :param path: unused, the parent links are always followed
+        :param game: the scratch state in the position of the leaf, the move to the child is made on it
+        :return: the node to simulate from, None as path and the scratch state
+        """
+        if leaf.visits > 0 and not game.is_over:
+            moves = game.get_possible_moves()
+            if self.has_room_for(len(moves)):
+                leaf.children = {move: MoveNode(move, leaf) for move in moves}
+                self.num_nodes += len(moves)
+                leaf = leaf.children[moves[0]]
+                game.make_move(leaf.move)
+        return leaf, None, game
+
+    def rollout(self, node, game: Optional[TicTacToe] = None):
+        """Simulates a random game on the game state in place and takes its moves back
+        :param node: the node to simulate from
+        :param game: the game state of the node, rebuilt from the root if not given. It is left unchanged
+        :return: the winner
+        """
+        game = self.get_game_state(node) if game is None else game
+        start = len(game.game_history)
+        if self.rollout_policy is not None:
+            winner = self.rollout_policy.play(game)
+        else:
+            while not game.is_over:
+                game.make_move(np.random.choice(game.get_possible_moves()))
+            winner = game.return_winner()
+        for _ in range(len(game.game_history) - start):
+            game.undo_move()
+        return winner
+
+    def backpropagate(self, node, result, path: Optional[list] = None, weight: int = 1):
+        """Backpropagates the result of a simulation to the root node.
+        The wins of a node are counted from the point of view of the player that moved into it
+        :param node: the node to start the backpropagation from
+        :param result: the winner of the simulation, or the sum of the winners of weight simulations
+        :param path: unused, the parent links are always followed
+        :param weight: the number of simulations the result is made of
+        """
+        nodes = list(self.ancestors(node))
+        # the player that moved into a node alternates with the depth, starting from the root player's opponent
+        sign = self.root_state.current_player if len(nodes) % 2 == 0 else -self.root_state.current_player
+        for node in nodes:
+            node.visits += weight
+            node.wins += result * sign
+            sign = -sign
+
+    def expand_node(self, node):
+        """Adds the children of a node that has none"""
+        if len(node.children) == 0:
+            moves = self.get_game_state(node).get_possible_moves()
+            node.children = {move: MoveNode(move, node) for move in moves}
+            self.num_nodes += len(moves)
+
+    def add_child(self, node, move: int):
+        """Adds to a node the child of a move"""
+        node.children[move] = MoveNode(move, node)
+        self.num_nodes += 1
+
+    def estimate_node_bytes(self):
+        """Estimates the memory taken by a node: the node, its empty children and its entry in its parent"""
+        node = MoveNode(0, self.root)
+        return sys.getsizeof(node) + sys.getsizeof(node.children) + sys.getsizeof({0: node}) - sys.getsizeof({})
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.scratch = self.root_state.copy()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["scratch"] = None  # rebuilt from the root state, it may be in the middle of a simulation
+        return state
+
+
+if __name__ == "__main__":
+    import time
+
+    for tree_backend in ("nodes", "moves"):
+        np.random.seed(0)
+        mcts = MCTS(TicTacToe(), 20000) if tree_backend == "nodes" else MoveMCTS(TicTacToe(), 20000)
+        start = time.perf_counter()
+        move = mcts.find_best_move_with_mcts(mcts.root)
+        print(f"{tree_backend}: move {move}, {mcts.tree_size()} nodes of {mcts.estimate_node_bytes()} bytes, "
+              f"{time.perf_counter() - start:.2f} s")
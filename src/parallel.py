@@ -0,0 +1,197 @@
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from mcts import create_mcts
+from tictactoe import TicTacToe
+
+"""
+This module contains the root parallelization of MCTS: several processes build independent
+trees from the same position and only the statistics of the root children are merged
+"""
+
+
+def split_simulations(num_simulations: int, num_workers: int, simulation_split: Optional[list] = None):
+    """
+    Splits the simulations between the workers
+    :param num_simulations: the total number of simulations
+    :param num_workers: the number of workers
+    :param simulation_split: the relative share of each worker, even if None
+    :return: a list with the number of simulations of each worker
+    """
+    weights = np.ones(num_workers) if simulation_split is None else np.asarray(simulation_split, dtype=float)
+    if len(weights) != num_workers:
+        raise ValueError("The simulation split must have one entry per worker")
+    counts = np.floor(num_simulations * weights / weights.sum()).astype(int)
+    # give the simulations lost to rounding to the workers with the largest share
+    counts[np.argsort(-weights)[:num_simulations - counts.sum()]] += 1
+    return counts.tolist()
+
+
+def build_worker_tree(game: TicTacToe, num_simulations: int, seed: int, tree_backend: str = "nodes",
+                      mcts_kwargs: Optional[dict] = None):
+    """
+    Builds a tree in a worker process and returns the statistics of the root children
+    :param game: the game state of the root
+    :param num_simulations: the number of simulations of the worker
+    :param seed: the seed of the random stream of the worker
+    :param tree_backend: the tree storage of the worker
+    :param mcts_kwargs: the other arguments of create_mcts, see MCTS.search_options
+    :return: a dictionary mapping each move to the visits and wins of the root child. With transpositions, the
+    symmetric moves sharing a child are reported once, under the first of them
+    """
+    np.random.seed(seed)
+    mcts = create_mcts(game, num_simulations, tree_backend, **(mcts_kwargs or {}))
+    mcts.build_mcts_tree()
+    statistics = mcts.root_child_statistics()
+    if mcts.transposition_table is not None:
+        first_moves = {}
+        for move, child in mcts.child_items(mcts.root):
+            first_moves.setdefault(id(child), move)
+        statistics = {move: statistics[move] for move in first_moves.values()}
+    return statistics
+
+
+def root_parallel_search(game: TicTacToe,
+                         num_simulations: int,
+                         num_workers: int,
+                         simulation_split: Optional[list] = None,
+                         seed_sequence: Optional[np.random.SeedSequence] = None,
+                         tree_backend: str = "nodes",
+                         executor: Optional[Executor] = None,
+                         mcts_kwargs: Optional[dict] = None):
+    """
+    Builds num_workers independent trees from the same position in parallel and merges the
+    visits and wins of their root children
+    :param game: the game state of the root
+    :param num_simulations: the total number of simulations, split between the workers
+    :param num_workers: the number of worker processes
+    :param simulation_split: the relative share of the simulations of each worker, even if None
+    :param seed_sequence: the seed sequence the random streams of the workers are spawned from
+    :param tree_backend: the tree storage of the workers, "nodes" or "arrays"
+    :param executor: the process pool to use, a temporary one is created if None
+    :param mcts_kwargs: the other arguments of create_mcts for the trees of the workers, like the rollout
+    options, the solver, transpositions, the expansion or the node budget
+    :return: a dictionary mapping each move to the merged visits and wins of the root child
+    """
+    seed_sequence = np.random.SeedSequence() if seed_sequence is None else seed_sequence
+    seeds = [int(child.generate_state(1)[0]) for child in seed_sequence.spawn(num_workers)]
+    counts = split_simulations(num_simulations, num_workers, simulation_split)
+    own_executor = executor is None
+    executor = ProcessPoolExecutor(max_workers=num_workers) if own_executor else executor
+    try:
+        futures = [executor.submit(build_worker_tree, game, count, seed, tree_backend, mcts_kwargs)
+                   for count, seed in zip(counts, seeds) if count > 0]
+        merged = {}
+        for future in futures:
+            for move, (visits, wins) in future.result().items():
+                total_visits, total_wins = merged.get(move, (0, 0))
+                merged[move] = (total_visits + visits, total_wins + wins)
+        return merged
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+
+def run_virtual_loss_worker(mcts, node, num_simulations: int, virtual_loss: int, lock):
+    """
+    Runs simulations on a tree shared with other workers until the node has num_simulations visits.
+    Selection, expansion and backpropagation are done holding the lock, the rollout is done without it
+    :param mcts: the MCTS object of the shared tree
+    :param node: the node to search from
+    :param num_simulations: the number of visits of the node to reach
+    :param virtual_loss: the virtual loss added along the path of a pending simulation
+    :param lock: the lock protecting the tree
+    """
+    while True:
+        with lock:
+            if mcts.get_visits(node) >= num_simulations:
+                return
+            leaf, path, game = mcts.select_leaf_to_simulate(node)
+            mcts.apply_virtual_loss(leaf, path, virtual_loss)
+        result, weight = mcts.simulate(leaf, game)
+        with lock:
+            mcts.apply_virtual_loss(leaf, path, -virtual_loss)
+            mcts.backpropagate(leaf, result, path, weight)
+
+
+def run_shared_tree_worker(name: str, capacity: int, root_state: TicTacToe, node: int, num_simulations: int,
+                           virtual_loss: int, lock, seed: int, rollout_batch_size: Optional[int] = None,
+                           rollout_policy=None):
+    """
+    Attaches to a shared tree in a worker process and searches it with virtual loss
+    :param name: the name of the shared memory block of the tree
+    :param capacity: the capacity of the shared tree
+    :param root_state: the game state of the root of the tree
+    :param node: the index of the node to search from
+    :param num_simulations: the number of visits of the node to reach
+    :param virtual_loss: the virtual loss added along the path of a pending simulation
+    :param lock: the lock protecting the tree
+    :param seed: the seed of the random stream of the worker
+    :param rollout_batch_size: the number of vectorized rollouts per simulation, one regular rollout if None
+    :param rollout_policy: the policy of the rollouts, uniformly random if None
+    """
+    from arraytree import ArrayMCTS, SharedArrayTree
+
+    np.random.seed(seed)
+    mcts = ArrayMCTS(root_state, num_simulations, capacity=1, rollout_batch_size=rollout_batch_size,
+                     rollout_policy=rollout_policy)
+    mcts.tree = SharedArrayTree(capacity, name=name)
+    try:
+        run_virtual_loss_worker(mcts, node, num_simulations, virtual_loss, lock)
+    finally:
+        mcts.tree.close()
+
+
+def tree_parallel_search(mcts, node, num_workers: int, virtual_loss: int = 1, use_processes: bool = False):
+    """
+    Runs num_workers workers searching the same tree until the node has mcts.num_simulations visits.
+    Threads share the tree directly and are useful when the rollouts release the GIL.
+    Processes need an ArrayMCTS: its tree is copied into shared memory for the search and copied back after
+    :param mcts: the MCTS object whose tree is searched
+    :param node: the node to search from
+    :param num_workers: the number of workers
+    :param virtual_loss: the virtual loss added along the path of a pending simulation
+    :param use_processes: if True the workers are processes, otherwise threads
+    """
+    if not use_processes:
+        lock = threading.Lock()
+        threads = [threading.Thread(target=run_virtual_loss_worker,
+                                    args=(mcts, node, mcts.num_simulations, virtual_loss, lock))
+                   for _ in range(num_workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return
+
+    from arraytree import SharedArrayTree
+
+    if mcts.tree_backend != "arrays":
+        raise ValueError("Tree parallelization with processes needs the arrays tree backend")
+    remaining = mcts.num_simulations - mcts.get_visits(node)
+    if remaining <= 0:
+        return
+    # every simulation expands at most one leaf, adding at most one child per cell
+    num_cells = mcts.root_state.horizontal_size * mcts.root_state.vertical_size
+    shared = SharedArrayTree.from_tree(mcts.tree, mcts.tree.size + (remaining + num_workers) * num_cells)
+    lock = multiprocessing.Lock()
+    seeds = [int(child.generate_state(1)[0]) for child in mcts.seed_sequence.spawn(num_workers)]
+    try:
+        processes = [multiprocessing.Process(target=run_shared_tree_worker,
+                                             args=(shared.name, shared.capacity, mcts.root_state, node,
+                                                   mcts.num_simulations, virtual_loss, lock, seed,
+                                                   mcts.rollout_batch_size, mcts.rollout_policy))
+                     for seed in seeds]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        if any(process.exitcode != 0 for process in processes):
+            raise RuntimeError("A tree search worker process failed")
+        mcts.tree = shared.to_tree()
+    finally:
+        shared.close(unlink=True)
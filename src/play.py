@@ -13,24 +13,25 @@ def play_one_game(game: TicTacToe, agent1: Agent, agent2: Agent, current_player:
     """
     if current_player not in [1, -1]:
         raise ValueError("Invalid player: player must be 1 or -1")
-    while not game.is_over:
-        if game.current_player == 1:
-            move = agent1.get_move()
-        else:
-            move = agent2.get_move()
-        game.make_move(move)
-        if print_board:
-            game.board.print_board()
-            print("current player: ", game.current_player)
-            print("Winner: ", game.check_winner())
-            print("Draw: ", game.check_draw())
-    return game.check_winner()
+    try:
+        while not game.is_over:
+            if game.current_player == 1:
+                move = agent1.get_move(game)
+            else:
+                move = agent2.get_move(game)
+            game.make_move(move)
+            if print_board:
+                game.print_board()
+                print("current player: ", game.current_player)
+                print("Winner: ", game.return_winner())
+    finally:
+        agent1.stop_pondering()
+        agent2.stop_pondering()
+    return game.return_winner()
 
 
 if __name__ == "__main__":
     game = TicTacToe()
     agent1 = MCTSAgent(game, num_simulations=1000)
     agent2 = MCTSAgent(game, num_simulations=1000)
-    play_one_game(game, agent1, agent2, print_board=True)
-    print("Winner: ", game.check_winner())
-    print("Draw: ", game.check_draw())
+    print("Winner: ", play_one_game(game, agent1, agent2, print_board=True))
@@ -0,0 +1,204 @@
+import time
+from typing import Optional
+
+from evaluator import BatchedEvaluator, Evaluator, RolloutEvaluator
+from mcts import MCTS
+from tictactoe import TicTacToe
+from treenode import Node
+
+"""
+This module contains the AlphaZero-style search: leaves are scored by an evaluator instead of a rollout,
+and the moves are selected with PUCT using the priors of the evaluator
+"""
+
+
+class PUCTMCTS(MCTS):
+    def __init__(self,
+                 game: TicTacToe,
+                 num_simulations=1000,
+                 evaluator: Optional[Evaluator] = None,
+                 c_puct: float = 1.5,
+                 batch_size: int = 8,
+                 batch_timeout: float = 0.001,
+                 **kwargs):
+        """
+        Initializes the search
+        :param game: the game to play
+        :param num_simulations: the number of simulations an agent will do before considering a move
+        :param evaluator: the evaluator giving the priors and the value of the leaves, random rollouts if None
+        :param c_puct: the weight of the prior in the selection
+        :param batch_size: the number of leaves evaluated together. A single search collects that many leaves
+        with virtual loss before evaluating them, fewer when the budget of the search has fewer simulations left
+        :param batch_timeout: with "threads" workers, the seconds after which an incomplete batch is evaluated
+        :param kwargs: the other search options of MCTS, except for transpositions, the solver, the rollout
+        batches and the rollout policy. Several workers are only supported in "threads" mode
+        """
+        if kwargs.get("use_transpositions") or kwargs.get("use_solver"):
+            raise ValueError("Transpositions and the solver are not supported by the PUCT search")
+        if kwargs.get("rollout_policy") is not None:
+            raise ValueError("The PUCT search evaluates its leaves with the evaluator, not with rollouts")
+        if kwargs.get("expansion", "eager") != "eager":
+            raise ValueError("The PUCT search expands the leaves it evaluates with all their priors")
+        if kwargs.get("num_workers", 1) > 1 and kwargs.get("parallel_mode", "root") != "threads":
+            raise ValueError("The PUCT search only supports the \"threads\" parallel mode")
+        self.evaluator = evaluator if evaluator is not None else RolloutEvaluator()
+        self.c_puct = c_puct
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.batched_evaluator = None
+        self.pending_priors = {}
+        super().__init__(game, num_simulations, **kwargs)
+
+    def search_leaf(self, node, path: Optional[list] = None):
+        """Follows the children with the highest PUCT value down to a node that has not been expanded
+        :param node: the node to start the search from
+        :param path: if given, the nodes visited during the search are appended to it
+        :return: the leaf node
+        """
+        while True:
+            if path is not None:
+                path.append(node)
+            if len(node.children) == 0:
+                return node
+            parent_visits = node.visits
+            node = max(node.children.values(), key=lambda child: child.compute_puct(parent_visits, self.c_puct))
+
+    def select_leaf(self, node):
+        """
+        Selects the leaf to evaluate
+        :param node: the node to start the search from
+        :return: the leaf, the path to pass to backpropagate and the game state of the leaf
+        """
+        leaf = self.search_leaf(node)
+        return leaf, None, leaf.game_state
+
+    def expand_leaf(self, leaf, path: Optional[list], game: TicTacToe):
+        """Leaves are expanded when their evaluation is backpropagated, see backpropagate"""
+        return leaf, path, game
+
+    def expand(self, node: Node, priors):
+        """
+        Adds all the children of a node with the priors given by the evaluator.
+        A node whose children do not fit in the node budget is left unexpanded
+        :param node: the node to expand
+        :param priors: the prior of every cell of the board
+        """
+        if not self.has_room_for(len(node.game_state.get_possible_moves())):
+            return
+        node.add_all_children()
+        self.num_nodes += len(node.children)
+        for move, child in node.children.items():
+            child.prior = float(priors[move])
+
+    def simulate(self, node, game: Optional[TicTacToe] = None):
+        """
+        Evaluates a leaf. The priors are kept until the leaf is expanded by backpropagate
+        :param node: the leaf
+        :param game: the game state of the leaf
+        :return: the value as the winner it corresponds to and a weight of 1
+        """
+        game = node.game_state if game is None else game
+        if game.is_over:
+            return game.return_winner(), 1
+        if self.num_workers > 1:
+            if self.batched_evaluator is None:
+                self.batched_evaluator = BatchedEvaluator(self.evaluator, self.batch_size, self.batch_timeout)
+            priors, value = self.batched_evaluator.evaluate(game)
+        else:
+            priors, value = self.evaluator.evaluate(game)
+        self.pending_priors[node] = priors
+        return value * game.current_player, 1
+
+    def backpropagate(self, node, result, path: Optional[list] = None, weight: int = 1):
+        """Expands the leaf with the priors of its evaluation and backpropagates the value
+        :param node: the evaluated leaf
+        :param result: the value of the leaf as the winner it corresponds to
+        """
+        priors = self.pending_priors.pop(node, None)
+        if priors is not None and len(node.children) == 0:
+            self.expand(node, priors)
+        super().backpropagate(node, result, path, weight)
+
+    def do_one_step(self, node: Optional[Node] = None, max_simulations: Optional[int] = None):
+        """
+        Collects up to batch_size leaves, using virtual loss to spread them over different paths,
+        evaluates them with a single call to the evaluator and backpropagates their values.
+        With metrics, the evaluation is timed as the rollout phase
+        :param node: the node to start the step from, the root if None
+        :param max_simulations: the simulations left in the budget of the search, the batch is not larger.
+        If None, the simulations needed to reach num_simulations visits of the node
+        """
+        node = self.root if node is None else node
+        self.enforce_node_budget(node)
+        metrics = self.metrics
+        start = time.perf_counter_ns() if metrics is not None else 0
+        remaining = self.num_simulations - node.visits if max_simulations is None else max_simulations
+        batch_size = max(min(self.batch_size, remaining), 1)
+        leaves = []
+        for _ in range(batch_size):
+            leaf, _, game = self.select_leaf_to_simulate(node)
+            if any(leaf is other for other, _ in leaves):
+                break
+            self.apply_virtual_loss(leaf, None, self.virtual_loss)
+            leaves.append((leaf, game))
+        to_evaluate = [(leaf, game) for leaf, game in leaves if not game.is_over]
+        results = {}
+        selected = time.perf_counter_ns() if metrics is not None else 0
+        if len(to_evaluate) > 0:
+            priors, values = self.evaluator.evaluate_batch([game for _, game in to_evaluate])
+            for i, (leaf, game) in enumerate(to_evaluate):
+                self.pending_priors[leaf] = priors[i]
+                results[leaf] = float(values[i]) * game.current_player
+        evaluated = time.perf_counter_ns() if metrics is not None else 0
+        for leaf, game in leaves:
+            self.apply_virtual_loss(leaf, None, -self.virtual_loss)
+            self.backpropagate(leaf, game.return_winner() if game.is_over else results[leaf])
+        if metrics is not None:
+            # the expansion happens in backpropagate, so it is counted in the backprop phase
+            metrics.record_phase("select", selected - start)
+            metrics.record_phase("rollout", evaluated - selected)
+            metrics.record_phase("backprop", time.perf_counter_ns() - evaluated)
+            for leaf, game in leaves:
+                metrics.record_step(1, len(game.game_history) - len(node.game_state.game_history), len(leaf.children))
+            metrics.maybe_log(self)
+
+    def run_parallel_search(self, node):
+        super().run_parallel_search(node)
+        if self.batched_evaluator is not None:
+            self.batched_evaluator.close()
+
+    def best_move_with_proofs(self, node):
+        """Picks the most visited child, since the priors leave the other children with few visits"""
+        return max(node.children, key=lambda move: node.children[move].visits)
+
+    @staticmethod
+    def best_move_from_statistics(statistics: dict):
+        """Picks the most visited move, as find_best_move_with_mcts does"""
+        return max(statistics, key=lambda move: statistics[move][0])
+
+    def best_move_is_decided(self, statistics: dict, remaining: float):
+        """
+        Checks whether the most visited move can still be overtaken, if every remaining simulation went to
+        another move
+        :param statistics: a dictionary mapping each move to the visits and wins of the child
+        :param remaining: the number of simulations left in the budget
+        :return: True if no other move can reach the visits of the leader
+        """
+        leader = self.best_move_from_statistics(statistics)
+        return all(visits + remaining < statistics[leader][0]
+                   for move, (visits, _) in statistics.items() if move != leader)
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["batched_evaluator"] = None  # threads and locks cannot be pickled
+        state["pending_priors"] = {}
+        return state
+
+
+if __name__ == "__main__":
+    from evaluator import MLPEvaluator
+
+    game = TicTacToe()
+    for evaluator in (RolloutEvaluator(num_rollouts=8), MLPEvaluator(seed=0)):
+        mcts = PUCTMCTS(game, num_simulations=2000, evaluator=evaluator)
+        print(evaluator.__class__.__name__, mcts.find_best_move_with_mcts(mcts.root), mcts.root_child_statistics())
@@ -1,9 +1,13 @@
 import math
+import os
 import pickle
+import re
 
 from utils import timer
-from mcts import MCTS
+from checkpoint import load_latest_checkpoint
+from mcts import MCTS, create_mcts
 from tictactoe import TicTacToe
+from treefile import load_tree_mcts, node_tree_to_array_tree, write_tree_file
 
 """
 This module contains functions to save and load the MCTS tree
@@ -23,18 +27,23 @@ def save_mcts(mcts):
 
 
 @timer
-def load_mcts(mcts, num_simulations=None):
+def load_mcts(mcts, num_simulations=None, interactive=True):
     """Loads the mcts from a file
-    :param num_simulations: the number of simulations of the mcts we want to load"""
+    :param num_simulations: the number of simulations of the mcts we want to load
+    :param interactive: if False, nothing is printed and a missing or unreadable file raises its error
+    instead of asking whether to build a new tree"""
     num_simulations = int(num_simulations) if num_simulations is not None else mcts.num_simulations
     filename = f'mcts_10^{round(math.log10(num_simulations), 2)}'
     try:
         with open(filename, 'rb') as f:
             mcts = pickle.load(f)
-            print(mcts.__dict__)
+            if interactive:
+                print(mcts.__dict__)
             return mcts
 
-    except (FileNotFoundError, pickle.UnpicklingError) as e:
+    except (FileNotFoundError, pickle.UnpicklingError, ValueError) as e:
+        if not interactive:
+            raise
         print(f"Error loading MCTS tree: {e}")
         print("Do you want to build a new tree? (y/n): ")
         answer = input()
@@ -46,3 +55,127 @@ def load_mcts(mcts, num_simulations=None):
         else:
             # exit the program if the user does not want to build a new tree
             exit(0)
+
+
+def load_mcts_file(filename, mode="c"):
+    """Loads a tree saved by save_mcts or save_mcts_binary, telling the formats apart by the .tree extension
+    :param filename: the file to load
+    :param mode: the memmap mode of binary tree files, see load_mcts_binary
+    :return: the mcts"""
+    if filename.endswith('.tree'):
+        return load_tree_mcts(filename, mode)
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+def binary_filename(num_simulations):
+    """Returns the default name of the binary tree file of a tree with the given number of simulations"""
+    return f'mcts_10^{round(math.log10(num_simulations), 2)}.tree'
+
+
+def save_mcts_binary(mcts, filename=None):
+    """Saves the mcts to a binary tree file that can be memory-mapped, see treefile
+    :param filename: the file to write, named after the number of simulations if None
+    :return: the name of the file"""
+    filename = filename if filename is not None else binary_filename(mcts.num_simulations)
+    if mcts.tree_backend == "arrays":
+        tree, root_state = mcts.tree, mcts.root_state
+    else:
+        tree, root_state = node_tree_to_array_tree(mcts.root), mcts.get_game_state(mcts.root)
+    write_tree_file(filename, tree, root_state, mcts.num_simulations)
+    return filename
+
+
+@timer
+def load_mcts_binary(num_simulations=None, filename=None, mode="c"):
+    """Opens a binary tree file through numpy.memmap as an ArrayMCTS, only the header is read
+    :param num_simulations: the number of simulations of the tree to load, used to find the file
+    :param filename: the file to open, overrides num_simulations
+    :param mode: "c" to share the pages of the file until the tree is modified, "r" for a read-only tree"""
+    filename = filename if filename is not None else binary_filename(int(num_simulations))
+    return load_tree_mcts(filename, mode)
+
+
+def convert_pickle_to_binary(pickle_filename, filename=None):
+    """Converts a tree saved by save_mcts to the binary tree format
+    :param pickle_filename: the file written by save_mcts
+    :param filename: the binary file to write, the pickle file name with a .tree extension if None
+    :return: the name of the binary file"""
+    with open(pickle_filename, 'rb') as f:
+        mcts = pickle.load(f)
+    return save_mcts_binary(mcts, filename if filename is not None else f'{pickle_filename}.tree')
+
+
+def saved_tree_candidates(num_simulations, directory='.'):
+    """Goes through the trees saved by save_mcts with at most num_simulations simulations, from the largest
+    :param num_simulations: the maximum number of simulations
+    :param directory: the directory to search
+    :return: a generator of pairs of the path of a file and its tree, if the file had to be loaded to tell
+    whether the tree is bigger, or None"""
+    # the names keep the exponent rounded like save_mcts does, a smaller rounded exponent is a smaller tree
+    target = round(math.log10(num_simulations), 2)
+    candidates = []
+    for name in os.listdir(directory):
+        match = re.fullmatch(r'mcts_10\^(\d+(?:\.\d+)?)', name)
+        if match is not None and float(match.group(1)) <= target:
+            candidates.append((float(match.group(1)), name))
+    for exponent, name in sorted(candidates, reverse=True):
+        path = os.path.join(directory, name)
+        if exponent < target:
+            yield path, None
+            continue
+        # the same rounded exponent as the target, only the file tells whether the tree is bigger
+        with open(path, 'rb') as f:
+            mcts = pickle.load(f)
+        if mcts.num_simulations <= num_simulations:
+            yield path, mcts
+
+
+def find_saved_tree(num_simulations, directory='.'):
+    """Finds the tree saved by save_mcts with the most simulations not above num_simulations
+    :param num_simulations: the maximum number of simulations
+    :param directory: the directory to search
+    :return: the path of the file, None if there is no such tree"""
+    path, _ = next(saved_tree_candidates(num_simulations, directory), (None, None))
+    return path
+
+
+def load_saved_tree(num_simulations, directory='.'):
+    """Loads the tree saved by save_mcts with the most simulations not above num_simulations, reading each
+    file at most once
+    :param num_simulations: the maximum number of simulations
+    :param directory: the directory to search
+    :return: the mcts, None if there is no such tree"""
+    path, mcts = next(saved_tree_candidates(num_simulations, directory), (None, None))
+    if path is not None and mcts is None:
+        with open(path, 'rb') as f:
+            mcts = pickle.load(f)
+    return mcts
+
+
+def extend_mcts(mcts, num_simulations, **build_options):
+    """Continues building a tree until its root has num_simulations visits, keeping the search already done
+    :param num_simulations: the new number of simulations
+    :param build_options: the options of build_mcts_tree, for example the checkpoint directory
+    :return: the extended mcts"""
+    mcts.num_simulations = int(num_simulations)
+    mcts.build_mcts_tree(**build_options)
+    return mcts
+
+
+def resume_or_build_mcts(num_simulations, checkpoint_dir, game=None, tree_backend="nodes", **build_options):
+    """Builds a tree of num_simulations simulations with checkpoints, starting from the newest checkpoint of
+    checkpoint_dir if there is one, otherwise from the largest smaller tree saved by save_mcts, otherwise
+    from scratch
+    :param num_simulations: the number of simulations of the tree to build
+    :param checkpoint_dir: the directory of the checkpoints
+    :param game: the game of the new tree if there is nothing to resume from
+    :param tree_backend: the tree storage of the new tree if there is nothing to resume from
+    :param build_options: the other options of build_mcts_tree, like checkpoint_interval or checkpoint_period
+    :return: the mcts"""
+    mcts = load_latest_checkpoint(checkpoint_dir)
+    if mcts is None:
+        mcts = load_saved_tree(num_simulations)
+        if mcts is None:
+            mcts = create_mcts(game if game is not None else TicTacToe(), num_simulations, tree_backend)
+    return extend_mcts(mcts, num_simulations, checkpoint_dir=checkpoint_dir, **build_options)
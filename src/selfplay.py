@@ -0,0 +1,279 @@
+import os
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from mcts import create_mcts
+from parallel import split_simulations
+from tictactoe import TicTacToe
+
+"""
+This module contains the self-play pipeline that produces training data: worker processes play games
+of MCTS against itself and stream, for every move, the board, the visit counts of the root children
+and the final outcome to rotating compressed .npz shards. The replay buffer samples training batches
+from the most recent shards without loading all of them
+"""
+
+SHARD_PATTERN = re.compile(r"shard_(\d+)_(\d+)_n(\d+)\.npz$")
+
+
+@dataclass
+class SelfPlayReport:
+    """The throughput of a self-play run"""
+    games: int
+    examples: int
+    bytes: int
+    shards: int
+    elapsed: float
+
+    @property
+    def games_per_hour(self):
+        return self.games * 3600 / self.elapsed if self.elapsed > 0 else 0
+
+    @property
+    def bytes_per_example(self):
+        return self.bytes / self.examples if self.examples > 0 else 0
+
+
+class ShardWriter:
+    def __init__(self, directory: str, worker_id: int = 0, examples_per_shard: int = 10000):
+        """
+        Buffers the examples of a worker and writes them as compressed shards of examples_per_shard examples
+        :param directory: the directory the shards are written to
+        :param worker_id: the id of the worker, part of the shard names so that workers never collide
+        :param examples_per_shard: the number of examples after which a shard is written and a new one started
+        """
+        self.directory = directory
+        self.worker_id = worker_id
+        self.examples_per_shard = examples_per_shard
+        self.buffer = {"boards": [], "players": [], "policies": [], "outcomes": []}
+        self.num_shards = 0
+        self.num_examples = 0
+        self.num_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def add_game(self, boards, players, policies, winner: int):
+        """
+        Adds the examples of a finished game
+        :param boards: the board before every move
+        :param players: the player to move before every move
+        :param policies: the visit counts of the root children, normalized, before every move
+        :param winner: the winner of the game, 0 for a draw
+        """
+        self.buffer["boards"].extend(boards)
+        self.buffer["players"].extend(players)
+        self.buffer["policies"].extend(policies)
+        # the outcome is seen from the player to move, as the value an evaluator has to predict
+        self.buffer["outcomes"].extend(winner * player for player in players)
+        while len(self.buffer["outcomes"]) >= self.examples_per_shard:
+            self.write_shard(self.examples_per_shard)
+
+    def write_shard(self, count: int):
+        """
+        Writes the first count buffered examples to a new shard, atomically
+        :param count: the number of examples of the shard
+        """
+        arrays = {"boards": np.array(self.buffer["boards"][:count], dtype=np.int8),
+                  "players": np.array(self.buffer["players"][:count], dtype=np.int8),
+                  "policies": np.array(self.buffer["policies"][:count], dtype=np.float32),
+                  "outcomes": np.array(self.buffer["outcomes"][:count], dtype=np.int8)}
+        for values in self.buffer.values():
+            del values[:count]
+        filename = os.path.join(self.directory, f"shard_{self.worker_id:03d}_{self.num_shards:06d}_n{count}.npz")
+        with open(filename + ".tmp", "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(filename + ".tmp", filename)
+        self.num_shards += 1
+        self.num_examples += count
+        self.num_bytes += os.path.getsize(filename)
+
+    def close(self):
+        """Writes the examples left in the buffer"""
+        if len(self.buffer["outcomes"]) > 0:
+            self.write_shard(len(self.buffer["outcomes"]))
+
+
+def play_self_play_game(mcts, game: TicTacToe, rng: np.random.Generator, temperature_moves: int = 2):
+    """
+    Plays a game of the MCTS against itself, reusing the subtree of every move
+    :param mcts: the MCTS object, rerooted on every position of the game
+    :param game: the starting position, not modified
+    :param rng: the random generator used to sample the opening moves
+    :param temperature_moves: the number of opening moves sampled in proportion to the visits, for variety.
+    The other moves are the best moves of the MCTS
+    :return: the boards, the players to move and the visit policies before every move, and the winner
+    """
+    game = game.copy()
+    num_cells = game.horizontal_size * game.vertical_size
+    boards, players, policies = [], [], []
+    while not game.is_over:
+        mcts.reroot(game)
+        best_move = mcts.root_move_to_game_move(mcts.find_best_move_with_mcts(mcts.root))
+        policy = np.zeros(num_cells, dtype=np.float32)
+        for move, (visits, _) in mcts.root_child_statistics(mcts.root).items():
+            policy[mcts.root_move_to_game_move(move)] = max(visits, 0)
+        if policy.sum() > 0:
+            policy /= policy.sum()
+        else:
+            # the move was answered without searching, e.g. from a solved table
+            policy[best_move] = 1
+        boards.append(np.asarray(game.board, dtype=np.int8))
+        players.append(game.current_player)
+        policies.append(policy)
+        if len(game.game_history) < temperature_moves:
+            probabilities = policy.astype(float)
+            best_move = int(rng.choice(num_cells, p=probabilities / probabilities.sum()))
+        game.make_move(best_move)
+    return boards, players, policies, game.return_winner()
+
+
+def run_self_play_worker(worker_id: int,
+                         num_games: int,
+                         directory: str,
+                         seed: int,
+                         game: Optional[TicTacToe] = None,
+                         num_simulations: int = 200,
+                         tree_backend: str = "nodes",
+                         examples_per_shard: int = 10000,
+                         temperature_moves: int = 2,
+                         mcts_kwargs: Optional[dict] = None):
+    """
+    Plays self-play games in a worker process and streams their examples to its own shards
+    :param worker_id: the id of the worker
+    :param num_games: the number of games to play
+    :param directory: the directory of the shards
+    :param seed: the seed of the random streams of the worker
+    :param game: the starting position of the games, an empty tic-tac-toe board if None
+    :param mcts_kwargs: the other arguments of create_mcts
+    :return: a tuple with the games, examples, bytes and shards written by the worker
+    """
+    np.random.seed(seed)
+    rng = np.random.default_rng(seed)
+    game = game if game is not None else TicTacToe()
+    mcts = create_mcts(game, num_simulations, tree_backend, **(mcts_kwargs or {}))
+    writer = ShardWriter(directory, worker_id, examples_per_shard)
+    for _ in range(num_games):
+        writer.add_game(*play_self_play_game(mcts, game, rng, temperature_moves))
+    writer.close()
+    return num_games, writer.num_examples, writer.num_bytes, writer.num_shards
+
+
+def run_self_play(num_games: int,
+                  directory: str,
+                  num_workers: int = 1,
+                  seed: Optional[int] = None,
+                  **kwargs):
+    """
+    Plays num_games self-play games split between num_workers worker processes
+    :param num_games: the number of games to play
+    :param directory: the directory of the shards
+    :param num_workers: the number of worker processes
+    :param seed: the seed the random streams of the workers are derived from
+    :param kwargs: the other arguments of run_self_play_worker
+    :return: a SelfPlayReport
+    """
+    start = time.monotonic()
+    seeds = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(num_workers)]
+    counts = split_simulations(num_games, num_workers)
+    # workers of earlier runs may have written to the directory, so the ids continue after theirs
+    first_id = 1 + max([int(match.group(1)) for name in os.listdir(directory)
+                        if (match := SHARD_PATTERN.match(name))], default=-1) if os.path.isdir(directory) else 0
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(run_self_play_worker, first_id + i, count, directory, seeds[i], **kwargs)
+                   for i, count in enumerate(counts) if count > 0]
+        totals = np.sum([future.result() for future in futures], axis=0)
+    return SelfPlayReport(*[int(total) for total in totals], elapsed=time.monotonic() - start)
+
+
+def list_shards(directory: str):
+    """
+    Lists the shards of a directory
+    :param directory: the directory of the shards
+    :return: a list of (path, number of examples) from the oldest to the newest shard
+    """
+    if not os.path.isdir(directory):
+        return []
+    shards = [(os.path.join(directory, name), int(match.group(3))) for name in os.listdir(directory)
+              if (match := SHARD_PATTERN.match(name))]
+    return sorted(shards, key=lambda shard: (os.path.getmtime(shard[0]), shard[0]))
+
+
+class ReplayBuffer:
+    def __init__(self,
+                 directory: str,
+                 capacity: int = 100000,
+                 max_open_shards: int = 8,
+                 rng: Optional[np.random.Generator] = None):
+        """
+        Samples training examples from the most recent shards of a directory. The number of examples of a
+        shard is part of its name, so only the shards a batch is drawn from are read
+        :param directory: the directory of the shards
+        :param capacity: the number of most recent examples the samples are drawn from
+        :param max_open_shards: the number of shards kept in memory between two batches
+        :param rng: the random generator, a new one if None
+        """
+        self.directory = directory
+        self.capacity = capacity
+        self.max_open_shards = max_open_shards
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.open_shards = OrderedDict()
+        self.shards = []
+        self.refresh()
+
+    def refresh(self):
+        """Picks up the shards written since the last refresh, dropping the oldest beyond the capacity"""
+        shards, total = [], 0
+        for shard in reversed(list_shards(self.directory)):
+            if total >= self.capacity:
+                break
+            shards.append(shard)
+            total += shard[1]
+        self.shards = shards[::-1]
+
+    def __len__(self):
+        return sum(count for _, count in self.shards)
+
+    def load_shard(self, filename: str):
+        if filename in self.open_shards:
+            self.open_shards.move_to_end(filename)
+            return self.open_shards[filename]
+        with np.load(filename) as data:
+            shard = {name: data[name] for name in data.files}
+        self.open_shards[filename] = shard
+        if len(self.open_shards) > self.max_open_shards:
+            self.open_shards.popitem(last=False)
+        return shard
+
+    def sample(self, batch_size: int):
+        """
+        Samples a batch of examples uniformly from the examples of the buffer
+        :param batch_size: the number of examples
+        :return: a dictionary with the boards, players, policies and outcomes of the examples
+        """
+        if len(self.shards) == 0:
+            raise ValueError(f"No shards found in {self.directory}")
+        counts = np.array([count for _, count in self.shards])
+        indices = self.rng.integers(counts.sum(), size=batch_size)
+        shard_indices = np.searchsorted(np.cumsum(counts), indices, side="right")
+        offsets = indices - (np.cumsum(counts) - counts)[shard_indices]
+        batch = {}
+        for shard_index in np.unique(shard_indices):
+            shard = self.load_shard(self.shards[shard_index][0])
+            rows = offsets[shard_indices == shard_index]
+            for name, values in shard.items():
+                batch.setdefault(name, []).append(values[rows])
+        return {name: np.concatenate(parts) for name, parts in batch.items()}
+
+
+if __name__ == "__main__":
+    report = run_self_play(8, "selfplay_data", num_workers=2, num_simulations=200, examples_per_shard=20)
+    print(f"{report.games} games, {report.examples} examples in {report.shards} shards, "
+          f"{report.games_per_hour:.0f} games/hour, {report.bytes_per_example:.1f} bytes/example")
+    buffer = ReplayBuffer("selfplay_data", capacity=1000)
+    batch = buffer.sample(4)
+    print(batch["boards"], batch["policies"].round(2), batch["outcomes"])
@@ -0,0 +1,389 @@
+import argparse
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import numpy as np
+
+from mcts import create_mcts
+from saver import load_mcts_file
+from tictactoe import TicTacToe
+
+"""
+This module contains the move server: an asyncio server answering "best move and visit statistics of this
+position" requests sent as JSON lines over a Unix socket or a localhost TCP port. Every worker of the pool
+keeps its own tree warm in memory and extends it with the searches it runs, concurrent requests for the
+same position share a single search, and recent answers are kept in an LRU cache.
+A request is a JSON object like {"id": 1, "moves": [4, 0], "num_simulations": 1000}, the moves being played
+from the starting position of the server, and the answer is
+{"id": 1, "move": 8, "statistics": [[move, visits, wins], ...], "simulations": 1000, ...}.
+Run the server and the load test with
+    python server.py serve --socket /tmp/mcts.sock --tree mcts_10^4.0
+    python server.py loadtest --socket /tmp/mcts.sock --requests 1000 --concurrency 8
+"""
+
+logger = logging.getLogger(__name__)
+
+# the warm tree of the worker, every worker thread or process has its own
+worker_state = threading.local()
+
+
+def init_worker(game: TicTacToe, tree_file: Optional[str], num_simulations: int, tree_backend: str,
+                mcts_kwargs: Optional[dict]):
+    """
+    Loads the warm tree of a worker, or starts an empty one from the starting position
+    :param game: the starting position of the server
+    :param tree_file: a file written by save_mcts or save_mcts_binary, an empty tree is used if None
+    :param num_simulations: the default number of simulations of a search
+    :param tree_backend: the tree storage of the new trees
+    :param mcts_kwargs: the other arguments of create_mcts. Without a node budget in max_nodes, the warm tree
+    grows with every search
+    """
+    if tree_file is not None:
+        mcts = load_mcts_file(tree_file)
+        if (mcts_kwargs or {}).get("max_nodes") is not None:
+            # the searches of the server extend the loaded tree, it is kept within the budget of the new trees
+            mcts.node_budget = mcts_kwargs["max_nodes"]
+    else:
+        mcts = create_mcts(game, num_simulations, tree_backend, **(mcts_kwargs or {}))
+    worker_state.mcts = mcts
+    worker_state.tree_backend = tree_backend
+    worker_state.mcts_kwargs = mcts_kwargs or {}
+
+
+def search_position(game: TicTacToe, num_simulations: int):
+    """
+    Searches a position with the warm tree of the worker until its node has num_simulations visits.
+    The search continues from the visits the node already has, and a position missing from the tree is added
+    to it first. Only a position that cannot be reached by its moves from the root of a tree without
+    transpositions is searched with a new tree of its own, which is discarded after the search: such positions
+    are searched from scratch every time their answer is not in the cache
+    :param game: the position
+    :param num_simulations: the visits the node of the position must have
+    :return: the answer to send, without the request id
+    """
+    mcts = worker_state.mcts
+    node = mcts.find_or_add_node(game)
+    if node is None:
+        mcts = create_mcts(game, num_simulations, worker_state.tree_backend, **worker_state.mcts_kwargs)
+        node = mcts.root
+    to_game_move = mcts.game_move_mapping(node, game)
+    result = mcts.search(node, max_simulations=max(num_simulations - mcts.get_visits(node), 0), early_stop=False)
+    statistics = sorted([to_game_move(move), int(visits), float(wins)]
+                        for move, (visits, wins) in mcts.root_child_statistics(node).items())
+    return {"move": to_game_move(result.move),
+            "statistics": statistics,
+            "simulations": mcts.get_visits(node),
+            "stop_reason": result.stop_reason,
+            "search_seconds": result.elapsed}
+
+
+@dataclass
+class ServerStats:
+    """The activity of a move server"""
+    requests: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    coalesced: int = 0
+    searches: int = 0
+
+
+class MoveServer:
+    def __init__(self,
+                 game: Optional[TicTacToe] = None,
+                 tree_file: Optional[str] = None,
+                 num_simulations: int = 1000,
+                 tree_backend: str = "nodes",
+                 num_workers: int = 1,
+                 use_processes: bool = True,
+                 cache_size: int = 1024,
+                 mcts_kwargs: Optional[dict] = None):
+        """
+        Initializes the server, the workers are started by start
+        :param game: the starting position the moves of the requests are played from, an empty board if None
+        :param tree_file: the tree loaded by every worker, see init_worker
+        :param num_simulations: the simulations of a search when a request does not give them
+        :param tree_backend: the tree storage of the trees created by the workers
+        :param num_workers: the number of workers
+        :param use_processes: if True the workers are processes, otherwise threads of the server process
+        :param cache_size: the number of answers kept in the LRU cache, 0 to disable the cache
+        :param mcts_kwargs: the other arguments of create_mcts, for example a node budget for long-running workers
+        """
+        self.game = game if game is not None else TicTacToe()
+        self.tree_file = tree_file
+        self.num_simulations = num_simulations
+        self.tree_backend = tree_backend
+        self.num_workers = num_workers
+        self.use_processes = use_processes
+        self.cache_size = cache_size
+        self.mcts_kwargs = mcts_kwargs
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.stats = ServerStats()
+        self.executor = None
+        self.server = None
+
+    async def start(self, path: Optional[str] = None, host: str = "127.0.0.1", port: int = 0):
+        """
+        Starts the workers and listens on a Unix socket, or on a TCP port if no path is given
+        :param path: the path of the Unix socket
+        :param host: the host of the TCP server
+        :param port: the TCP port, 0 for any free port, see address
+        """
+        executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        self.executor = executor_class(max_workers=self.num_workers, initializer=init_worker,
+                                       initargs=(self.game, self.tree_file, self.num_simulations,
+                                                 self.tree_backend, self.mcts_kwargs))
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_connection, path=path)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host=host, port=port)
+
+    @property
+    def address(self):
+        """The path of the Unix socket or the (host, port) the server listens on"""
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        """Stops listening and shuts the workers down"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answers the requests of a connection, one JSON object per line, in the order they were sent"""
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    request, response = {}, {"error": f"Invalid JSON: {e}"}
+                else:
+                    response = await self.handle_request(request)
+                if isinstance(request, dict) and "id" in request:
+                    response = dict(response, id=request["id"])
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def position_from_request(self, request: dict):
+        """
+        Plays the moves of a request from the starting position
+        :return: the position and the number of simulations of the request
+        """
+        if not isinstance(request, dict):
+            raise ValueError("A request must be a JSON object")
+        game = self.game.copy()
+        for move in request.get("moves", []):
+            if not isinstance(move, int) or move not in game.get_possible_moves():
+                raise ValueError(f"Illegal move: {move}")
+            game.make_move(move)
+        num_simulations = request.get("num_simulations", self.num_simulations)
+        if not isinstance(num_simulations, int) or num_simulations < 1:
+            raise ValueError(f"Invalid number of simulations: {num_simulations}")
+        return game, num_simulations
+
+    async def handle_request(self, request: dict):
+        """
+        Answers a request from the cache, by joining the search already running for the same position,
+        or by running a new search in the worker pool
+        :param request: the decoded request
+        :return: the answer, with an "error" entry if the request is invalid. The request {"command": "stats"}
+        is answered with the ServerStats of the server
+        """
+        if isinstance(request, dict) and request.get("command") == "stats":
+            return dict(asdict(self.stats), cache_entries=len(self.cache))
+        self.stats.requests += 1
+        start = time.perf_counter()
+        try:
+            game, num_simulations = self.position_from_request(request)
+        except ValueError as e:
+            self.stats.errors += 1
+            return {"error": str(e)}
+        # positions reached by different move orders are the same position
+        key = (tuple(np.asarray(game.board).tolist()), game.current_player, num_simulations)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.stats.cache_hits += 1
+            return dict(self.cache[key], cached=True, seconds=time.perf_counter() - start)
+        if key in self.pending:
+            self.stats.coalesced += 1
+            try:
+                answer = await asyncio.shield(self.pending[key])
+            except Exception as e:
+                # the failure is logged by the request that started the search
+                self.stats.errors += 1
+                return {"error": f"Search failed: {e}"}
+            return dict(answer, cached=False, seconds=time.perf_counter() - start)
+        future = asyncio.get_running_loop().run_in_executor(self.executor, search_position, game, num_simulations)
+        self.pending[key] = future
+        self.stats.searches += 1
+        try:
+            answer = await future
+        except Exception as e:
+            logger.exception("Search failed")
+            self.stats.errors += 1
+            return {"error": f"Search failed: {e}"}
+        finally:
+            del self.pending[key]
+        if self.cache_size > 0:
+            self.cache[key] = answer
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return dict(answer, cached=False, seconds=time.perf_counter() - start)
+
+
+@dataclass
+class LoadTestReport:
+    """The latencies and throughput measured by a load test"""
+    latencies: list
+    errors: int
+    elapsed: float
+
+    @property
+    def requests_per_second(self):
+        return len(self.latencies) / self.elapsed if self.elapsed > 0 else 0
+
+    def latency_percentiles(self, percentiles=(50, 99)):
+        """Returns a dictionary mapping each percentile to the latency in seconds"""
+        if len(self.latencies) == 0:
+            return {percentile: 0.0 for percentile in percentiles}
+        return dict(zip(percentiles, np.percentile(self.latencies, percentiles).tolist()))
+
+    def summary(self):
+        percentiles = self.latency_percentiles()
+        return (f"{len(self.latencies)} requests in {self.elapsed:.2f} s, {self.requests_per_second:.1f} requests/s, "
+                f"latency p50 {percentiles[50] * 1000:.2f} ms p99 {percentiles[99] * 1000:.2f} ms, "
+                f"{self.errors} errors")
+
+
+async def open_connection(path: Optional[str] = None, host: str = "127.0.0.1", port: Optional[int] = None):
+    if path is not None:
+        return await asyncio.open_unix_connection(path)
+    return await asyncio.open_connection(host, port)
+
+
+async def request_move(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, request: dict):
+    """
+    Sends a request on an open connection and waits for its answer
+    :return: the decoded answer
+    """
+    writer.write(json.dumps(request).encode() + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+def random_positions(game: TicTacToe, num_positions: int, max_moves: int = 4, seed: Optional[int] = None):
+    """
+    Draws positions by playing random moves from a game
+    :return: a list of move lists
+    """
+    rng = np.random.default_rng(seed)
+    positions = []
+    for _ in range(num_positions):
+        position, moves = game.copy(), []
+        for _ in range(rng.integers(max_moves + 1)):
+            if position.is_over:
+                break
+            moves.append(int(rng.choice(position.get_possible_moves())))
+            position.make_move(moves[-1])
+        positions.append(moves)
+    return positions
+
+
+async def run_load_test(positions,
+                        num_requests: int,
+                        concurrency: int = 8,
+                        num_simulations: Optional[int] = None,
+                        path: Optional[str] = None,
+                        host: str = "127.0.0.1",
+                        port: Optional[int] = None):
+    """
+    Sends num_requests requests over concurrency connections, each connection sending its next request
+    when the previous one is answered
+    :param positions: the move lists the requests cycle through
+    :param num_requests: the total number of requests
+    :param concurrency: the number of connections
+    :param num_simulations: the simulations asked for, the default of the server if None
+    :param path: the Unix socket of the server, its TCP host and port are used if None
+    :return: a LoadTestReport
+    """
+    latencies, errors = [], 0
+    counter = iter(range(num_requests))
+
+    async def client():
+        nonlocal errors
+        reader, writer = await open_connection(path, host, port)
+        try:
+            for i in counter:
+                request = {"id": i, "moves": positions[i % len(positions)]}
+                if num_simulations is not None:
+                    request["num_simulations"] = num_simulations
+                start = time.perf_counter()
+                answer = await request_move(reader, writer, request)
+                latencies.append(time.perf_counter() - start)
+                if "error" in answer:
+                    errors += 1
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return LoadTestReport(latencies, errors, time.perf_counter() - start)
+
+
+async def serve(args):
+    server = MoveServer(tree_file=args.tree, num_simulations=args.simulations, tree_backend=args.backend,
+                        num_workers=args.workers, cache_size=args.cache_size,
+                        mcts_kwargs={"max_nodes": args.max_nodes if args.max_nodes > 0 else None})
+    await server.start(path=args.socket, host=args.host, port=args.port)
+    logger.info("Serving on %s", server.address)
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serves MCTS moves over a Unix socket or a TCP port")
+    parser.add_argument("command", choices=("serve", "loadtest"))
+    parser.add_argument("--socket", help="the path of the Unix socket, a TCP port is used if not given")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tree", help="the tree file loaded by the workers")
+    parser.add_argument("--simulations", type=int, default=1000, help="the default simulations of a search")
+    parser.add_argument("--backend", default="nodes", choices=("nodes", "arrays"))
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--cache-size", type=int, default=1024)
+    parser.add_argument("--max-nodes", type=int, default=10 ** 6,
+                        help="the node budget of the warm tree of each worker, 0 to let it grow without a limit")
+    parser.add_argument("--requests", type=int, default=1000, help="the requests sent by the load test")
+    parser.add_argument("--concurrency", type=int, default=8, help="the connections of the load test")
+    parser.add_argument("--positions", type=int, default=100, help="the distinct positions of the load test")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        logging.basicConfig(level=logging.INFO)
+        asyncio.run(serve(args))
+        return 0
+    positions = random_positions(TicTacToe(), args.positions, seed=0)
+    report = asyncio.run(run_load_test(positions, args.requests, args.concurrency,
+                                       path=args.socket, host=args.host, port=args.port))
+    print(report.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+from bitboard import BitboardTicTacToe
+from symmetry import canonical_symmetry
+from tictactoe import TicTacToe
+
+"""
+This module contains the table of solved positions: every position reachable in tic-tac-toe,
+up to rotations and reflections, with its game-theoretic value and best move
+"""
+
+SOLVED_TABLE_FILENAME = 'solved_positions.npz'
+
+
+def position_key(game: TicTacToe):
+    """
+    Returns the key of a position in the solved table and the permutation to its canonical board
+    :param game: the game state
+    :return: the key, combining the canonical board code and the player to move, and the permutation
+    """
+    code, permutation = canonical_symmetry(game.board, game.horizontal_size, game.vertical_size)
+    return 2 * code + (game.current_player == 1), permutation
+
+
+class SolvedTable:
+    def __init__(self, keys, values, best_moves, horizontal_size: int = 3, vertical_size: int = 3):
+        """
+        Table of solved positions, stored as arrays sorted by key
+        :param keys: the keys of the positions, see position_key
+        :param values: the value of each position for the player to move: 1 win, 0 draw, -1 loss
+        :param best_moves: the best move of each position on its canonical board, -1 for finished games
+        """
+        order = np.argsort(keys)
+        self.keys = np.asarray(keys, dtype=np.int64)[order]
+        self.values = np.asarray(values, dtype=np.int8)[order]
+        self.best_moves = np.asarray(best_moves, dtype=np.int8)[order]
+        self.horizontal_size = horizontal_size
+        self.vertical_size = vertical_size
+
+    @classmethod
+    def build(cls, game_class=BitboardTicTacToe):
+        """
+        Solves every position reachable from the empty board, with either player starting,
+        by negamax over the canonical positions. Faster wins and slower losses are preferred
+        :param game_class: the game class to explore the positions with
+        :return: the solved table
+        """
+        solved = {}
+
+        def solve(game):
+            key, permutation = position_key(game)
+            if key in solved:
+                return solved[key][1]
+            if game.is_over:
+                score = game.return_winner() * game.current_player * (1 + len(game.get_possible_moves()))
+                solved[key] = (int(np.sign(score)), score, -1)
+                return score
+            best_score, best_move = None, None
+            for move in game.get_possible_moves():
+                score = -solve(game.get_updated_game_state(move))
+                if best_score is None or score > best_score:
+                    best_score, best_move = score, move
+            # store the best move on the canonical board, where cell i is cell permutation[i] of this board
+            canonical_move = int(np.flatnonzero(permutation == best_move)[0])
+            solved[key] = (int(np.sign(best_score)), best_score, canonical_move)
+            return best_score
+
+        for first_player in (1, -1):
+            solve(game_class(current_player=first_player))
+        keys = list(solved.keys())
+        return cls(keys, [solved[key][0] for key in keys], [solved[key][2] for key in keys],
+                   game_class.horizontal_size, game_class.vertical_size)
+
+    def save(self, filename: str = SOLVED_TABLE_FILENAME):
+        np.savez_compressed(filename, keys=self.keys, values=self.values, best_moves=self.best_moves,
+                            size=np.array([self.horizontal_size, self.vertical_size]))
+
+    @classmethod
+    def load(cls, filename: str = SOLVED_TABLE_FILENAME):
+        with np.load(filename) as data:
+            return cls(data['keys'], data['values'], data['best_moves'], *data['size'].tolist())
+
+    def lookup(self, game: TicTacToe):
+        """
+        Looks a position up in the table
+        :param game: the game state
+        :return: the value for the player to move and the best move on the board of the game (None if the
+        game is over), or None if the position is not in the table
+        """
+        if (game.horizontal_size, game.vertical_size) != (self.horizontal_size, self.vertical_size):
+            return None
+        key, permutation = position_key(game)
+        index = np.searchsorted(self.keys, key)
+        if index == len(self.keys) or self.keys[index] != key:
+            return None
+        best_move = int(self.best_moves[index])
+        return int(self.values[index]), (int(permutation[best_move]) if best_move >= 0 else None)
+
+
+def load_solved_table(filename: Optional[str] = None):
+    """
+    Loads the table of solved positions, building and saving it the first time
+    :param filename: the file of the table
+    :return: the solved table
+    """
+    filename = filename if filename is not None else SOLVED_TABLE_FILENAME
+    if os.path.exists(filename):
+        return SolvedTable.load(filename)
+    table = SolvedTable.build()
+    table.save(filename)
+    return table
@@ -0,0 +1,75 @@
+from functools import lru_cache
+
+import numpy as np
+
+"""
+This module contains the symmetries of the board (rotations and reflections)
+used to recognize positions that are equivalent up to a symmetry.
+A symmetry is stored as a permutation of the cells: the transformed board is board[permutation]
+"""
+
+
+@lru_cache(maxsize=None)
+def board_symmetries(horizontal_size: int, vertical_size: int):
+    """
+    Builds the permutations of the cells corresponding to the symmetries of the board.
+    Square boards have the 8 symmetries of the dihedral group, rectangular boards only 4.
+    :param horizontal_size: the number of columns of the board
+    :param vertical_size: the number of rows of the board
+    :return: an array of shape (num_symmetries, num_cells), the first row is the identity
+    """
+    grid = np.arange(horizontal_size * vertical_size).reshape(vertical_size, horizontal_size)
+    transforms = [grid, grid[::-1, :], grid[:, ::-1], grid[::-1, ::-1]]
+    if horizontal_size == vertical_size:
+        transforms += [grid.T, grid.T[::-1, :], grid.T[:, ::-1], grid.T[::-1, ::-1]]
+    permutations = np.array([transform.ravel() for transform in transforms])
+    permutations.setflags(write=False)
+    return permutations
+
+
+@lru_cache(maxsize=None)
+def base3_powers(num_cells: int):
+    """Returns the powers of 3 used to encode a board as a single integer"""
+    powers = 3 ** np.arange(num_cells, dtype=np.int64)
+    powers.setflags(write=False)
+    return powers
+
+
+def canonical_board_code(board, horizontal_size: int, vertical_size: int):
+    """
+    Encodes the board in base 3 under every symmetry and returns the smallest code,
+    so that all the boards equivalent up to a symmetry share the same code.
+    Boards too large for a 64-bit base 3 code use the smallest byte string instead
+    :param board: the board as an array of 1, -1 and 0
+    :return: the canonical code of the board
+    """
+    permutations = board_symmetries(horizontal_size, vertical_size)
+    boards = np.asarray(board)[permutations]
+    if permutations.shape[1] > 39:
+        return min(row.astype(np.int8).tobytes() for row in boards)
+    codes = (boards + 1) @ base3_powers(permutations.shape[1])
+    return int(codes.min())
+
+
+def canonical_symmetry(board, horizontal_size: int, vertical_size: int):
+    """
+    Finds the symmetry that transforms the board into its canonical form, the one with the smallest code
+    :param board: the board as an array of 1, -1 and 0
+    :return: the canonical code of the board and the permutation p such that board[p] is the canonical board
+    """
+    permutations = board_symmetries(horizontal_size, vertical_size)
+    codes = (np.asarray(board)[permutations] + 1) @ base3_powers(permutations.shape[1])
+    best = int(np.argmin(codes))
+    return int(codes[best]), permutations[best]
+
+
+def find_symmetry(board, target, horizontal_size: int, vertical_size: int):
+    """
+    Finds the symmetry that transforms a board into another one
+    :param board: the board to transform
+    :param target: the board to obtain
+    :return: the permutation p such that board[p] equals target, None if the boards are not equivalent
+    """
+    permutations = board_symmetries(horizontal_size, vertical_size)
+    matches = np.flatnonzero(np.all(np.asarray(board)[permutations] == np.asarray(target), axis=1))
+    return permutations[matches[0]] if len(matches) > 0 else None
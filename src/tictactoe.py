@@ -1,9 +1,12 @@
 import numpy as np
 
+from symmetry import canonical_board_code
+
 
 class TicTacToe:
     horizontal_size = 3
     vertical_size = 3
+    win_length = None  # the full rows, columns and diagonals win
 
     def __init__(self, board=None, current_player: int = 1):
         self.board = board if board is not None else np.zeros((self.horizontal_size * self.vertical_size), dtype=int)
@@ -64,14 +67,34 @@ class TicTacToe:
             raise ValueError(
                 "Invalid move: a player has already made a move at this position or the move is out of bounds")
 
+    def undo_move(self):
+        """
+        Takes back the last move in place, the inverse of make_move
+        :return: the move taken back
+        """
+        if len(self.game_history) == 0:
+            raise ValueError("There is no move to undo")
+        move = self.game_history.pop()
+        self.board[move] = 0
+        self.current_player = -self.current_player
+        return move
+
+    def copy(self):
+        """
+        Returns a copy of the game state
+        :return: a new game state equal to the current one
+        """
+        game = TicTacToe(board=self.board.copy(), current_player=self.current_player)
+        game.game_history = self.game_history.copy()
+        return game
+
     def get_updated_game_state(self, move: int):
         """
         Returns a new game state with the given move made
         :param move: the move to make
         :return: a new game state with the given move made
         """
-        game = TicTacToe(board=self.board.copy(), current_player=self.current_player)
-        game.game_history = self.game_history.copy()
+        game = self.copy()
         game.make_move(move)
         return game
 
@@ -89,6 +112,18 @@ class TicTacToe:
         """
         return self.game_history[-1] if len(self.game_history) > 0 else None
 
+    def canonical_key(self):
+        """
+        Returns a key shared by all the game states that are equal up to a rotation or reflection of the board
+        :return: a tuple with the canonical code of the board and the current player
+        """
+        return canonical_board_code(self.board, self.horizontal_size, self.vertical_size), self.current_player
+
+    @property
+    def parameters(self):
+        """Returns the arguments, besides the position, needed to construct an equal game"""
+        return {}
+
     def reset(self):
         """
         Resets the game
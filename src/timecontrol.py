@@ -0,0 +1,55 @@
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+from tictactoe import TicTacToe
+
+"""
+This module contains the result of an anytime search and the time manager
+that spreads a per-game time budget across the moves of a game
+"""
+
+
+@dataclass
+class SearchResult:
+    """The outcome of MCTS.search: the move found, the simulations run and why the search stopped"""
+    move: Optional[int]
+    simulations: int
+    stop_reason: str
+    elapsed: float
+
+
+class TimeManager:
+    def __init__(self, game_time: float, safety_margin: float = 0.05, min_move_time: float = 0.001):
+        """
+        Spreads a time budget for a whole game across its moves
+        :param game_time: the seconds available to the player for the whole game
+        :param safety_margin: the fraction of the remaining time kept in reserve
+        :param min_move_time: the smallest budget given to a move
+        """
+        self.game_time = game_time
+        self.safety_margin = safety_margin
+        self.min_move_time = min_move_time
+        self.remaining = game_time
+
+    def start_game(self):
+        """Gives back the whole time budget for a new game"""
+        self.remaining = self.game_time
+
+    def budget_for_move(self, game: TicTacToe):
+        """
+        Computes the time budget of the next move: the remaining time, minus the reserve,
+        split evenly across the moves the player can still have to make
+        :param game: the current game state
+        :return: the seconds for the move
+        """
+        moves_left = max(1, math.ceil(len(game.get_possible_moves()) / 2))
+        budget = self.remaining * (1 - self.safety_margin) / moves_left
+        return max(budget, self.min_move_time)
+
+    def record(self, elapsed: float):
+        """
+        Subtracts the time spent on a move from the remaining time
+        :param elapsed: the seconds spent on the move
+        """
+        self.remaining = max(0.0, self.remaining - elapsed)
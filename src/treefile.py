@@ -0,0 +1,143 @@
+import json
+import struct
+from collections import deque
+
+import numpy as np
+
+from arraytree import ArrayMCTS, ArrayTree, TREE_FIELDS
+from bitboard import BitboardTicTacToe
+from mnk import MNKGame
+from tictactoe import TicTacToe
+
+"""
+This module contains the binary tree format used to save MCTS trees.
+The file is made of a fixed prefix (magic bytes, format version, metadata length), a JSON metadata
+header with the game parameters, the simulation count and the layout of the arrays, followed by one
+flat array per node field (see TREE_FIELDS). Every array starts at an aligned offset so that it can be
+opened with numpy.memmap without reading the file
+"""
+
+MAGIC = b"MCTSTREE"
+# version 1 files may have been converted from pickled trees counting their wins with the old sign, see
+# TREE_FORMAT_VERSION in mcts, they are rejected
+FORMAT_VERSION = 2
+ALIGNMENT = 64
+PREFIX = struct.Struct("<8sII")
+GAME_CLASSES = {cls.__name__: cls for cls in (TicTacToe, BitboardTicTacToe, MNKGame)}
+
+
+def align(offset: int):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_tree_file(filename: str, tree: ArrayTree, root_state: TicTacToe, num_simulations: int):
+    """
+    Writes a tree to a binary tree file
+    :param filename: the file to write
+    :param tree: the tree to save
+    :param root_state: the game state of the root of the tree
+    :param num_simulations: the number of simulations the tree was built with
+    """
+    arrays = []
+    offset = 0
+    for name, dtype, _ in TREE_FIELDS:
+        arrays.append({"name": name, "dtype": np.dtype(dtype).str, "offset": offset})
+        offset = align(offset + tree.size * np.dtype(dtype).itemsize)
+    metadata = json.dumps({
+        "game_class": root_state.__class__.__name__,
+        "horizontal_size": root_state.horizontal_size,
+        "vertical_size": root_state.vertical_size,
+        "game_parameters": root_state.parameters,
+        "board": [int(cell) for cell in root_state.board],
+        "current_player": root_state.current_player,
+        "game_history": [int(move) for move in root_state.game_history],
+        "num_simulations": int(num_simulations),
+        "num_nodes": int(tree.size),
+        "arrays": arrays,
+    }).encode()
+    data_start = align(PREFIX.size + len(metadata))
+    with open(filename, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, FORMAT_VERSION, len(metadata)))
+        f.write(metadata)
+        for array, (name, dtype, _) in zip(arrays, TREE_FIELDS):
+            f.seek(data_start + array["offset"])
+            f.write(np.ascontiguousarray(getattr(tree, name)[:tree.size], dtype=dtype).tobytes())
+        f.truncate(data_start + offset)
+
+
+def read_tree_metadata(filename: str):
+    """
+    Reads the metadata header of a binary tree file
+    :param filename: the file to read
+    :return: the metadata dictionary, with the offset of the array data added as "data_start"
+    """
+    with open(filename, "rb") as f:
+        magic, version, metadata_length = PREFIX.unpack(f.read(PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not an MCTS tree file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported MCTS tree file version {version}, expected {FORMAT_VERSION}")
+        metadata = json.loads(f.read(metadata_length))
+    metadata["data_start"] = align(PREFIX.size + metadata_length)
+    return metadata
+
+
+def read_tree_file(filename: str, mode: str = "c"):
+    """
+    Opens a binary tree file through numpy.memmap, only the header is read
+    :param filename: the file to open
+    :param mode: the memmap mode. "c" (copy on write) shares the pages between processes until the
+    tree is modified, "r" makes the tree read-only
+    :return: the tree and the metadata of the file
+    """
+    metadata = read_tree_metadata(filename)
+    tree = ArrayTree.__new__(ArrayTree)
+    for array in metadata["arrays"]:
+        setattr(tree, array["name"], np.memmap(filename, dtype=np.dtype(array["dtype"]), mode=mode,
+                                               offset=metadata["data_start"] + array["offset"],
+                                               shape=(metadata["num_nodes"],)))
+    tree.size = metadata["num_nodes"]
+    return tree, metadata
+
+
+def load_tree_mcts(filename: str, mode: str = "c"):
+    """
+    Opens a binary tree file as an ArrayMCTS
+    :param filename: the file to open
+    :param mode: the memmap mode, see read_tree_file
+    :return: the MCTS object
+    """
+    tree, metadata = read_tree_file(filename, mode)
+    game_class = GAME_CLASSES[metadata["game_class"]]
+    root_state = game_class(board=np.array(metadata["board"]), current_player=metadata["current_player"],
+                            **metadata.get("game_parameters", {}))
+    root_state.game_history = metadata["game_history"]
+    mcts = ArrayMCTS(root_state, metadata["num_simulations"], capacity=1)
+    mcts.tree = tree
+    return mcts
+
+
+def node_tree_to_array_tree(root):
+    """
+    Flattens a tree of Node objects into an ArrayTree, one level at a time without recursion
+    :param root: the root node
+    :return: the ArrayTree
+    """
+    if root.transposition_table is not None:
+        raise ValueError("Trees with transpositions cannot be flattened, their moves depend on the path")
+    tree = ArrayTree()
+    tree.visits[0] = root.visits
+    tree.wins[0] = root.wins
+    queue = deque([(root, 0)])
+    while queue:
+        node, index = queue.popleft()
+        if len(node.children) == 0:
+            continue
+        moves = list(node.children.keys())
+        first = tree.add_children(index, moves)
+        for offset, move in enumerate(moves):
+            child = node.children[move]
+            tree.visits[first + offset] = child.visits
+            tree.wins[first + offset] = child.wins
+            queue.append((child, first + offset))
+    return tree
@@ -9,12 +9,24 @@ from tictactoe import TicTacToe
 class Node:
     def __init__(self,
                  game_state: Optional['TicTacToe'] = None,
-                 parent: Optional['Node'] = None):
+                 parent: Optional['Node'] = None,
+                 transposition_table: Optional[dict] = None):
+        """
+        Initializes a node of the search tree
+        :param game_state: the game state of the node
+        :param parent: the node the first path to this node comes from
+        :param transposition_table: the table shared by all the nodes of the tree, mapping the canonical key
+        of a game state to its node. If given, equivalent positions share one node and the tree becomes a DAG
+        """
         self.parent = parent
         self.children = {}
         self.visits = 0
         self.wins = 0
         self.game_state = game_state if game_state is not None else self.construct_game_state()
+        self.transposition_table = transposition_table
+        self.proven = None  # the game-theoretic value for the player that moved into the node, once proven
+        self.prior = 1.0  # the probability given to the move into the node by a policy evaluator
+        self.untried_moves = None  # with lazy expansion, the moves without a child yet, built on the first expansion
 
     def construct_game_state(self):
         if self.parent is None:
@@ -30,7 +42,15 @@ class Node:
         return self.game_state.get_last_move()
 
     def add_child_given_move(self, move: int):
-        child = Node(game_state=self.game_state.get_updated_game_state(move), parent=self)
+        game_state = self.game_state.get_updated_game_state(move)
+        if self.transposition_table is None:
+            child = Node(game_state=game_state, parent=self)
+        else:
+            key = game_state.canonical_key()
+            child = self.transposition_table.get(key)
+            if child is None:
+                child = Node(game_state=game_state, parent=self, transposition_table=self.transposition_table)
+                self.transposition_table[key] = child
         self.children[move] = child
 
     def update(self, result):
@@ -44,15 +64,37 @@ class Node:
         if self.parent is None:
             return self.wins / self.visits
         else:
-            return self.wins / self.visits + 2 * np.sqrt(np.log(self.parent.visits) / self.visits)
+            return self.compute_ucb(self.parent.visits)
+
+    def compute_ucb(self, parent_visits: int):
+        """
+        Computes the UCB value of the node as seen from a parent with the given number of visits.
+        Nodes shared by several parents are scored with the visits of the parent doing the selection
+        :param parent_visits: the number of visits of the parent
+        :return: the UCB value of the node
+        """
+        if self.visits == 0:
+            return float('inf')
+        return self.wins / self.visits + 2 * np.sqrt(np.log(parent_visits) / self.visits)
+
+    def compute_puct(self, parent_visits: int, c_puct: float):
+        """
+        Computes the PUCT value of the node: the average wins plus an exploration term proportional
+        to the prior of the node, as in AlphaZero
+        :param parent_visits: the number of visits of the parent
+        :param c_puct: the weight of the exploration term
+        :return: the PUCT value of the node
+        """
+        return self.average_wins + c_puct * self.prior * np.sqrt(parent_visits) / (1 + self.visits)
 
     @property
     def average_wins(self):
         return self.wins / self.visits if self.visits > 0 else 0
 
-    def get_best_move_from_possible_children(self):
+    def get_best_move_from_possible_children(self, skip_proven: bool = False):
         """
         Returns the move that leads to the child with the highest UCB value
+        :param skip_proven: if True, the children whose value is already proven are not considered
         :return: the best move or None if there are no possible moves
         """
         # handle the case where there are no possible moves
@@ -61,11 +103,12 @@ class Node:
             logging.info("No possible moves were found")
             return None
         # find the key corresponding to the highest ucb value in children
-        best_move = max(self.children, key=lambda x: self.children[x].ucb)
-        if best_move not in self.game_state.get_possible_moves():
-            logging.info("Best move is not in possible moves")
+        moves = [move for move, child in self.children.items() if child.proven is None] if skip_proven \
+            else self.children
+        if len(moves) == 0:
             return None
-        return best_move
+        # the children are only ever created for possible moves, so the best move needs no further check
+        return max(moves, key=lambda x: self.children[x].compute_ucb(self.visits))
 
     @property
     def best_child(self):
@@ -76,7 +119,7 @@ class Node:
         """
         self.add_all_children()
         if len(self.children) > 0:
-            return max(self.children.values(), key=lambda x: x.ucb)
+            return max(self.children.values(), key=lambda x: x.compute_ucb(self.visits))
         else:
             logging.info("No children found")
             return None
@@ -102,6 +145,10 @@ class Node:
         # Restore state
         self.__dict__.update(state)
         # Ensure all attributes are initialized properly
+        self.__dict__.setdefault("transposition_table", None)
+        self.__dict__.setdefault("proven", None)
+        self.__dict__.setdefault("prior", 1.0)
+        self.__dict__.setdefault("untried_moves", None)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,197 @@
+import argparse
+import csv
+import json
+import sys
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+"""
+This module contains the tools to inspect large search trees. walk_tree is a generator that goes through the
+tree depth first with an explicit stack, so deep trees cannot overflow the Python stack, and its filters on the
+depth, the visits and the number of children cut whole subtrees before they are walked. export_tree streams the
+walked nodes to a CSV or JSON Lines file one row at a time, and summarize_tree counts the nodes and children of
+every depth without keeping the nodes. The walk works on every tree backend through MCTS.child_items and
+MCTS.node_statistics. With transpositions, a node shared by several parents is walked once under each of them
+"""
+
+
+@dataclass
+class TreeRecord:
+    """A walked node, its wins being counted for the player that moved into it"""
+    depth: int
+    position: list
+    move: Optional[int]
+    visits: int
+    wins: float
+    ucb: Optional[float]
+    num_children: int
+
+    def to_dict(self):
+        return {"position": self.position, "move": self.move, "visits": self.visits, "wins": self.wins,
+                "ucb": self.ucb, "depth": self.depth}
+
+
+@dataclass
+class DepthSummary:
+    """The nodes of a depth of the tree, and the number of children of the expanded ones"""
+    depth: int
+    nodes: int = 0
+    visits: int = 0
+    expanded: int = 0
+    children: int = 0
+    min_children: Optional[int] = None
+    max_children: int = 0
+
+    @property
+    def mean_branching(self):
+        return self.children / self.expanded if self.expanded > 0 else 0.0
+
+    def add(self, record: TreeRecord):
+        self.nodes += 1
+        self.visits += record.visits
+        if record.num_children > 0:
+            self.expanded += 1
+            self.children += record.num_children
+            self.min_children = record.num_children if self.min_children is None \
+                else min(self.min_children, record.num_children)
+            self.max_children = max(self.max_children, record.num_children)
+
+
+@dataclass
+class TreeSummary:
+    depths: list = field(default_factory=list)
+
+    @property
+    def nodes(self):
+        return sum(depth.nodes for depth in self.depths)
+
+    @property
+    def max_depth(self):
+        return len(self.depths) - 1
+
+    def format(self):
+        """Returns the summary as a text table, one line per depth"""
+        lines = [f"{'depth':>5} {'nodes':>10} {'visits':>12} {'expanded':>10} {'branching':>9} {'min':>4} {'max':>4}"]
+        for depth in self.depths:
+            min_children = depth.min_children if depth.min_children is not None else 0
+            lines.append(f"{depth.depth:>5} {depth.nodes:>10} {depth.visits:>12} {depth.expanded:>10} "
+                         f"{depth.mean_branching:>9.2f} {min_children:>4} {depth.max_children:>4}")
+        lines.append(f"{self.nodes} nodes, maximum depth {self.max_depth}")
+        return "\n".join(lines)
+
+
+def ucb_value(visits: int, wins: float, parent_visits: int):
+    """Computes the UCB value of a child like the selection of MCTS, None if it cannot be computed"""
+    if visits == 0 or parent_visits == 0:
+        return None
+    return float(wins / visits + 2 * np.sqrt(np.log(parent_visits) / visits))
+
+
+def walk_tree(mcts, node=None, max_depth: Optional[int] = None, min_visits: int = 1, top_k: Optional[int] = None):
+    """
+    Walks the tree depth first, each node before its children
+    :param mcts: the MCTS object holding the tree
+    :param node: the node to start from, the root if None. Its depth is 0
+    :param max_depth: if given, the nodes deeper than this are not walked
+    :param min_visits: the children with fewer visits are not walked, nor their subtree. The starting node is
+    always walked
+    :param top_k: if given, only the top_k most visited children of every node are walked, from the most visited
+    :return: a generator of TreeRecord, the position of a record being the game history of its node
+    """
+    node = mcts.root if node is None else node
+    visits, wins = mcts.node_statistics(node)
+    stack = [(node, 0, tuple(mcts.get_game_state(node).game_history), None, visits, wins, None)]
+    while stack:
+        node, depth, history, move, visits, wins, ucb = stack.pop()
+        children = mcts.child_items(node)
+        yield TreeRecord(depth, list(history), move, visits, wins, ucb, len(children))
+        if max_depth is not None and depth >= max_depth:
+            continue
+        kept = []
+        for child_move, child in children:
+            child_visits, child_wins = mcts.node_statistics(child)
+            if child_visits >= min_visits:
+                kept.append((child, child_move, child_visits, child_wins))
+        if top_k is not None:
+            kept = sorted(kept, key=lambda item: -item[2])[:top_k]
+        for child, child_move, child_visits, child_wins in reversed(kept):
+            stack.append((child, depth + 1, history + (child_move,), child_move, child_visits, child_wins,
+                          ucb_value(child_visits, child_wins, visits)))
+
+
+def export_tree(mcts, file, file_format: Optional[str] = None, node=None, **filters):
+    """
+    Writes the walked nodes to a file one row at a time, without keeping them in memory
+    :param mcts: the MCTS object holding the tree
+    :param file: the name of the file or an open text file
+    :param file_format: "csv" or "jsonl", taken from the extension of the file name if None
+    :param node: the node to start from, the root if None
+    :param filters: max_depth, min_visits and top_k, see walk_tree
+    :return: the number of exported nodes
+    """
+    if file_format is None:
+        file_format = "jsonl" if isinstance(file, str) and file.endswith((".jsonl", ".json")) else "csv"
+    if file_format not in ("csv", "jsonl"):
+        raise ValueError(f"Unknown export format: {file_format}")
+    if isinstance(file, str):
+        with open(file, "w", newline="") as f:
+            return export_tree(mcts, f, file_format, node, **filters)
+
+    count = 0
+    if file_format == "csv":
+        writer = csv.writer(file)
+        writer.writerow(("position", "move", "visits", "wins", "ucb", "depth"))
+        for record in walk_tree(mcts, node, **filters):
+            writer.writerow((" ".join(map(str, record.position)), "" if record.move is None else record.move,
+                             record.visits, record.wins, "" if record.ucb is None else record.ucb, record.depth))
+            count += 1
+    else:
+        for record in walk_tree(mcts, node, **filters):
+            file.write(json.dumps(record.to_dict()) + "\n")
+            count += 1
+    return count
+
+
+def summarize_tree(mcts, node=None, **filters):
+    """
+    Counts the walked nodes of every depth and the children of the expanded ones
+    :param mcts: the MCTS object holding the tree
+    :param node: the node to start from, the root if None
+    :param filters: max_depth, min_visits and top_k, see walk_tree. The children counts are not filtered
+    :return: a TreeSummary
+    """
+    summary = TreeSummary()
+    for record in walk_tree(mcts, node, **filters):
+        while len(summary.depths) <= record.depth:
+            summary.depths.append(DepthSummary(len(summary.depths)))
+        summary.depths[record.depth].add(record)
+    return summary
+
+
+def main(argv=None):
+    from saver import load_mcts_file
+
+    parser = argparse.ArgumentParser(description="Exports or summarizes a saved search tree")
+    parser.add_argument("tree", help="the tree file, saved by save_mcts or save_mcts_binary")
+    parser.add_argument("--output", help="the CSV or JSON Lines file to export to, the summary is printed if not given")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="the export format, from the extension if not given")
+    parser.add_argument("--max-depth", type=int)
+    parser.add_argument("--min-visits", type=int, default=1)
+    parser.add_argument("--top-k", type=int)
+    args = parser.parse_args(argv)
+
+    mcts = load_mcts_file(args.tree)
+    filters = dict(max_depth=args.max_depth, min_visits=args.min_visits, top_k=args.top_k)
+    if args.output is None:
+        print(summarize_tree(mcts, **filters).format())
+    elif args.output == "-":
+        export_tree(mcts, sys.stdout, args.format, **filters)
+    else:
+        print(f"{export_tree(mcts, args.output, args.format, **filters)} nodes exported to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,48 @@
+import functools
+import logging
+import sys
 import time
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
 
 
 def timer(func):
-    """Decorator that times the execution of a function"""
+    """Decorator that times the execution of a function and logs it at the debug level"""
 
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         start = time.perf_counter_ns()
         result = func(*args, **kwargs)
         end = time.perf_counter_ns()
-        print(f"Execution time: {(end - start) / 1e6} ms for {func.__name__}")
+        logger.debug("Execution time: %s ms for %s", (end - start) / 1e6, func.__name__)
         return result
 
     return wrapper
+
+
+def deep_sizeof(obj, seen: Optional[set] = None):
+    """
+    Estimates the bytes taken by an object and everything it references, each object counted once
+    :param obj: the object to measure
+    :param seen: the ids of the objects already counted, they are skipped
+    :return: the size in bytes
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, np.ndarray):
+        # the size of an array that owns its data includes the data, a view only refers to its base
+        return size if obj.base is None else size + deep_sizeof(obj.base, seen)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    if hasattr(obj, "__dict__"):
+        # the size of an instance dictionary depends on the instances created before it, a copy is sized instead
+        size += deep_sizeof(dict(obj.__dict__), seen)
+    return size
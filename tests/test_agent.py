@@ -0,0 +1,157 @@
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from agent import Agent, MCTSAgent, RandomAgent
+from bitboard import BitboardTicTacToe
+from mcts import MCTS, create_mcts
+from timecontrol import TimeManager
+
+
+class TestMCTSAgent(unittest.TestCase):
+    def play_two_moves(self, agent, opponent_move):
+        game = BitboardTicTacToe()
+        game.make_move(agent.get_move(game))
+        game.make_move(opponent_move if opponent_move not in game.game_history else 1)
+        return game
+
+    def test_reuses_subtree(self):
+        np.random.seed(0)
+        for tree_backend, kwargs in (("nodes", {}), ("arrays", {}), ("nodes", {"use_transpositions": True})):
+            mcts = create_mcts(BitboardTicTacToe(), 2000, tree_backend, **kwargs)
+            agent = MCTSAgent(BitboardTicTacToe(), mcts=mcts)
+            game = self.play_two_moves(agent, 0)
+            node = mcts.find_node(game)
+            self.assertIsNotNone(node)
+            visits = mcts.tree.visits[node] if tree_backend == "arrays" else node.visits
+            self.assertGreater(visits, 0)
+            mcts.reroot(game)
+            root_visits = mcts.tree.visits[0] if tree_backend == "arrays" else mcts.root.visits
+            self.assertEqual(root_visits, visits)
+            self.assertIn(agent.get_move(game), game.get_possible_moves())
+
+    def test_unknown_position_starts_new_tree(self):
+        mcts = create_mcts(BitboardTicTacToe(), 200)
+        agent = MCTSAgent(BitboardTicTacToe(), mcts=mcts)
+        game = self.play_two_moves(agent, 0)
+        other = BitboardTicTacToe(board=game.board, current_player=game.current_player)
+        mcts.reroot(other)
+        self.assertEqual(mcts.root.visits, 0)
+        self.assertIsNone(mcts.root.parent)
+
+    def test_symmetric_transposition_maps_moves(self):
+        np.random.seed(0)
+        mcts = create_mcts(BitboardTicTacToe(), 2000, use_transpositions=True)
+        mcts.build_mcts_tree()
+        game = BitboardTicTacToe()
+        for move in (8, 4):
+            game.make_move(move)
+        mcts.reroot(game)
+        for _ in range(20):
+            self.assertIn(mcts.root_move_to_game_move(mcts.find_best_move_with_mcts(mcts.root)),
+                          game.get_possible_moves())
+            mcts.num_simulations += 100
+
+
+class TestAnytimeSearch(unittest.TestCase):
+    def test_simulation_cap(self):
+        for tree_backend in ("nodes", "arrays"):
+            mcts = create_mcts(BitboardTicTacToe(), 1000, tree_backend)
+            result = mcts.search(max_simulations=300, early_stop=False)
+            self.assertEqual((result.simulations, result.stop_reason), (300, "simulations"))
+            self.assertIn(result.move, range(9))
+
+    def test_deadline(self):
+        mcts = create_mcts(BitboardTicTacToe(), 10 ** 9)
+        result = mcts.search(time_budget=0.05, early_stop=False)
+        self.assertEqual(result.stop_reason, "deadline")
+        self.assertLess(result.elapsed, 0.5)
+
+    def test_early_stop_when_only_one_move(self):
+        game = BitboardTicTacToe()
+        for move in (0, 1, 2, 4, 3, 5, 7, 6):
+            game.make_move(move)
+        result = create_mcts(game, 1000).search(max_simulations=1000)
+        self.assertEqual((result.move, result.stop_reason), (8, "decided"))
+        self.assertLess(result.simulations, 10)
+
+    def test_best_move_is_decided(self):
+        statistics = {0: (1000, 600), 1: (100, 10)}
+        mcts = MCTS(BitboardTicTacToe(), 10)
+        self.assertTrue(mcts.best_move_is_decided(statistics, 10))
+        self.assertFalse(mcts.best_move_is_decided(statistics, 500))
+
+    def test_time_manager(self):
+        manager = TimeManager(1.0, safety_margin=0)
+        self.assertAlmostEqual(manager.budget_for_move(BitboardTicTacToe()), 0.2)
+        manager.record(0.5)
+        manager.start_game()
+        self.assertEqual(manager.remaining, 1.0)
+
+    def test_agent_with_time_per_move(self):
+        agent = MCTSAgent(BitboardTicTacToe(), time_per_move=0.05)
+        self.assertIn(agent.get_move(BitboardTicTacToe()), range(9))
+        self.assertLess(agent.last_search_result.elapsed, 0.5)
+        # without time for the root to get children, a possible move is still played
+        agent = MCTSAgent(BitboardTicTacToe(), time_per_move=0.0)
+        self.assertIn(agent.get_move(BitboardTicTacToe()), range(9))
+        self.assertIsNone(agent.last_search_result.move)
+
+
+class TestPondering(unittest.TestCase):
+    def test_reply_subtree_is_searched_in_the_background(self):
+        np.random.seed(0)
+        for tree_backend in ("nodes", "arrays", "moves"):
+            mcts = create_mcts(BitboardTicTacToe(), 300, tree_backend)
+            agent = MCTSAgent(BitboardTicTacToe(), mcts=mcts, ponder=True, ponder_simulations=2000)
+            game = BitboardTicTacToe()
+            game.make_move(agent.get_move(game))
+            agent.ponder_thread.join()
+            self.assertEqual(agent.last_ponder_result.simulations, 2000, tree_backend)
+            game.make_move(agent.mcts.find_best_move_with_mcts(agent.mcts.find_node(game))
+                           if tree_backend == "nodes" else game.get_possible_moves()[0])
+            visits = mcts.get_visits(mcts.find_node(game))
+            self.assertGreater(visits, 100, tree_backend)
+            # without a new background search, so that the visits of the root can be checked
+            agent.ponder = False
+            agent.get_move(game)
+            # the pondered visits were reused, only the simulations missing to reach 300 were run
+            self.assertEqual(mcts.get_visits(mcts.root), max(visits, 300), tree_backend)
+
+    def test_stop_pondering(self):
+        agent = MCTSAgent(BitboardTicTacToe(), num_simulations=50, ponder=True, ponder_simulations=10 ** 9)
+        game = BitboardTicTacToe()
+        game.make_move(agent.get_move(game))
+        time.sleep(0.05)
+        agent.stop_pondering()
+        self.assertIsNone(agent.ponder_thread)
+        self.assertEqual(agent.last_ponder_result.stop_reason, "stopped")
+        self.assertGreater(agent.last_ponder_result.simulations, 0)
+
+    def test_match_stops_pondering(self):
+        np.random.seed(0)
+        agent = MCTSAgent(BitboardTicTacToe(), num_simulations=100, ponder=True)
+        winner = Agent.return_winner_match(agent, RandomAgent(), BitboardTicTacToe())
+        self.assertIn(winner, (-1, 0, 1))
+        self.assertIsNone(agent.ponder_thread)
+
+    def test_default_background_budget(self):
+        agent = MCTSAgent(BitboardTicTacToe(), num_simulations=20, ponder=True)
+        game = BitboardTicTacToe()
+        game.make_move(agent.get_move(game))
+        agent.ponder_thread.join(timeout=30)
+        # num_simulations simulations for each of the 8 replies
+        self.assertEqual(agent.last_ponder_result.simulations, 160)
+        agent.stop_pondering()
+
+    def test_search_stop_event(self):
+        stop = threading.Event()
+        stop.set()
+        result = create_mcts(BitboardTicTacToe(), 1000).search(max_simulations=1000, stop=stop)
+        self.assertEqual((result.simulations, result.stop_reason), (0, "stopped"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+
+from analysis import PositionAnalyzer, analyze_positions, position_to_game
+from mcts import MCTS
+from tictactoe import TicTacToe
+
+
+class TestPositionAnalysis(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_position_formats(self):
+        from_moves = position_to_game([4, 0], TicTacToe())
+        from_board = position_to_game({"board": [-1, 0, 0, 0, 1, 0, 0, 0, 0], "current_player": 1}, TicTacToe())
+        self.assertTrue(np.array_equal(from_moves.board, from_board.board))
+        self.assertEqual(from_moves.current_player, from_board.current_player)
+        self.assertEqual(position_to_game(from_moves, TicTacToe()).game_history, [4, 0])
+        with self.assertRaises(ValueError):
+            position_to_game([4, 4], TicTacToe())
+
+    def test_analyses(self):
+        positions = [[0, 4, 1], [], {"board": [1, 1, 0, 0, -1, 0, 0, 0, 0], "current_player": -1}, [0, 3, 1, 4]]
+        analyses = analyze_positions(positions, num_simulations=500)
+        self.assertEqual([analysis.index for analysis in analyses], [0, 1, 2, 3])
+        # the second player has to block the top row, and the first player can complete it
+        self.assertEqual(analyses[0].move, 2)
+        self.assertEqual(analyses[2].move, 2)
+        self.assertEqual(analyses[3].move, 2)
+        self.assertGreater(analyses[3].value, 0.5)
+        self.assertEqual(set(analyses[1].visits), set(range(9)))
+        self.assertAlmostEqual(sum(analyses[1].policy.values()), 1)
+        for analysis in analyses:
+            self.assertGreaterEqual(analysis.simulations, 500)
+            self.assertTrue(-1 <= analysis.value <= 1)
+
+    def test_positions_share_the_tree(self):
+        analyzer = PositionAnalyzer(num_simulations=300)
+        streamed = list(analyzer.iter_analyses([[4, 0, 8], [4], [4], [8, 0, 4]]))
+        # shorter games are searched first, and duplicates only once
+        self.assertEqual([analysis.index for analysis in streamed], [1, 2, 0, 3])
+        self.assertEqual(streamed[0].simulations, streamed[1].simulations)
+        # [4, 0, 8] and [8, 0, 4] are the same position, searched once
+        self.assertEqual(streamed[2].visits, streamed[3].visits)
+        self.assertEqual(analyzer.mcts.root.visits, 0)
+        # the position already has its visits, so no node is added
+        size = analyzer.mcts.node_count()
+        analyzer.analyze_positions([[4, 0, 8]])
+        self.assertEqual(analyzer.mcts.node_count(), size)
+
+    def test_terminal_position(self):
+        analysis = analyze_positions([[0, 3, 1, 4, 2]], num_simulations=10)[0]
+        self.assertIsNone(analysis.move)
+        self.assertEqual(analysis.value, -1)
+        self.assertEqual(analysis.stop_reason, "terminal")
+
+    def test_tree_without_transpositions(self):
+        analyzer = PositionAnalyzer(num_simulations=200, mcts=MCTS(TicTacToe(), 200))
+        analyses = analyzer.analyze_positions([[], [4], {"board": [0] * 9}])
+        self.assertEqual(analyses[0].simulations, analyses[2].simulations)
+        self.assertGreaterEqual(analyses[1].simulations, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
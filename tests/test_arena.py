@@ -0,0 +1,78 @@
+import contextlib
+import io
+import threading
+import unittest
+
+from agent import MCTSAgent, RandomAgent
+from arena import AgentSpec, MatchResult, fit_elo, play_arena_game, run_tournament, score_to_elo, wilson_interval
+from bitboard import BitboardTicTacToe
+from play import play_one_game
+
+
+class TestStatistics(unittest.TestCase):
+    def test_wilson_interval(self):
+        low, high = wilson_interval(50, 100)
+        self.assertAlmostEqual(low, 0.4038, places=3)
+        self.assertAlmostEqual(high, 0.5962, places=3)
+        self.assertEqual(wilson_interval(0, 10)[0], 0.0)
+        self.assertLess(wilson_interval(10, 10)[0], 1.0)
+
+    def test_elo_of_scores(self):
+        self.assertAlmostEqual(score_to_elo(0.5), 0)
+        self.assertAlmostEqual(score_to_elo(0.75), 190.85, places=1)
+        self.assertEqual(score_to_elo(1.0), -score_to_elo(0.0))
+
+    def test_fit_elo_orders_the_agents(self):
+        matches = [MatchResult("a", "b", wins=30, draws=10, losses=10),
+                   MatchResult("b", "c", wins=30, draws=10, losses=10),
+                   MatchResult("a", "c", wins=50, draws=0, losses=0)]
+        ratings = fit_elo(["a", "b", "c"], matches)
+        self.assertGreater(ratings["a"], ratings["b"])
+        self.assertGreater(ratings["b"], ratings["c"])
+        self.assertAlmostEqual(sum(ratings.values()), 0, places=6)
+
+
+class TestTournament(unittest.TestCase):
+    def test_game_is_reproducible_from_its_seed(self):
+        first, second = AgentSpec("random", RandomAgent), AgentSpec("random2", RandomAgent)
+        self.assertEqual(play_arena_game(first, second, seed=3)[0], play_arena_game(first, second, seed=3)[0])
+
+    def test_pondering_stops_with_the_game(self):
+        threads = threading.active_count()
+        for seed in range(4):
+            play_arena_game(AgentSpec("random", RandomAgent),
+                            AgentSpec("mcts", MCTSAgent, {"num_simulations": 50, "ponder": True}), seed=seed)
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_play_one_game_with_a_pondering_agent(self):
+        threads = threading.active_count()
+        game = BitboardTicTacToe()
+        agent = MCTSAgent(game, num_simulations=50, ponder=True, ponder_simulations=10 ** 9)
+        with contextlib.redirect_stdout(io.StringIO()):
+            winner = play_one_game(game, agent, RandomAgent(game), print_board=True)
+        self.assertTrue(game.is_over)
+        self.assertEqual(winner, game.return_winner())
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_round_robin_alternates_colors(self):
+        specs = [AgentSpec("random", RandomAgent), AgentSpec("mcts", MCTSAgent, {"num_simulations": 100}),
+                 AgentSpec("random2", RandomAgent)]
+        report = run_tournament(specs, games_per_pair=6, num_workers=2, seed=0)
+        self.assertEqual(report.games, 18)
+        self.assertEqual([(match.agent, match.opponent) for match in report.matches],
+                         [("random", "mcts"), ("random", "random2"), ("mcts", "random2")])
+        self.assertTrue(all(match.games == 6 for match in report.matches))
+        self.assertGreater(report.ratings["mcts"], max(report.ratings["random"], report.ratings["random2"]))
+        # a game lasts at least five moves, so each agent moves at least twice in each of its 12 games
+        self.assertGreaterEqual(len(report.latencies["mcts"]), 12 * 2)
+        percentiles = report.latency_percentiles("mcts")
+        self.assertLessEqual(percentiles[50], percentiles[99])
+        self.assertGreater(report.games_per_second, 0)
+        self.assertIn("games/s", report.summary())
+
+    def test_names_must_be_distinct(self):
+        self.assertRaises(ValueError, run_tournament, [AgentSpec("a"), AgentSpec("a")], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from arraytree import ArrayMCTS, ArrayTree
+from bitboard import BitboardTicTacToe
+from mcts import create_mcts
+
+
+class TestArrayTree(unittest.TestCase):
+    def test_add_children_grows_the_arrays(self):
+        tree = ArrayTree(capacity=4)
+        first = tree.add_children(0, [0, 1, 2, 3, 4])
+        self.assertEqual(first, 1)
+        self.assertEqual(list(tree.children(0)), [1, 2, 3, 4, 5])
+        self.assertGreaterEqual(tree.capacity, 6)
+        self.assertEqual(list(tree.move[1:6]), [0, 1, 2, 3, 4])
+        self.assertTrue(np.all(tree.parent[1:6] == 0))
+
+    def test_visits_are_consistent(self):
+        np.random.seed(0)
+        mcts = create_mcts(BitboardTicTacToe(), 2000, tree_backend="arrays")
+        self.assertIsInstance(mcts, ArrayMCTS)
+        self.assertEqual(mcts.find_best_move_with_mcts(), 4)
+        tree = mcts.tree
+        for node in range(tree.size):
+            children = tree.children(node)
+            if len(children) > 0:
+                self.assertEqual(tree.visits[node], tree.visits[children.start:children.stop].sum() + 1)
+
+    def test_pickle_keeps_only_used_nodes(self):
+        mcts = create_mcts(BitboardTicTacToe(), 500, tree_backend="arrays", capacity=100000)
+        mcts.build_mcts_tree()
+        loaded = pickle.loads(pickle.dumps(mcts))
+        self.assertEqual(len(loaded.tree.visits), mcts.tree.size)
+        self.assertEqual(loaded.tree.visits[0], 500)
+        loaded.num_simulations = 1000
+        loaded.build_mcts_tree()
+        self.assertEqual(loaded.tree.visits[0], 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
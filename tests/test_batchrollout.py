@@ -0,0 +1,35 @@
+import unittest
+
+import numpy as np
+
+from batchrollout import batch_rollout
+from bitboard import BitboardTicTacToe
+from mcts import create_mcts
+
+
+class TestBatchRollout(unittest.TestCase):
+    def test_terminal_positions(self):
+        boards = np.array([[1, 1, 1, -1, -1, 0, 0, 0, 0], [1, -1, 1, 1, -1, -1, -1, 1, 1]])
+        self.assertEqual(batch_rollout(boards, [-1, -1], 7).tolist(), [7, 0])
+
+    def test_forced_win(self):
+        # player 1 to move can only play the winning cell
+        board = np.array([[1, 1, 0, -1, -1, 1, -1, 1, -1]])
+        self.assertEqual(batch_rollout(board, [1], 10).tolist(), [10])
+
+    def test_matches_scalar_rollouts(self):
+        np.random.seed(0)
+        results = batch_rollout(np.zeros((1, 9)), [1], 20000)[0] / 20000
+        self.assertAlmostEqual(results, 0.29, delta=0.03)
+
+    def test_weighted_backpropagation(self):
+        np.random.seed(0)
+        for tree_backend in ("nodes", "arrays"):
+            mcts = create_mcts(BitboardTicTacToe(), 3200, tree_backend, rollout_batch_size=32)
+            self.assertEqual(mcts.find_best_move_with_mcts(mcts.root), 4)
+            self.assertEqual(mcts.get_visits(mcts.root), 3200)
+            self.assertEqual(sum(visits for visits, _ in mcts.root_child_statistics().values()), 3200 - 32)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import json
+import os
+import tempfile
+import unittest
+
+from benchmark import benchmark_game_operations, benchmark_node_memory, compare, main, result
+from tictactoe import TicTacToe
+
+
+def run(results):
+    return {"metadata": {}, "results": results}
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_compare_flags_regressions_in_both_directions(self):
+        baseline = run({"speed": result(100.0, "ops/s"), "size": result(100.0, "bytes", False),
+                        "removed": result(1.0, "s", False)})
+        current = run({"speed": result(80.0, "ops/s"), "size": result(95.0, "bytes", False),
+                       "new": result(1.0, "s", False)})
+        rows = {name: (change, regression) for name, _, _, change, regression in compare(current, baseline, 0.1)}
+        self.assertEqual(set(rows), {"speed", "size"})
+        self.assertAlmostEqual(rows["speed"][0], -0.2)
+        self.assertTrue(rows["speed"][1])
+        self.assertAlmostEqual(rows["size"][0], 0.05)
+        self.assertFalse(rows["size"][1])
+
+    def test_measurements(self):
+        self.assertGreater(benchmark_game_operations(TicTacToe, 0.05), 0)
+        self.assertGreater(benchmark_node_memory(50), 0)
+
+    def test_main_writes_json_and_compares(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            baseline = os.path.join(directory, "baseline.json")
+            with open(baseline, "w") as f:
+                json.dump(run({"bytes_per_node": result(1.0, "bytes", False)}), f)
+            self.assertEqual(main(["--quick", "--output", output, "--baseline", baseline]), 1)
+            with open(output) as f:
+                results = json.load(f)["results"]
+            self.assertIn("build_nodes_1000_simulations_per_second", results)
+            self.assertIn("pickle_file_bytes", results)
+
+
+if __name__ == "__main__":
+    unittest.main()
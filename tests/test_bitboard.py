@@ -0,0 +1,55 @@
+import copy
+import pickle
+import unittest
+
+import numpy as np
+
+from bitboard import BitboardTicTacToe
+from mcts import MCTS
+from tictactoe import TicTacToe
+
+
+class TestBitboardTicTacToe(unittest.TestCase):
+    def test_matches_numpy_game_on_random_games(self):
+        rng = np.random.default_rng(0)
+        for _ in range(200):
+            game = TicTacToe()
+            bitboard = BitboardTicTacToe()
+            while not game.is_over:
+                self.assertEqual(bitboard.get_possible_moves(), game.get_possible_moves())
+                move = rng.choice(game.get_possible_moves())
+                game.make_move(move)
+                bitboard.make_move(move)
+                self.assertEqual(bitboard.return_winner(), game.return_winner())
+                self.assertTrue(np.array_equal(bitboard.board, game.board))
+            self.assertTrue(bitboard.is_over)
+
+    def test_winner_from_board(self):
+        board = np.array([1, 1, 1, -1, -1, 0, 0, 0, 0])
+        self.assertEqual(BitboardTicTacToe(board=board, current_player=-1).return_winner(), 1)
+        board = np.array([1, -1, 1, 1, -1, -1, -1, 1, 1])
+        self.assertEqual(BitboardTicTacToe(board=board).return_winner(), 0)
+
+    def test_invalid_move(self):
+        game = BitboardTicTacToe()
+        game.make_move(4)
+        self.assertRaises(ValueError, game.make_move, 4)
+        self.assertRaises(ValueError, game.make_move, 9)
+
+    def test_copies_are_independent(self):
+        game = BitboardTicTacToe()
+        game.make_move(0)
+        for clone in (game.get_updated_game_state(1), copy.deepcopy(game), pickle.loads(pickle.dumps(game))):
+            clone.make_move(2)
+            self.assertEqual(game.game_history, [0])
+            self.assertEqual(game.get_possible_moves(), list(range(1, 9)))
+
+    def test_mcts_runs_on_bitboard(self):
+        mcts = MCTS(BitboardTicTacToe(), num_simulations=200)
+        move = mcts.find_best_move_with_mcts(mcts.root)
+        self.assertIn(move, range(9))
+        self.assertEqual(mcts.root.visits, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+from bitboard import BitboardTicTacToe
+from checkpoint import list_checkpoints, load_latest_checkpoint
+from mcts import create_mcts
+from saver import extend_mcts, find_saved_tree, load_saved_tree, resume_or_build_mcts, save_mcts
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.checkpoint_dir = os.path.join(self.directory.name, "checkpoints")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_checkpoints_every_interval(self):
+        mcts = create_mcts(BitboardTicTacToe(), 2500, "arrays")
+        mcts.build_mcts_tree(checkpoint_dir=self.checkpoint_dir, checkpoint_interval=1000)
+        names = [os.path.basename(path) for path in list_checkpoints(self.checkpoint_dir)]
+        self.assertEqual(names, ["checkpoint_000000002000.pkl", "checkpoint_000000002500.pkl"])
+        self.assertEqual(load_latest_checkpoint(self.checkpoint_dir).get_visits(0), 2500)
+
+    def test_resume_and_extend(self):
+        mcts = create_mcts(BitboardTicTacToe(), 1000)
+        mcts.build_mcts_tree(checkpoint_dir=self.checkpoint_dir, checkpoint_interval=400)
+        resumed = resume_or_build_mcts(1500, self.checkpoint_dir, checkpoint_interval=400)
+        self.assertEqual(resumed.root.visits, 1500)
+        self.assertEqual(resumed.root_child_statistics().keys(), mcts.root_child_statistics().keys())
+        extend_mcts(resumed, 2000)
+        self.assertEqual(resumed.root.visits, 2000)
+
+    def test_find_saved_tree(self):
+        cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        try:
+            for num_simulations in (5000, 20000):
+                save_mcts(create_mcts(BitboardTicTacToe(), num_simulations))
+        finally:
+            os.chdir(cwd)
+        directory = self.directory.name
+        self.assertEqual(os.path.basename(find_saved_tree(5000, directory)), "mcts_10^3.7")
+        # 19960 and 20000 share the rounded exponent 4.3 of the file name, the bigger tree is not returned
+        self.assertEqual(os.path.basename(find_saved_tree(19960, directory)), "mcts_10^3.7")
+        self.assertEqual(os.path.basename(find_saved_tree(20000, directory)), "mcts_10^4.3")
+        self.assertIsNone(find_saved_tree(4999, directory))
+        with mock.patch("saver.pickle.load", wraps=pickle.load) as load:
+            self.assertEqual(load_saved_tree(20000, directory).num_simulations, 20000)
+            self.assertEqual(load.call_count, 1)
+            self.assertEqual(load_saved_tree(19960, directory).num_simulations, 5000)
+            self.assertEqual(load.call_count, 3)
+            self.assertIsNone(load_saved_tree(4999, directory))
+
+    def test_empty_directory(self):
+        self.assertIsNone(load_latest_checkpoint(self.checkpoint_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
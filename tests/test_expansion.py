@@ -0,0 +1,80 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from arraytree import ArrayMCTS
+from mcts import MCTS
+from metrics import SearchMetrics
+from mnk import MNKGame
+from tictactoe import TicTacToe
+
+
+class TestLazyExpansion(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_one_child_per_visit(self):
+        mcts = MCTS(TicTacToe(), 500, expansion="lazy", metrics=SearchMetrics())
+        mcts.build_mcts_tree()
+        # every simulation but the first adds exactly one node, until the leaves are finished games
+        self.assertLessEqual(mcts.tree_size(), 500)
+        self.assertEqual(mcts.metrics_snapshot()["nodes_created"] + 1, mcts.tree_size())
+        stack = [mcts.root]
+        while stack:
+            node = stack.pop()
+            if node.untried_moves is not None:
+                moves = set(node.children) | set(node.untried_moves)
+                self.assertEqual(moves, set(node.game_state.get_possible_moves()))
+                self.assertEqual(len(moves), len(node.children) + len(node.untried_moves))
+            stack.extend(node.children.values())
+
+    def test_best_move(self):
+        for kwargs in ({}, {"use_solver": True}, {"use_transpositions": True}):
+            mcts = MCTS(TicTacToe(), 2000, expansion="lazy", **kwargs)
+            self.assertEqual(mcts.find_best_move_with_mcts(mcts.root), 4)
+        game = TicTacToe()
+        for move in (0, 4, 1):
+            game.make_move(move)
+        mcts = MCTS(game, 1000, expansion="lazy")
+        self.assertEqual(mcts.find_best_move_with_mcts(mcts.root), 2)
+
+    def test_solver_waits_for_untried_moves(self):
+        game = TicTacToe()
+        for move in (0, 3, 1, 4):
+            game.make_move(move)
+        mcts = MCTS(game, 1000, expansion="lazy", use_solver=True)
+        self.assertEqual(mcts.find_best_move_with_mcts(mcts.root), 2)
+        self.assertEqual(mcts.root.proven, -1)
+
+    def test_progressive_widening(self):
+        mcts = MCTS(MNKGame(7, 7, 4), 400, expansion="lazy", widening_constant=1.0, widening_exponent=0.5)
+        mcts.build_mcts_tree()
+        self.assertLessEqual(len(mcts.root.children), np.sqrt(400) + 1)
+        self.assertGreater(len(mcts.root.untried_moves), 0)
+        stack = [mcts.root]
+        while stack:
+            node = stack.pop()
+            if len(node.children) > 0:
+                # the last child was added before the visit of its own simulation was counted
+                self.assertLess(len(node.children) - 1, max(1.0, np.sqrt(node.visits - 1)))
+            stack.extend(node.children.values())
+
+    def test_budget_and_pickle(self):
+        mcts = MCTS(TicTacToe(), 1000, expansion="lazy", max_nodes=150)
+        mcts.build_mcts_tree()
+        self.assertLessEqual(mcts.tree_size(), 150)
+        loaded = pickle.loads(pickle.dumps(mcts))
+        loaded.num_simulations = 1200
+        loaded.build_mcts_tree()
+        self.assertEqual(loaded.root.visits, 1200)
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            MCTS(TicTacToe(), expansion="sometimes")
+        with self.assertRaises(ValueError):
+            ArrayMCTS(TicTacToe(), expansion="lazy")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from arraytree import ArrayMCTS
+from mcts import MCTS
+from mnk import MNKGame
+from movetree import MoveMCTS
+from puct import PUCTMCTS
+from tictactoe import TicTacToe
+
+
+class TestNodeBudget(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_tree_stays_within_the_budget(self):
+        for mcts in (MCTS(TicTacToe(), 3000, max_nodes=300),
+                     MCTS(TicTacToe(), 3000, max_nodes=300, use_transpositions=True),
+                     ArrayMCTS(TicTacToe(), 3000, max_nodes=300)):
+            mcts.build_mcts_tree()
+            self.assertEqual(mcts.get_visits(mcts.root), 3000)
+            self.assertLessEqual(mcts.tree_size(), 300)
+            self.assertEqual(mcts.node_count(), mcts.tree_size())
+            usage = mcts.memory_usage()
+            self.assertGreater(usage["prunes"], 0)
+            self.assertGreater(usage["pruned_nodes"], 0)
+            self.assertEqual(usage["nodes"], mcts.tree_size())
+
+    def test_pruning_keeps_the_statistics_of_collapsed_nodes(self):
+        mcts = MCTS(TicTacToe(), 2000)
+        mcts.build_mcts_tree()
+        statistics = mcts.root_child_statistics()
+        size = mcts.tree_size()
+        released = mcts.prune_tree(size // 2)
+        self.assertEqual(mcts.tree_size(), size - released)
+        self.assertLessEqual(mcts.tree_size(), size // 2)
+        self.assertEqual(mcts.root_child_statistics(), statistics)
+        self.assertEqual(mcts.find_best_move_with_mcts(mcts.root), 4)
+
+    def test_search_below_the_root_is_pruned(self):
+        game = TicTacToe()
+        game.make_move(4)
+        for mcts in (MCTS(TicTacToe(), 100, max_nodes=300),
+                     MCTS(TicTacToe(), 100, max_nodes=300, use_transpositions=True),
+                     MoveMCTS(TicTacToe(), 100, max_nodes=300)):
+            mcts.build_mcts_tree()
+            node = mcts.find_node(game)
+            mcts.search(node, max_simulations=3000, early_stop=False)
+            self.assertGreater(mcts.memory_usage()["prunes"], 0, type(mcts).__name__)
+            self.assertLessEqual(mcts.tree_size(), 300)
+            # the searched node is still in the tree with all its visits
+            self.assertIs(mcts.find_node(game), node)
+            self.assertGreaterEqual(mcts.get_visits(node), 3000)
+
+    def test_array_search_below_the_root_stays_within_the_budget(self):
+        game = TicTacToe()
+        game.make_move(4)
+        mcts = ArrayMCTS(TicTacToe(), 100, max_nodes=300)
+        mcts.build_mcts_tree()
+        node = mcts.find_node(game)
+        mcts.search(node, max_simulations=2000, early_stop=False)
+        # the nodes cannot be renumbered under the search, the expansions are skipped instead
+        self.assertLessEqual(mcts.tree_size(), 300)
+        self.assertGreater(mcts.memory_usage()["skipped_expansions"], 0)
+        self.assertEqual(mcts.find_node(game), node)
+
+    def test_search_of_a_node_that_cannot_be_expanded_ends(self):
+        mcts = ArrayMCTS(TicTacToe(), 50, max_nodes=10)
+        mcts.build_mcts_tree()
+        node = next(child for child in mcts.tree.children(mcts.root) if mcts.tree.num_children[child] == 0)
+        result = mcts.search(int(node), max_simulations=20, early_stop=False)
+        self.assertEqual((result.move, result.simulations, result.stop_reason), (None, 20, "simulations"))
+        result = mcts.search(int(node), time_budget=0.05, early_stop=False)
+        self.assertEqual((result.move, result.stop_reason), (None, "deadline"))
+
+    def test_collapse_threshold(self):
+        # collapsing the nodes with at most 2 visits releases 3 + 4 children
+        self.assertEqual(MCTS.collapse_threshold([5, 1, 2, 9], [2, 3, 4, 1], 6), 2)
+        self.assertEqual(MCTS.collapse_threshold([5, 1, 2, 9], [2, 3, 4, 1], 100), 9)
+
+    def test_expansion_is_skipped_when_nothing_can_be_pruned(self):
+        mcts = MCTS(MNKGame(5, 5, 4), 200, max_nodes=10)
+        mcts.build_mcts_tree()
+        self.assertEqual(mcts.root.visits, 200)
+        self.assertEqual(mcts.tree_size(), 1)
+        self.assertGreater(mcts.memory_usage()["skipped_expansions"], 0)
+
+    def test_byte_budget(self):
+        mcts = MCTS(TicTacToe(), 1000, max_bytes=200 * MCTS(TicTacToe()).estimate_node_bytes())
+        self.assertEqual(mcts.node_budget, 200)
+        mcts.build_mcts_tree()
+        self.assertLessEqual(mcts.memory_usage()["estimated_bytes"], 200 * mcts.estimate_node_bytes())
+        with self.assertRaises(ValueError):
+            MCTS(TicTacToe(), max_bytes=1)
+
+    def test_puct_search_within_the_budget(self):
+        mcts = PUCTMCTS(TicTacToe(), 1000, batch_size=4, max_nodes=200)
+        mcts.build_mcts_tree()
+        self.assertLessEqual(mcts.tree_size(), 200)
+        self.assertEqual(mcts.node_count(), mcts.tree_size())
+
+    def test_reroot_releases_the_rest_of_the_tree(self):
+        mcts = MCTS(TicTacToe(), 2000, max_nodes=1000)
+        mcts.build_mcts_tree()
+        game = TicTacToe()
+        game.make_move(4)
+        mcts.reroot(game)
+        self.assertEqual(mcts.node_count(), mcts.tree_size())
+        self.assertLess(mcts.node_count(), 1000)
+
+    def test_old_pickles_have_no_budget(self):
+        mcts = MCTS(TicTacToe(), 100)
+        mcts.build_mcts_tree()
+        state = mcts.__getstate__()
+        for name in ("node_budget", "num_nodes", "num_prunes"):
+            del state[name]
+        loaded = pickle.loads(pickle.dumps(mcts))
+        loaded.__setstate__(state)
+        self.assertIsNone(loaded.node_budget)
+        self.assertEqual(loaded.node_count(), mcts.tree_size())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import logging
+import unittest
+from unittest import mock
+
+from arraytree import ArrayMCTS
+from mcts import MCTS
+from metrics import PHASES, SearchMetrics
+from puct import PUCTMCTS
+from tictactoe import TicTacToe
+
+
+class TestSearchMetrics(unittest.TestCase):
+    def test_phases_and_tree_growth_are_tracked(self):
+        for mcts in (MCTS(TicTacToe(), 300, metrics=SearchMetrics()),
+                     ArrayMCTS(TicTacToe(), 300, metrics=SearchMetrics())):
+            mcts.build_mcts_tree()
+            snapshot = mcts.metrics_snapshot()
+            self.assertEqual(snapshot["simulations"], 300)
+            self.assertEqual(snapshot["steps"], 300)
+            for phase in PHASES:
+                self.assertEqual(snapshot["phases"][phase]["count"], 300)
+            self.assertAlmostEqual(sum(phase["share"] for phase in snapshot["phases"].values()), 1)
+            # every node but the root was created by an expansion
+            self.assertEqual(snapshot["tree_size"], snapshot["nodes_created"] + 1)
+            self.assertEqual(snapshot["tree_size"], mcts.tree_size())
+            self.assertGreater(snapshot["max_depth"], 1)
+            self.assertGreater(snapshot["simulations_per_second"], 0)
+            json.dumps(snapshot)
+
+    def test_snapshots_do_not_walk_the_tree(self):
+        mcts = MCTS(TicTacToe(), 100, metrics=SearchMetrics(log_interval=0))
+        with mock.patch.object(MCTS, "tree_size", side_effect=AssertionError("the tree was walked")):
+            with self.assertLogs(mcts.metrics.log, level=logging.INFO):
+                mcts.build_mcts_tree()
+            self.assertEqual(mcts.metrics_snapshot()["tree_size"], mcts.node_count())
+
+    def test_disabled_metrics(self):
+        mcts = MCTS(TicTacToe(), 50)
+        mcts.build_mcts_tree()
+        self.assertIsNone(mcts.metrics_snapshot())
+
+    def test_puct_steps_are_tracked(self):
+        mcts = PUCTMCTS(TicTacToe(), 100, batch_size=4, metrics=SearchMetrics())
+        mcts.build_mcts_tree()
+        snapshot = mcts.metrics_snapshot()
+        self.assertEqual(snapshot["simulations"], mcts.root.visits)
+        self.assertEqual(snapshot["tree_size"], snapshot["nodes_created"] + 1)
+
+    def test_periodic_logging(self):
+        metrics = SearchMetrics(log_interval=0)
+        mcts = MCTS(TicTacToe(), 20, metrics=metrics)
+        with self.assertLogs(metrics.log, level=logging.INFO) as logs:
+            mcts.build_mcts_tree()
+        self.assertEqual(len(logs.records), 20)
+        snapshot = json.loads(logs.records[-1].getMessage().split(" ", 2)[2])
+        self.assertEqual(snapshot["simulations"], 20)
+
+    def test_reset(self):
+        mcts = MCTS(TicTacToe(), 20, metrics=SearchMetrics())
+        mcts.build_mcts_tree()
+        mcts.metrics.reset()
+        self.assertEqual(mcts.metrics_snapshot()["simulations"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
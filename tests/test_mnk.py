@@ -0,0 +1,98 @@
+import copy
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from agent import Agent, MCTSAgent, RandomAgent
+from batchrollout import batch_rollout
+from mcts import MCTS, create_mcts
+from mnk import MNKGame
+from tictactoe import TicTacToe
+from treefile import load_tree_mcts, write_tree_file
+
+
+class TestMNKGame(unittest.TestCase):
+    def test_matches_tictactoe_on_random_games(self):
+        rng = np.random.default_rng(0)
+        for _ in range(200):
+            game = TicTacToe()
+            mnk = MNKGame(3, 3, 3)
+            while not game.is_over:
+                self.assertEqual(sorted(mnk.get_possible_moves()), game.get_possible_moves())
+                move = rng.choice(game.get_possible_moves())
+                game.make_move(move)
+                mnk.make_move(move)
+                self.assertEqual(mnk.return_winner(), game.return_winner())
+
+    def test_five_in_a_row(self):
+        game = MNKGame(15, 15, 5)
+        # diagonal from the top right corner, with the other player's stones on the first row
+        for move in (14, 0, 28, 1, 42, 2, 56, 3):
+            game.make_move(move)
+            self.assertIsNone(game.return_winner())
+        game.make_move(70)
+        self.assertEqual(game.return_winner(), 1)
+        self.assertEqual(len(game.get_possible_moves()), 225 - 9)
+
+    def test_line_longer_than_the_board_side(self):
+        game = MNKGame(6, 4, 5)
+        for move in (0, 6, 1, 7, 2, 8, 3, 9):
+            game.make_move(move)
+        self.assertIsNone(game.return_winner())
+        game.make_move(4)
+        self.assertEqual(game.return_winner(), 1)
+        self.assertRaises(ValueError, MNKGame, 4, 4, 5)
+
+    def test_winner_from_board(self):
+        board = np.zeros(16, dtype=int)
+        board[[3, 6, 9, 12]] = -1
+        self.assertEqual(MNKGame(4, 4, 4, board=board).return_winner(), -1)
+
+    def test_copies_are_independent(self):
+        game = MNKGame(5, 5, 4)
+        game.make_move(12)
+        for clone in (game.get_updated_game_state(0), copy.deepcopy(game), pickle.loads(pickle.dumps(game))):
+            clone.make_move(1)
+            self.assertEqual(game.game_history, [12])
+            self.assertEqual(len(game.get_possible_moves()), 24)
+            self.assertEqual(clone.win_length, 4)
+
+    def test_batch_rollout_uses_the_win_length(self):
+        # four in a row on the first row of a 5x5 board is a win for k=4 but not for full lines
+        board = np.zeros(25, dtype=int)
+        board[:4] = 1
+        board[5:8] = -1
+        self.assertEqual(batch_rollout([board], [-1], 5, 5, 5, win_length=4).tolist(), [5])
+
+
+class TestMNKSearch(unittest.TestCase):
+    def test_mcts_finds_the_winning_move(self):
+        game = MNKGame(6, 6, 4)
+        for move in (0, 30, 1, 31, 2, 32):
+            game.make_move(move)
+        mcts = MCTS(game, num_simulations=500)
+        self.assertIn(mcts.find_best_move_with_mcts(mcts.root), (3, 33))
+
+    def test_agents_play_a_game(self):
+        game = MNKGame(5, 5, 4)
+        winner = Agent.return_winner_match(MCTSAgent(game, num_simulations=50), RandomAgent(game), game)
+        self.assertIn(winner, (1, 0, -1))
+
+    def test_tree_file_keeps_the_game_parameters(self):
+        mcts = create_mcts(MNKGame(4, 5, 3), num_simulations=50, tree_backend="arrays")
+        mcts.build_mcts_tree()
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "tree.bin")
+            write_tree_file(filename, mcts.tree, mcts.root_state, mcts.num_simulations)
+            loaded = load_tree_mcts(filename)
+            self.assertEqual(loaded.root_state.parameters, {"horizontal_size": 4, "vertical_size": 5,
+                                                             "win_length": 3})
+            self.assertEqual(loaded.get_visits(loaded.root), 50)
+            del loaded
+
+
+if __name__ == "__main__":
+    unittest.main()
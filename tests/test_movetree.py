@@ -0,0 +1,109 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from bitboard import BitboardTicTacToe
+from mcts import MCTS, create_mcts
+from mnk import MNKGame
+from movetree import MoveMCTS
+from tictactoe import TicTacToe
+
+
+class TestUndoMove(unittest.TestCase):
+    def test_undo_restores_the_position(self):
+        for game in (TicTacToe(), BitboardTicTacToe(), MNKGame(4, 4, 3)):
+            reference = game.copy()
+            # the last move wins the game for the first player
+            moves = [0, 4, 1, 5, 2] if isinstance(game, MNKGame) else [0, 3, 1, 4, 2]
+            states = []
+            for move in moves:
+                states.append(game.copy())
+                game.make_move(move)
+            self.assertEqual(game.return_winner(), 1)
+            for move, state in zip(reversed(moves), reversed(states)):
+                self.assertEqual(game.undo_move(), move)
+                self.assertTrue(np.array_equal(game.board, state.board))
+                self.assertEqual(game.current_player, state.current_player)
+                self.assertEqual(game.game_history, state.game_history)
+                self.assertEqual(game.return_winner(), state.return_winner())
+                self.assertEqual(sorted(game.get_possible_moves()), sorted(state.get_possible_moves()))
+            self.assertTrue(np.array_equal(game.board, reference.board))
+            with self.assertRaises(ValueError):
+                game.undo_move()
+
+
+class TestMoveMCTS(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_best_move_and_statistics(self):
+        for game in (TicTacToe(), BitboardTicTacToe()):
+            mcts = create_mcts(game, 2000, tree_backend="moves")
+            self.assertIsInstance(mcts, MoveMCTS)
+            self.assertEqual(mcts.find_best_move_with_mcts(mcts.root), 4)
+            # the scratch state is back in a position of the tree and the root state is untouched
+            self.assertEqual(mcts.root_state.game_history, [])
+            stack = [mcts.root]
+            while stack:
+                node = stack.pop()
+                if len(node.children) > 0:
+                    self.assertEqual(node.visits, sum(child.visits for child in node.children.values()) + 1)
+                    stack.extend(node.children.values())
+
+    def test_same_statistics_as_the_nodes_backend(self):
+        np.random.seed(1)
+        nodes = MCTS(TicTacToe(), 500)
+        nodes.build_mcts_tree()
+        np.random.seed(1)
+        moves = MoveMCTS(TicTacToe(), 500)
+        moves.build_mcts_tree()
+        self.assertEqual(nodes.root_child_statistics(), moves.root_child_statistics())
+        self.assertEqual(nodes.tree_size(), moves.tree_size())
+
+    def test_blocks_a_threat(self):
+        game = TicTacToe()
+        for move in (0, 4, 1):
+            game.make_move(move)
+        mcts = MoveMCTS(game, 1000)
+        self.assertEqual(mcts.find_best_move_with_mcts(mcts.root), 2)
+
+    def test_reroot_and_search_from_a_node(self):
+        mcts = MoveMCTS(TicTacToe(), 1000)
+        mcts.build_mcts_tree()
+        game = TicTacToe()
+        game.make_move(4)
+        node = mcts.find_node(game)
+        visits = node.visits
+        result = mcts.search(node, max_simulations=100, early_stop=False)
+        self.assertEqual(node.visits, visits + 100)
+        self.assertIsNotNone(result.move)
+        mcts.reroot(game)
+        self.assertIs(mcts.root, node)
+        self.assertEqual(mcts.node_count(), mcts.tree_size())
+        self.assertEqual(mcts.get_game_state(mcts.root).game_history, [4])
+
+    def test_smaller_nodes_and_budget(self):
+        self.assertLess(MoveMCTS(TicTacToe()).estimate_node_bytes(), MCTS(TicTacToe()).estimate_node_bytes() / 2)
+        mcts = MoveMCTS(TicTacToe(), 2000, max_nodes=200)
+        mcts.build_mcts_tree()
+        self.assertLessEqual(mcts.tree_size(), 200)
+
+    def test_pickle(self):
+        mcts = MoveMCTS(TicTacToe(), 300)
+        mcts.build_mcts_tree()
+        loaded = pickle.loads(pickle.dumps(mcts))
+        self.assertEqual(loaded.root_child_statistics(), mcts.root_child_statistics())
+        loaded.num_simulations = 400
+        loaded.build_mcts_tree()
+        self.assertEqual(loaded.root.visits, 400)
+
+    def test_unsupported_options(self):
+        for kwargs in ({"use_transpositions": True}, {"use_solver": True},
+                       {"num_workers": 2, "parallel_mode": "threads"}):
+            with self.assertRaises(ValueError):
+                MoveMCTS(TicTacToe(), **kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+
+from bitboard import BitboardTicTacToe
+from mcts import create_mcts
+from parallel import root_parallel_search, split_simulations
+
+
+class TestRootParallel(unittest.TestCase):
+    def test_split_simulations(self):
+        self.assertEqual(split_simulations(10, 3), [4, 3, 3])
+        self.assertEqual(split_simulations(100, 2, [3, 1]), [75, 25])
+        self.assertRaises(ValueError, split_simulations, 10, 2, [1, 1, 1])
+
+    def test_merged_statistics(self):
+        statistics = root_parallel_search(BitboardTicTacToe(), 400, 2)
+        self.assertEqual(set(statistics), set(range(9)))
+        self.assertEqual(sum(visits for visits, _ in statistics.values()), 398)
+
+    def test_workers_use_the_search_options(self):
+        mcts = create_mcts(BitboardTicTacToe(), 400, expansion="lazy", widening_constant=0.2, max_nodes=500,
+                           use_solver=True)
+        options = mcts.search_options()
+        copy = create_mcts(BitboardTicTacToe(), 400, **options)
+        self.assertEqual(copy.search_options(), options)
+        self.assertEqual(copy.node_budget, 500)
+        statistics = root_parallel_search(BitboardTicTacToe(), 400, 2, mcts_kwargs=options)
+        # with progressive widening, each worker only adds a few children to its root
+        self.assertLess(len(statistics), 9)
+        self.assertEqual(sum(visits for visits, _ in statistics.values()), 398)
+
+    def test_transpositions_are_counted_once(self):
+        mcts = create_mcts(BitboardTicTacToe(), 400, num_workers=2, use_transpositions=True, seed=0)
+        mcts.find_best_move_with_mcts(mcts.root)
+        self.assertEqual(mcts.root.visits, 400)
+        children = {id(child): child for child in mcts.root.children.values()}.values()
+        self.assertEqual(sum(child.visits for child in children), 400)
+        mcts.executor.shutdown()
+
+    def test_merge_only_adds_the_merged_children(self):
+        mcts = create_mcts(BitboardTicTacToe(), 400, expansion="lazy", widening_constant=0.2)
+        mcts.root.untried_moves = [2, 0, 5]
+        mcts.merge_root_child_statistics(mcts.root, {0: (30, 6), 4: (20, -2)})
+        self.assertEqual(set(mcts.root.children), {0, 4})
+        self.assertEqual(mcts.root.untried_moves, [2, 5])
+        self.assertEqual((mcts.root.visits, mcts.node_count()), (50, 3))
+        mcts.build_mcts_tree()
+        self.assertEqual(mcts.root.visits, 400)
+
+    def test_merge_respects_the_node_budget(self):
+        statistics = {move: (10, 0) for move in range(9)}
+        for tree_backend in ("nodes", "moves"):
+            mcts = create_mcts(BitboardTicTacToe(), 400, tree_backend, max_nodes=4)
+            mcts.merge_root_child_statistics(mcts.root, statistics)
+            self.assertEqual(mcts.node_count(), 4, tree_backend)
+            self.assertEqual(mcts.get_visits(mcts.root), 30, tree_backend)
+        mcts = create_mcts(BitboardTicTacToe(), 400, "arrays", max_nodes=4)
+        mcts.merge_root_child_statistics(mcts.root, statistics)
+        self.assertEqual((mcts.node_count(), mcts.get_visits(mcts.root)), (1, 0))
+
+    def test_mcts_with_workers(self):
+        for tree_backend in ("nodes", "arrays"):
+            mcts = create_mcts(BitboardTicTacToe(), 300, tree_backend, num_workers=2, seed=0)
+            self.assertIn(mcts.find_best_move_with_mcts(mcts.root), range(9))
+            self.assertGreaterEqual(mcts.get_visits(mcts.root), 300)
+            mcts.executor.shutdown()
+
+
+class TestTreeParallel(unittest.TestCase):
+    def assert_consistent(self, tree):
+        for node in range(tree.size):
+            children = tree.children(node)
+            if len(children) > 0:
+                self.assertEqual(tree.visits[node], tree.visits[children.start:children.stop].sum() + 1)
+        self.assertTrue((abs(tree.wins[:tree.size]) <= tree.visits[:tree.size]).all())
+
+    def test_shared_tree_search(self):
+        for parallel_mode in ("threads", "processes"):
+            mcts = create_mcts(BitboardTicTacToe(), 1000, "arrays", num_workers=3, parallel_mode=parallel_mode)
+            self.assertIn(mcts.find_best_move_with_mcts(), range(9))
+            self.assertEqual(mcts.get_visits(mcts.root), 1000)
+            self.assert_consistent(mcts.tree)
+
+    def test_threads_on_node_tree(self):
+        mcts = create_mcts(BitboardTicTacToe(), 500, num_workers=3, parallel_mode="threads",
+                           use_transpositions=True)
+        self.assertIn(mcts.find_best_move_with_mcts(mcts.root), range(9))
+        self.assertEqual(mcts.root.visits, 500)
+
+    def test_processes_need_array_tree(self):
+        mcts = create_mcts(BitboardTicTacToe(), 100, num_workers=2, parallel_mode="processes")
+        self.assertRaises(ValueError, mcts.find_best_move_with_mcts, mcts.root)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from bitboard import BitboardTicTacToe
+from evaluator import BatchedEvaluator, MLPEvaluator, RolloutEvaluator
+from mcts import create_mcts
+from mnk import MNKGame
+from puct import PUCTMCTS
+from tictactoe import TicTacToe
+
+
+def play(moves, game=None):
+    game = game if game is not None else TicTacToe()
+    for move in moves:
+        game.make_move(move)
+    return game
+
+
+class CountingEvaluator(RolloutEvaluator):
+    def __init__(self):
+        super().__init__(num_rollouts=4, rng=np.random.default_rng(0))
+        self.batch_sizes = []
+
+    def evaluate_batch(self, games):
+        self.batch_sizes.append(len(games))
+        return super().evaluate_batch(games)
+
+
+class TestEvaluators(unittest.TestCase):
+    def test_priors_are_legal_distributions(self):
+        games = [play([]), play([4, 0]), play([0, 3, 1, 4, 2])]
+        for evaluator in (RolloutEvaluator(num_rollouts=10), MLPEvaluator(seed=0)):
+            priors, values = evaluator.evaluate_batch(games)
+            self.assertEqual(priors.shape, (3, 9))
+            np.testing.assert_allclose(priors[:2].sum(axis=1), 1)
+            self.assertTrue(np.all(priors[1, [0, 4]] == 0))
+            self.assertTrue(np.all(priors[2] == 0))
+            self.assertTrue(np.all(np.abs(values) <= 1))
+
+    def test_rollout_value_of_a_finished_game(self):
+        priors, value = RolloutEvaluator(num_rollouts=3).evaluate(play([0, 3, 1, 4, 2]))
+        self.assertEqual(value, -1)
+
+    def test_mlp_save_and_load(self):
+        evaluator = MLPEvaluator(num_cells=16, hidden_sizes=(8,), seed=1)
+        games = [play([5], MNKGame(4, 4, 3))]
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "weights.npz")
+            evaluator.save(filename)
+            loaded = MLPEvaluator.load(filename)
+        for expected, actual in zip(evaluator.evaluate_batch(games), loaded.evaluate_batch(games)):
+            np.testing.assert_allclose(expected, actual)
+
+    def test_batched_evaluator_flushes_by_count_and_timeout(self):
+        evaluator = CountingEvaluator()
+        batched = BatchedEvaluator(evaluator, batch_size=4, timeout=0.01)
+        priors, value = batched.evaluate(play([0]))
+        self.assertEqual(evaluator.batch_sizes, [1])
+        self.assertEqual(priors[0], 0)
+        batched.close()
+
+
+class TestPUCTMCTS(unittest.TestCase):
+    def test_finds_the_winning_move(self):
+        for evaluator in (RolloutEvaluator(num_rollouts=8), MLPEvaluator(seed=0)):
+            mcts = PUCTMCTS(play([0, 3, 1, 4]), num_simulations=400, evaluator=evaluator)
+            self.assertEqual(mcts.find_best_move_with_mcts(mcts.root), 2)
+
+    def test_leaves_are_evaluated_in_batches(self):
+        evaluator = CountingEvaluator()
+        mcts = PUCTMCTS(BitboardTicTacToe(), num_simulations=200, evaluator=evaluator, batch_size=8)
+        mcts.build_mcts_tree()
+        self.assertGreaterEqual(mcts.root.visits, 200)
+        self.assertLess(mcts.root.visits, 208)
+        self.assertGreater(max(evaluator.batch_sizes), 1)
+        self.assertLess(len(evaluator.batch_sizes), 200)
+        self.assertAlmostEqual(sum(child.prior for child in mcts.root.children.values()), 1)
+
+    def test_threads_share_a_batched_evaluator(self):
+        evaluator = CountingEvaluator()
+        mcts = create_mcts(TicTacToe(), 200, evaluator=evaluator, num_workers=4, parallel_mode="threads",
+                           batch_size=4, batch_timeout=0.005)
+        self.assertIsInstance(mcts, PUCTMCTS)
+        move = mcts.find_best_move_with_mcts(mcts.root)
+        self.assertIn(move, range(9))
+        self.assertGreaterEqual(mcts.root.visits, 200)
+        self.assertEqual(sum(evaluator.batch_sizes), mcts.batched_evaluator.num_positions)
+        self.assertGreater(mcts.batched_evaluator.average_batch_size, 1)
+
+    def test_search_and_pickle(self):
+        mcts = PUCTMCTS(TicTacToe(), num_simulations=100, evaluator=MLPEvaluator(seed=0))
+        result = mcts.search(max_simulations=50)
+        self.assertIn(result.move, range(9))
+        loaded = pickle.loads(pickle.dumps(mcts))
+        self.assertEqual(loaded.root.visits, mcts.root.visits)
+
+    def test_batches_respect_the_simulation_cap(self):
+        mcts = PUCTMCTS(TicTacToe(), num_simulations=10 ** 6, evaluator=MLPEvaluator(seed=0), batch_size=8)
+        for cap in (5, 13, 30):
+            result = mcts.search(max_simulations=cap, early_stop=False)
+            self.assertEqual((result.simulations, result.stop_reason), (cap, "simulations"))
+
+    def test_early_stop_follows_the_visits(self):
+        mcts = PUCTMCTS(TicTacToe(), num_simulations=100, evaluator=MLPEvaluator(seed=0))
+        # the most visited move leads, though another move has a better average
+        statistics = {0: (1000, -900), 1: (100, 90)}
+        self.assertTrue(mcts.best_move_is_decided(statistics, 10))
+        self.assertFalse(mcts.best_move_is_decided(statistics, 900))
+        result = mcts.search(max_simulations=2000)
+        statistics = mcts.root_child_statistics()
+        self.assertEqual(result.move, max(statistics, key=lambda move: statistics[move][0]))
+        self.assertEqual(result.stop_reason, "decided")
+        visits = sorted(visits for visits, _ in statistics.values())
+        self.assertGreater(visits[-1] - visits[-2], 2000 - result.simulations)
+
+    def test_rejects_unsupported_options(self):
+        self.assertRaises(ValueError, PUCTMCTS, TicTacToe(), use_transpositions=True)
+        self.assertRaises(ValueError, PUCTMCTS, TicTacToe(), num_workers=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
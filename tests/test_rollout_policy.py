@@ -0,0 +1,111 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from arraytree import ArrayMCTS
+from mcts import MCTS
+from mnk import MNKGame
+from movetree import MoveMCTS
+from rollout_policy import RolloutPolicy, TacticalPolicy, ThreatTable, WeightedPolicy, threat_table
+from tictactoe import TicTacToe
+
+
+def play(game, moves):
+    for move in moves:
+        game.make_move(move)
+    return game
+
+
+class TestThreatTable(unittest.TestCase):
+    def test_winning_moves(self):
+        table = threat_table(3, 3)
+        board = np.array([1, 1, 0, 0, -1, -1, 0, 0, 0])
+        self.assertEqual(table.winning_moves(board, 1).tolist(), [2])
+        self.assertEqual(table.winning_moves(board, -1).tolist(), [3])
+        self.assertEqual(table.winning_moves(np.zeros(9, dtype=int), 1).tolist(), [])
+        self.assertIs(threat_table(3, 3), table)
+
+    def test_evaluate(self):
+        table = ThreatTable(3, 3)
+        self.assertEqual(table.evaluate(np.array([1, 1, 0, 0, -1, 0, 0, 0, 0]), 1), 1)
+        # the second player has two ways to complete a line, the first player cannot block both
+        self.assertEqual(table.evaluate(np.array([-1, -1, 0, -1, 1, 1, 0, 1, 0]), 1), -1)
+        self.assertEqual(table.evaluate(np.zeros(9, dtype=int), 1), 0)
+        value = table.evaluate(np.array([0, 0, 0, 0, 1, 0, 0, 0, 0]), -1)
+        self.assertTrue(0 < value < 1)
+
+    def test_mnk_lines(self):
+        table = ThreatTable(5, 4, 4)
+        self.assertEqual(table.lines.shape[1], 4)
+        game = play(MNKGame(5, 4, 4), [0, 10, 1, 11, 2, 12])
+        self.assertEqual(table.winning_moves(game.board, 1).tolist(), [3])
+        self.assertEqual(table.winning_moves(game.board, -1).tolist(), [13])
+
+
+class TestRolloutPolicies(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_tactical_moves(self):
+        policy = TacticalPolicy()
+        self.assertEqual(policy.choose_move(play(TicTacToe(), [0, 3, 1, 4])), 2)
+        # the second player blocks the top row
+        self.assertEqual(policy.choose_move(play(TicTacToe(), [0, 4, 1])), 2)
+        self.assertNotEqual(TacticalPolicy(weights=[0, 0, 0, 1, 0, 1, 1, 1, 1], block=False)
+                            .choose_move(play(TicTacToe(), [0, 4, 1])), 2)
+
+    def test_weighted_moves(self):
+        policy = WeightedPolicy(weights=[0, 0, 0, 0, 1, 0, 0, 0, 0])
+        self.assertEqual(policy.choose_move(TicTacToe()), 4)
+        self.assertIn(WeightedPolicy().choose_move(TicTacToe()), range(9))
+
+    def test_depth_cap(self):
+        game = TicTacToe()
+        value = RolloutPolicy(max_depth=2).play(game)
+        self.assertEqual(len(game.game_history), 2)
+        self.assertTrue(-1 <= value <= 1)
+        game = play(TicTacToe(), [0, 3, 1, 4])
+        self.assertEqual(TacticalPolicy(max_depth=0).play(game), 1)
+
+    def test_tactical_rollouts_are_perfect_in_tactical_positions(self):
+        results = [TacticalPolicy().play(play(TicTacToe(), [0, 3, 1, 4])) for _ in range(20)]
+        self.assertEqual(set(results), {1})
+
+
+class TestSearchWithPolicies(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_backends_block(self):
+        game = play(TicTacToe(), [0, 4, 1])
+        for mcts_class in (MCTS, ArrayMCTS, MoveMCTS):
+            mcts = mcts_class(game, 100, rollout_policy=TacticalPolicy(max_depth=4))
+            self.assertEqual(mcts.find_best_move_with_mcts(mcts.root), 2, mcts_class.__name__)
+
+    def test_move_backend_unwinds_the_scratch_state(self):
+        mcts = MoveMCTS(TicTacToe(), 50, rollout_policy=TacticalPolicy())
+        mcts.build_mcts_tree()
+        history = list(mcts.scratch.game_history)
+        mcts.rollout(mcts.root, mcts.scratch)
+        self.assertEqual(mcts.scratch.game_history, history)
+
+    def test_invalid_combinations(self):
+        with self.assertRaises(ValueError):
+            MCTS(TicTacToe(), 10, rollout_policy=TacticalPolicy(), rollout_batch_size=8)
+
+    def test_pickle(self):
+        mcts = MCTS(TicTacToe(), 50, rollout_policy=TacticalPolicy(max_depth=3))
+        mcts.build_mcts_tree()
+        loaded = pickle.loads(pickle.dumps(mcts))
+        self.assertIsInstance(loaded.rollout_policy, TacticalPolicy)
+        self.assertEqual(loaded.rollout_policy.max_depth, 3)
+        state = mcts.__getstate__()
+        del state["rollout_policy"]
+        old = MCTS.__new__(MCTS)
+        old.__setstate__(state)
+        self.assertIsNone(old.rollout_policy)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from selfplay import ReplayBuffer, ShardWriter, list_shards, run_self_play, run_self_play_worker
+
+
+class TestShards(unittest.TestCase):
+    def test_shards_rotate_by_example_count(self):
+        with tempfile.TemporaryDirectory() as directory:
+            writer = ShardWriter(directory, examples_per_shard=4)
+            boards = [np.zeros(9, dtype=np.int8)] * 3
+            policies = [np.full(9, 1 / 9, dtype=np.float32)] * 3
+            writer.add_game(boards, [1, -1, 1], policies, winner=-1)
+            writer.add_game(boards, [1, -1, 1], policies, winner=0)
+            self.assertEqual([count for _, count in list_shards(directory)], [4])
+            writer.close()
+            self.assertEqual([count for _, count in list_shards(directory)], [4, 2])
+            self.assertEqual(writer.num_examples, 6)
+            with np.load(list_shards(directory)[0][0]) as shard:
+                self.assertEqual(shard["outcomes"].tolist(), [-1, 1, -1, 0])
+                self.assertEqual(shard["policies"].shape, (4, 9))
+
+    def test_worker_records_visit_policies(self):
+        with tempfile.TemporaryDirectory() as directory:
+            games, examples, num_bytes, shards = run_self_play_worker(0, 2, directory, seed=0, num_simulations=50,
+                                                                      examples_per_shard=5)
+            self.assertEqual(games, 2)
+            self.assertGreaterEqual(examples, 10)
+            self.assertEqual(shards, len(list_shards(directory)))
+            batch = ReplayBuffer(directory).sample(examples)
+            np.testing.assert_allclose(batch["policies"].sum(axis=1), 1, rtol=1e-5)
+            # the policy only covers the empty cells and the outcome is 1, 0 or -1 for the player to move
+            self.assertTrue(np.all(batch["policies"][batch["boards"] != 0] == 0))
+            self.assertTrue(set(batch["outcomes"].tolist()) <= {-1, 0, 1})
+
+
+class TestSelfPlay(unittest.TestCase):
+    def test_run_with_worker_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            report = run_self_play(4, directory, num_workers=2, seed=0, num_simulations=30, examples_per_shard=8)
+            self.assertEqual(report.games, 4)
+            self.assertEqual(report.examples, sum(count for _, count in list_shards(directory)))
+            self.assertGreater(report.games_per_hour, 0)
+            self.assertGreater(report.bytes_per_example, 0)
+            # a second run continues with new worker ids instead of overwriting the shards
+            run_self_play(2, directory, num_workers=1, seed=1, num_simulations=30)
+            self.assertEqual(len(list_shards(directory)), len(os.listdir(directory)))
+
+    def test_replay_buffer_keeps_the_most_recent_shards(self):
+        with tempfile.TemporaryDirectory() as directory:
+            writer = ShardWriter(directory, examples_per_shard=5)
+            for game in range(6):
+                writer.add_game([np.full(9, game, dtype=np.int8)] * 5, [1] * 5, [np.ones(9) / 9] * 5, winner=1)
+                os.utime(list_shards(directory)[-1][0], (game, game))
+            buffer = ReplayBuffer(directory, capacity=10, max_open_shards=1, rng=np.random.default_rng(0))
+            self.assertEqual(len(buffer), 10)
+            batch = buffer.sample(50)
+            self.assertEqual(set(batch["boards"][:, 0].tolist()), {4, 5})
+            self.assertEqual(len(buffer.open_shards), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import server
+from mcts import MCTS
+from saver import load_mcts
+from server import MoveServer, random_positions, request_move, run_load_test, open_connection
+from tictactoe import TicTacToe
+
+
+class TestMoveServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        np.random.seed(0)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "mcts.sock")
+        self.server = MoveServer(num_simulations=200, num_workers=1, use_processes=False, cache_size=2)
+        await self.server.start(path=self.path)
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        self.directory.cleanup()
+
+    async def test_best_move_and_statistics(self):
+        reader, writer = await open_connection(self.path)
+        answer = await request_move(reader, writer, {"id": 7, "moves": [0, 4, 1]})
+        self.assertEqual(answer["id"], 7)
+        # the opponent threatens to complete the top row
+        self.assertEqual(answer["move"], 2)
+        self.assertEqual(answer["simulations"], 200)
+        self.assertEqual(sorted(move for move, _, _ in answer["statistics"]), [2, 3, 5, 6, 7, 8])
+        self.assertFalse(answer["cached"])
+        again = await request_move(reader, writer, {"moves": [1, 4, 0]})
+        self.assertTrue(again["cached"])
+        self.assertEqual(again["move"], 2)
+        writer.close()
+        await writer.wait_closed()
+
+    async def test_invalid_requests(self):
+        reader, writer = await open_connection(self.path)
+        self.assertIn("error", await request_move(reader, writer, {"moves": [4, 4]}))
+        self.assertIn("error", await request_move(reader, writer, {"moves": [], "num_simulations": 0}))
+        self.assertIn("error", await request_move(reader, writer, {"moves": "x"}))
+        writer.write(b"not json\n")
+        self.assertIn("Invalid JSON", (await reader.readline()).decode())
+        self.assertEqual((await request_move(reader, writer, {"command": "stats"}))["errors"], 3)
+        writer.close()
+        await writer.wait_closed()
+
+    async def test_concurrent_requests_share_a_search(self):
+        answers = await asyncio.gather(*(self.server.handle_request({"moves": [4]}) for _ in range(5)))
+        self.assertEqual(self.server.stats.searches, 1)
+        self.assertEqual(self.server.stats.coalesced, 4)
+        self.assertEqual(len({answer["move"] for answer in answers}), 1)
+
+    async def test_failed_search_answers_every_waiting_request(self):
+        with mock.patch("server.search_position", side_effect=RuntimeError("out of memory")):
+            answers = await asyncio.gather(*(self.server.handle_request({"moves": [4]}) for _ in range(3)))
+        self.assertTrue(all("out of memory" in answer["error"] for answer in answers))
+        self.assertEqual(self.server.stats.errors, 3)
+        self.assertEqual(self.server.pending, {})
+
+    async def test_positions_are_searched_in_the_warm_tree(self):
+        for num_simulations in (100, 200):
+            await self.server.handle_request({"moves": [4, 0], "num_simulations": num_simulations})
+        # the tree of a worker is only visible from its thread, and the server has a single worker
+        mcts = await asyncio.get_running_loop().run_in_executor(self.server.executor, lambda: server.worker_state.mcts)
+        self.assertGreater(mcts.node_count(), 100)
+        # the second search continued from the visits of the first one
+        position = mcts.root.game_state.copy()
+        for move in (4, 0):
+            position.make_move(move)
+        self.assertEqual(mcts.find_node(position).visits, 200)
+
+    async def test_lru_eviction(self):
+        for moves in ([0], [1], [0], [2]):
+            await self.server.handle_request({"moves": moves})
+        self.assertEqual(self.server.stats.cache_hits, 1)
+        # [1] was the least recently used answer when [2] was added
+        self.assertEqual(len(self.server.cache), 2)
+        await self.server.handle_request({"moves": [1]})
+        self.assertEqual(self.server.stats.searches, 4)
+
+    async def test_load_test(self):
+        positions = random_positions(TicTacToe(), 5, seed=0)
+        report = await run_load_test(positions, 20, concurrency=3, num_simulations=50, path=self.path)
+        self.assertEqual(len(report.latencies), 20)
+        self.assertEqual(report.errors, 0)
+        self.assertGreater(report.requests_per_second, 0)
+        self.assertLessEqual(report.latency_percentiles()[50], report.latency_percentiles()[99])
+
+
+class TestWarmTree(unittest.IsolatedAsyncioTestCase):
+    async def test_worker_processes_search_a_loaded_tree(self):
+        with tempfile.TemporaryDirectory() as directory:
+            np.random.seed(0)
+            mcts = MCTS(TicTacToe(), 500)
+            mcts.build_mcts_tree()
+            filename = os.path.join(directory, "tree")
+            with open(filename, "wb") as f:
+                pickle.dump(mcts, f)
+            server = MoveServer(tree_file=filename, num_simulations=300, num_workers=2, cache_size=0)
+            await server.start(port=0)
+            try:
+                host, port = server.address[:2]
+                reader, writer = await open_connection(host=host, port=port)
+                answer = await request_move(reader, writer, {"moves": []})
+                # the root already has more visits than asked for, so no simulation was needed
+                self.assertEqual(answer["simulations"], 500)
+                self.assertEqual(answer["stop_reason"], "simulations")
+                writer.close()
+                await writer.wait_closed()
+            finally:
+                await server.close()
+
+    def test_loaded_tree_gets_the_node_budget(self):
+        with tempfile.TemporaryDirectory() as directory:
+            np.random.seed(0)
+            mcts = MCTS(TicTacToe(), 200)
+            mcts.build_mcts_tree()
+            filename = os.path.join(directory, "tree")
+            with open(filename, "wb") as f:
+                pickle.dump(mcts, f)
+            server.init_worker(TicTacToe(), filename, 300, "nodes", {"max_nodes": 150})
+            self.assertEqual(server.worker_state.mcts.node_budget, 150)
+            for moves in random_positions(TicTacToe(), 10, seed=0):
+                position = TicTacToe()
+                for move in moves:
+                    position.make_move(move)
+                server.search_position(position, 300)
+            self.assertLessEqual(server.worker_state.mcts.tree_size(), 150)
+
+    def test_load_mcts_without_prompt(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cwd = os.getcwd()
+            os.chdir(directory)
+            try:
+                with self.assertRaises(FileNotFoundError):
+                    load_mcts(MCTS(TicTacToe(), 10), interactive=False)
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from arraytree import ArrayMCTS
+from bitboard import BitboardTicTacToe
+from mcts import MCTS
+from solver import SolvedTable, load_solved_table
+from tictactoe import TicTacToe
+
+
+def play(moves, game_class=BitboardTicTacToe):
+    game = game_class()
+    for move in moves:
+        game.make_move(move)
+    return game
+
+
+class TestSolvedTable(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.table = SolvedTable.build()
+
+    def test_known_values(self):
+        self.assertEqual(self.table.lookup(play([]))[0], 0)
+        # a corner answered by an edge loses for the second player
+        value, move = self.table.lookup(play([0, 1]))
+        self.assertEqual(value, 1)
+        # the immediate win is preferred
+        value, move = self.table.lookup(play([0, 3, 1, 4]))
+        self.assertEqual((value, move), (1, 2))
+        self.assertEqual(self.table.lookup(play([0, 3, 1, 4, 2])), (-1, None))
+
+    def test_best_moves_keep_the_value_on_random_positions(self):
+        rng = np.random.default_rng(0)
+        for _ in range(100):
+            game = TicTacToe()
+            while not game.is_over:
+                value, move = self.table.lookup(game)
+                self.assertIn(move, game.get_possible_moves())
+                next_value, _ = self.table.lookup(game.get_updated_game_state(move))
+                self.assertEqual(next_value, -value)
+                game.make_move(rng.choice(game.get_possible_moves()))
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "solved.npz")
+            table = load_solved_table(filename)
+            self.assertTrue(os.path.exists(filename))
+            loaded = load_solved_table(filename)
+            self.assertTrue(np.array_equal(loaded.keys, table.keys))
+            self.assertEqual(loaded.lookup(play([4, 0])), table.lookup(play([4, 0])))
+
+    def test_mcts_answers_from_the_table(self):
+        for mcts in (MCTS(TicTacToe(), num_simulations=1000, solved_table=self.table),
+                     ArrayMCTS(TicTacToe(), num_simulations=1000, solved_table=self.table)):
+            mcts.reroot(play([0, 3, 1, 4], TicTacToe))
+            self.assertEqual(mcts.find_best_move_with_mcts(mcts.root), 2)
+            self.assertEqual(mcts.get_visits(mcts.root), 0)
+            self.assertEqual(mcts.search(mcts.root).stop_reason, "solved")
+
+
+class TestMCTSSolver(unittest.TestCase):
+    def test_proves_a_forced_win(self):
+        mcts = MCTS(play([0, 3, 1, 4]), num_simulations=10000, use_solver=True)
+        self.assertEqual(mcts.find_best_move_with_mcts(mcts.root), 2)
+        self.assertEqual(mcts.root.proven, -1)
+        self.assertLess(mcts.root.visits, 10000)
+
+    def test_proven_values_match_the_table(self):
+        table = SolvedTable.build()
+        mcts = MCTS(play([4, 0]), num_simulations=20000, use_solver=True)
+        mcts.build_mcts_tree(mcts.root)
+        self.assertEqual(mcts.root.proven, -table.lookup(play([4, 0]))[0])
+        for move, child in mcts.root.children.items():
+            if child.proven is not None:
+                self.assertEqual(child.proven, -table.lookup(child.game_state)[0])
+
+    def test_proves_with_transpositions(self):
+        mcts = MCTS(play([0, 3, 1]), num_simulations=20000, use_solver=True, use_transpositions=True)
+        result = mcts.search(mcts.root)
+        self.assertEqual(result.stop_reason, "proven")
+        self.assertEqual(mcts.root.proven, 1)
+
+    def test_arrays_backend_rejects_the_solver(self):
+        self.assertRaises(ValueError, ArrayMCTS, TicTacToe(), use_solver=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,30 +2,22 @@ import unittest
 from tictactoe import TicTacToe
 
 class TestTicTacToe(unittest.TestCase):
-    def test_winner(self):
-        game = TicTacToe()
-        self.assertEqual(game.winner(), None)
-        game.play(1, 1)
-        game.play(0, 0)
-        game.play(1, 0)
-        game.play(0, 1)
-        game.play(1, 2)
-        self.assertEqual(game.winner(), 'X')
+    def play(self, moves):
         game = TicTacToe()
-        game.play(0, 0)
-        game.play(1, 1)
-        game.play(0, 1)
-        game.play(1, 0)
-        game.play(2, 2)
-        game.play(1, 2)
-        self.assertEqual(game.winner(), 'O')
+        for move in moves:
+            self.assertEqual(game.return_winner(), None)
+            game.make_move(move)
+        return game
+
+    def test_winner(self):
         game = TicTacToe()
-        game.play(0, 0)
-        game.play(1, 1)
-        game.play(0, 1)
-        game.play(1, 0)
-        game.play(2, 2)
-        game.play(1, 2)
-        game.play(2, 0)
-        game.play(2, 1)
-        self.assertEqual(game.winner(), 'Draw')
\ No newline at end of file
+        self.assertEqual(game.return_winner(), None)
+        # the first player completes the middle row
+        game = self.play([4, 0, 3, 1, 5])
+        self.assertEqual(game.return_winner(), 1)
+        # the second player completes the middle row
+        game = self.play([0, 4, 1, 3, 8, 5])
+        self.assertEqual(game.return_winner(), -1)
+        game = self.play([0, 4, 8, 1, 7, 6, 2, 5, 3])
+        self.assertEqual(game.return_winner(), 0)
+        self.assertTrue(game.is_over)
@@ -0,0 +1,48 @@
+import unittest
+
+import numpy as np
+
+from bitboard import BitboardTicTacToe
+from mcts import MCTS
+from tictactoe import TicTacToe
+
+
+class TestTranspositions(unittest.TestCase):
+    def test_canonical_key_of_equivalent_positions(self):
+        for game_class in (TicTacToe, BitboardTicTacToe):
+            corners = set()
+            for move in (0, 2, 6, 8):
+                corners.add(game_class().get_updated_game_state(move).canonical_key())
+            self.assertEqual(len(corners), 1)
+            first = game_class()
+            for move in (0, 4, 8):
+                first.make_move(move)
+            second = game_class()
+            for move in (2, 4, 6):
+                second.make_move(move)
+            self.assertEqual(first.canonical_key(), second.canonical_key())
+            self.assertNotEqual(game_class().get_updated_game_state(4).canonical_key(),
+                                game_class().get_updated_game_state(0).canonical_key())
+
+    def test_transpositions_share_nodes(self):
+        mcts = MCTS(BitboardTicTacToe(), num_simulations=2000, use_transpositions=True)
+        mcts.build_mcts_tree()
+        self.assertIs(mcts.root.children[0], mcts.root.children[8])
+        self.assertEqual(mcts.root.visits, 2000)
+        nodes = set()
+        stack = [mcts.root]
+        while stack:
+            node = stack.pop()
+            if id(node) not in nodes:
+                nodes.add(id(node))
+                stack.extend(node.children.values())
+        self.assertEqual(len(nodes), len(mcts.transposition_table))
+
+    def test_best_move_is_center(self):
+        np.random.seed(0)
+        mcts = MCTS(BitboardTicTacToe(), num_simulations=3000, use_transpositions=True)
+        self.assertEqual(mcts.find_best_move_with_mcts(mcts.root), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
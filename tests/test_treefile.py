@@ -0,0 +1,79 @@
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from bitboard import BitboardTicTacToe
+from mcts import MCTS, create_mcts
+from saver import convert_pickle_to_binary, load_mcts_binary, load_mcts_file, save_mcts_binary
+from treefile import PREFIX, read_tree_metadata
+
+
+class TestTreeFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_round_trip_of_node_tree(self):
+        game = BitboardTicTacToe()
+        game.make_move(4)
+        mcts = create_mcts(game, 2000)
+        mcts.build_mcts_tree()
+        filename = save_mcts_binary(mcts, self.path("tree"))
+        metadata = read_tree_metadata(filename)
+        self.assertEqual(metadata["num_simulations"], 2000)
+        self.assertEqual(metadata["game_history"], [4])
+        loaded = load_mcts_binary(filename=filename)
+        self.assertIsInstance(loaded.tree.visits, np.memmap)
+        self.assertEqual(loaded.root_child_statistics(), mcts.root_child_statistics())
+        self.assertEqual(loaded.get_game_state(loaded.root).game_history, [4])
+        loaded.num_simulations = 3000
+        loaded.build_mcts_tree()
+        self.assertEqual(loaded.get_visits(loaded.root), 3000)
+        # copy on write: the file is not modified by the search
+        self.assertEqual(load_mcts_binary(filename=filename).get_visits(0), 2000)
+
+    def test_convert_pickle(self):
+        mcts = create_mcts(BitboardTicTacToe(), 500)
+        mcts.build_mcts_tree()
+        with open(self.path("mcts"), "wb") as f:
+            pickle.dump(mcts, f)
+        filename = convert_pickle_to_binary(self.path("mcts"))
+        self.assertEqual(load_mcts_binary(filename=filename, mode="r").root_child_statistics(),
+                         mcts.root_child_statistics())
+
+    def test_rejects_trees_of_the_first_version(self):
+        mcts = create_mcts(BitboardTicTacToe(), 100)
+        mcts.build_mcts_tree()
+        # the first version pickled only these attributes, with the wins signed by the depth of the leaf
+        old_state = {"game": mcts.game, "num_simulations": mcts.num_simulations, "root": mcts.root}
+        with mock.patch.object(MCTS, "__getstate__", lambda self: dict(old_state)):
+            with open(self.path("mcts"), "wb") as f:
+                pickle.dump(mcts, f)
+        self.assertRaises(ValueError, load_mcts_file, self.path("mcts"))
+        self.assertRaises(ValueError, convert_pickle_to_binary, self.path("mcts"))
+        self.assertEqual(pickle.loads(pickle.dumps(mcts)).root_child_statistics(), mcts.root_child_statistics())
+
+        filename = save_mcts_binary(mcts, self.path("tree"))
+        with open(filename, "r+b") as f:
+            magic, _, metadata_length = PREFIX.unpack(f.read(PREFIX.size))
+            f.seek(0)
+            f.write(PREFIX.pack(magic, 1, metadata_length))
+        self.assertRaises(ValueError, load_mcts_binary, filename=filename)
+
+    def test_rejects_other_files(self):
+        with open(self.path("other"), "wb") as f:
+            f.write(b"not a tree file at all")
+        self.assertRaises(ValueError, read_tree_metadata, self.path("other"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from mcts import MCTS, create_mcts
+from tictactoe import TicTacToe
+from treewalk import export_tree, summarize_tree, walk_tree
+
+
+class TestTreeWalk(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.mcts = MCTS(TicTacToe(), 400)
+        self.mcts.build_mcts_tree()
+
+    def test_walk_matches_the_tree(self):
+        records = list(walk_tree(self.mcts, min_visits=0))
+        self.assertEqual(len(records), self.mcts.tree_size())
+        self.assertEqual(records[0].depth, 0)
+        self.assertIsNone(records[0].move)
+        self.assertEqual(records[0].visits, 400)
+        for record in records[1:]:
+            self.assertEqual(record.position[-1], record.move)
+            self.assertEqual(len(record.position), record.depth)
+            game = TicTacToe()
+            for move in record.position:
+                game.make_move(move)
+            self.assertEqual(self.mcts.find_node(game).visits, record.visits)
+
+    def test_filters(self):
+        self.assertTrue(all(record.depth <= 2 for record in walk_tree(self.mcts, max_depth=2)))
+        self.assertTrue(all(record.visits >= 20 for record in walk_tree(self.mcts, min_visits=20)))
+        top = [record for record in walk_tree(self.mcts, max_depth=1, top_k=2)]
+        self.assertEqual(len(top), 3)
+        statistics = self.mcts.root_child_statistics()
+        self.assertEqual([record.move for record in top[1:]],
+                         sorted(statistics, key=lambda move: -statistics[move][0])[:2])
+        self.assertGreater(top[1].visits, 0)
+        self.assertIsNotNone(top[1].ucb)
+
+    def test_deep_tree_does_not_recurse(self):
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(100)
+        try:
+            game = TicTacToe()
+            mcts = MCTS(game, 1)
+            node = mcts.root
+            for depth in range(300):
+                # a chain of nodes deeper than the recursion limit
+                child = type(node)(game_state=node.game_state, parent=node)
+                node.children = {0: child}
+                child.visits = 1
+                node = child
+            self.assertEqual(sum(1 for _ in walk_tree(mcts, min_visits=0)), 301)
+        finally:
+            sys.setrecursionlimit(limit)
+
+    def test_export(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "tree.csv")
+            count = export_tree(self.mcts, filename, max_depth=2)
+            with open(filename, newline="") as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual(len(rows), count)
+            self.assertEqual(list(rows[0]), ["position", "move", "visits", "wins", "ucb", "depth"])
+            self.assertEqual(rows[0]["position"], "")
+            self.assertEqual(int(rows[0]["visits"]), 400)
+
+            filename = os.path.join(directory, "tree.jsonl")
+            self.assertEqual(export_tree(self.mcts, filename, max_depth=2), count)
+            with open(filename) as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual(len(lines), count)
+            self.assertEqual(lines[1]["depth"], 1)
+            self.assertEqual(len(lines[1]["position"]), 1)
+        with self.assertRaises(ValueError):
+            export_tree(self.mcts, io.StringIO(), "xml")
+
+    def test_summary(self):
+        summary = summarize_tree(self.mcts)
+        self.assertEqual(summary.nodes, sum(1 for _ in walk_tree(self.mcts)))
+        self.assertEqual(summary.depths[0].nodes, 1)
+        self.assertEqual(summary.depths[0].children, 9)
+        # the first visit of the root is simulated before it is expanded
+        self.assertEqual(summary.depths[1].visits, 399)
+        self.assertEqual(summary.depths[1].max_children, 8)
+        self.assertIn("nodes", summary.format())
+        self.assertEqual(summarize_tree(self.mcts, max_depth=1).max_depth, 1)
+
+    def test_backends(self):
+        for tree_backend in ("nodes", "arrays", "moves"):
+            np.random.seed(0)
+            mcts = create_mcts(TicTacToe(), 200, tree_backend)
+            mcts.build_mcts_tree()
+            summary = summarize_tree(mcts, min_visits=0)
+            self.assertEqual(summary.nodes, mcts.tree_size(), tree_backend)
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                mcts.print_tree(max_depth=1)
+            self.assertEqual(len(output.getvalue().splitlines()), 10, tree_backend)
+
+
+if __name__ == '__main__':
+    unittest.main()